@@ -0,0 +1,43 @@
+from codigos import _codigo_columns, _variant_code_keys
+from database import supabase
+from routes.productos import _variantes_producto
+
+PAGE_SIZE = 1000
+
+
+def _iter_rows(table: str, columns: str):
+    start = 0
+    while True:
+        rows = supabase.table(table).select(columns).order("id").range(start, start + PAGE_SIZE - 1).execute().data or []
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            return
+        start += PAGE_SIZE
+
+
+def _backfill_costos() -> int:
+    actualizados = 0
+    for row in _iter_rows("catalogo_costos_proveedor", "id,codigo_producto,codigo_canonico,codigo_compacto,codigo_canonico_compacto"):
+        columns = _codigo_columns(row.get("codigo_producto"))
+        if all(row.get(key) == value for key, value in columns.items()):
+            continue
+        supabase.table("catalogo_costos_proveedor").update(columns).eq("id", row["id"]).execute()
+        actualizados += 1
+    return actualizados
+
+
+def _backfill_productos() -> int:
+    actualizados = 0
+    for row in _iter_rows("productos", "id,codigo_producto,descripcion,variantes,codigo_canonico,codigo_compacto,codigo_canonico_compacto,codigos_variantes"):
+        _, variantes = _variantes_producto(row)
+        columns = {**_codigo_columns(row.get("codigo_producto")), "codigos_variantes": _variant_code_keys(variantes)}
+        if all(row.get(key) == value for key, value in columns.items()):
+            continue
+        supabase.table("productos").update(columns).eq("id", row["id"]).execute()
+        actualizados += 1
+    return actualizados
+
+
+if __name__ == "__main__":
+    print(f"catalogo_costos_proveedor actualizados: {_backfill_costos()}")
+    print(f"productos actualizados: {_backfill_productos()}")
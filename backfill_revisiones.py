@@ -0,0 +1,26 @@
+from backfill_codigos import PAGE_SIZE, _iter_rows
+from routes.drive_sync import _bulk_upsert, _materializar_revisiones, _sync_batch_size
+
+
+def _guardar_revisiones(id_empresa: str, revisiones: list[dict]) -> int:
+    _bulk_upsert("catalogo_drive_revisiones", _materializar_revisiones(id_empresa, revisiones), _sync_batch_size())
+    return len(revisiones)
+
+
+def _backfill_revisiones() -> int:
+    calculadas = 0
+    por_empresa: dict[str, list[dict]] = {}
+    for row in _iter_rows("catalogo_drive_revisiones", "*"):
+        if row.get("estado_revision") != "pendiente" or row.get("revision_calculada_en"):
+            continue
+        pendientes = por_empresa.setdefault(row["id_empresa"], [])
+        pendientes.append(row)
+        if len(pendientes) >= PAGE_SIZE:
+            calculadas += _guardar_revisiones(row["id_empresa"], por_empresa.pop(row["id_empresa"]))
+    for id_empresa, pendientes in por_empresa.items():
+        calculadas += _guardar_revisiones(id_empresa, pendientes)
+    return calculadas
+
+
+if __name__ == "__main__":
+    print(f"catalogo_drive_revisiones calculadas: {_backfill_revisiones()}")
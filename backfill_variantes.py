@@ -0,0 +1,23 @@
+from backfill_codigos import _iter_rows
+from codigos import _variant_code_keys
+from database import supabase
+from routes.productos import _extract_variantes_metadata
+
+
+def _backfill_variantes() -> int:
+    migrados = 0
+    for row in _iter_rows("productos", "id,descripcion,variantes"):
+        if row.get("variantes") is not None:
+            continue
+        descripcion, variantes = _extract_variantes_metadata(row.get("descripcion"))
+        supabase.table("productos").update({
+            "descripcion": descripcion or None,
+            "variantes": variantes,
+            "codigos_variantes": _variant_code_keys(variantes),
+        }).eq("id", row["id"]).execute()
+        migrados += 1
+    return migrados
+
+
+if __name__ == "__main__":
+    print(f"productos migrados: {_backfill_variantes()}")
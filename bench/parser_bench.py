@@ -0,0 +1,96 @@
+from functools import _lru_cache_wrapper
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import catalogo_parser  # noqa: E402
+
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus")
+ESPERADO_DIR = os.path.join(BENCH_DIR, "esperado")
+
+
+def _corpus() -> list[tuple[str, str]]:
+    archivos = []
+    for nombre in sorted(os.listdir(CORPUS_DIR)):
+        if not nombre.endswith(".txt"):
+            continue
+        with open(os.path.join(CORPUS_DIR, nombre), encoding="utf-8") as fh:
+            archivos.append((nombre, fh.read()))
+    return archivos
+
+
+def _parse(nombre: str, texto: str) -> dict:
+    return {
+        "catalogo": catalogo_parser._extract_catalog_items_from_text(texto, nombre, "bench"),
+        "costos": catalogo_parser._extract_cost_rows_from_text(texto, nombre),
+        "ficha": catalogo_parser._extract_pdf_info_from_text(texto, nombre),
+    }
+
+
+def _esperado_path(nombre: str) -> str:
+    return os.path.join(ESPERADO_DIR, os.path.splitext(nombre)[0] + ".json")
+
+
+def _clear_caches() -> None:
+    for value in vars(catalogo_parser).values():
+        if isinstance(value, _lru_cache_wrapper):
+            value.cache_clear()
+
+
+def _verificar(archivos: list[tuple[str, str]], actualizar: bool) -> bool:
+    ok = True
+    for nombre, texto in archivos:
+        resultado = json.loads(json.dumps(_parse(nombre, texto)))
+        path = _esperado_path(nombre)
+        if actualizar:
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(resultado, fh, ensure_ascii=False, indent=1, sort_keys=True)
+            print(f"{nombre}: esperado actualizado")
+            continue
+        if not os.path.exists(path):
+            print(f"{nombre}: falta {os.path.relpath(path, BENCH_DIR)}")
+            ok = False
+            continue
+        with open(path, encoding="utf-8") as fh:
+            esperado = json.load(fh)
+        for key in ("catalogo", "costos", "ficha"):
+            if resultado.get(key) != esperado.get(key):
+                print(f"{nombre}: salida distinta en {key}")
+                ok = False
+    return ok
+
+
+def _medir(archivos: list[tuple[str, str]], repeticiones: int) -> float:
+    lineas = sum(len(texto.splitlines()) for _, texto in archivos)
+    mejor = None
+    for _ in range(repeticiones):
+        _clear_caches()
+        inicio = time.perf_counter()
+        for nombre, texto in archivos:
+            _parse(nombre, texto)
+        transcurrido = time.perf_counter() - inicio
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return lineas / mejor if mejor else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los parsers de catalogos y costos")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--minimo", type=float, default=None, help="lineas/s minimas aceptadas")
+    parser.add_argument("--actualizar", action="store_true", help="regenera bench/esperado con la salida actual")
+    args = parser.parse_args()
+
+    archivos = _corpus()
+    if not _verificar(archivos, args.actualizar):
+        sys.exit(1)
+    lineas_por_segundo = _medir(archivos, max(1, args.repeticiones))
+    lineas = sum(len(texto.splitlines()) for _, texto in archivos)
+    print(f"{len(archivos)} archivos, {lineas} lineas: {lineas_por_segundo:,.0f} lineas/s")
+    if args.minimo is not None and lineas_por_segundo < args.minimo:
+        print(f"por debajo del minimo de {args.minimo:,.0f} lineas/s")
+        sys.exit(1)
@@ -0,0 +1,24 @@
+from codigos import _dedupe_keep_order, _indexed_code_keys
+from database import supabase
+
+CODE_LOOKUP_CHUNK_SIZE = 150
+
+
+def _chunked(values: list, size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _rows_by_code_keys(table: str, columns: str, id_empresa: str, codigos: list[str], *, key_columns: tuple[str, ...] = ("codigo_canonico", "codigo_compacto", "codigo_canonico_compacto")) -> list[dict]:
+    keys = _dedupe_keep_order([key for codigo in codigos for key in _indexed_code_keys(codigo)])
+    rows = []
+    seen_ids = set()
+    for chunk in _chunked(keys, CODE_LOOKUP_CHUNK_SIZE):
+        for key_column in key_columns:
+            resp = supabase.table(table).select(columns).eq("id_empresa", id_empresa).in_(key_column, chunk).execute()
+            for row in resp.data or []:
+                if row.get("id") in seen_ids:
+                    continue
+                seen_ids.add(row.get("id"))
+                rows.append(row)
+    return rows
@@ -0,0 +1,693 @@
+from functools import lru_cache
+from typing import Iterable
+import os
+import re
+import unicodedata
+import uuid
+
+from codigos import _canonical_code, _dedupe_keep_order, _normalize_code_candidate
+
+PARSER_LINE_CACHE_SIZE = 8192
+CATALOG_BLOCK_RADIUS = 3
+
+WHITESPACE_RE = re.compile(r"\s+")
+SLUG_RE = re.compile(r"[^a-zA-Z0-9]+")
+NON_ALNUM_UPPER_RE = re.compile(r"[^A-Z0-9]+")
+PRICE_RE = re.compile(r"\$\s*([0-9][0-9,.]{0,12})", re.IGNORECASE)
+PIECES_RE = re.compile(r"(\d+)\s+PIEZAS", re.IGNORECASE)
+LABELED_CODE_RE = re.compile(r"(?:CODIGO|CLAVE|MODELO|SKU|REF(?:ERENCIA)?)[:#\s-]{0,6}([A-Z0-9][A-Z0-9\-\s]{2,40})")
+CODE_KEYWORD_RE = re.compile(r"CODIGO|CLAVE|MODELO|SKU|REF", re.IGNORECASE)
+SPEC_KEYWORD_RE = re.compile(r"\b(FRECUENCIA|POTENCIA|VOLTAJE|VOLTAGE|AMPERAJE|AMPERAJE|LUMEN(?:ES)?|TEMPERATURA|MEDIDA|MEDIDAS|DIMENSION(?:ES)?|CONTROL REMOTO|BLUETOOTH|WIFI|CRI|COLOR|MATERIAL)\b")
+SPEC_UNIT_RE = re.compile(r"\b\d+(?:\.\d+)?\s*(W|V|HZ|H|K|LM|G)\b")
+SPEC_SHORT_RE = re.compile(r"[A-Z]{1,4}\s+\d+(?:\.\d+)?[A-Z]+")
+DIGIT_RE = re.compile(r"\d")
+UPPER_LETTER_RE = re.compile(r"[A-Z]")
+GENERIC_KEYWORD_RE = re.compile(r"CODIGO|CLAVE|MODELO|SKU|PIEZAS|MEDIDAS|COLOR|PRECIO|PUBLICO|VENTA")
+DESCRIPTION_KEYWORD_RE = re.compile(r"CODIGO|CLAVE|MODELO|SKU|REF|PIEZAS|MEDIDAS|COLOR|PRECIO|PUBLICO|VENTA")
+CODE_ONLY_RE = re.compile(r"[A-Z0-9-]{4,}")
+SECCIONES_RE = re.compile(r"\b\d+\s+SECCIONES?\b")
+SECCIONES_COUNT_RE = re.compile(r"\b(\d+)\s+SECCIONES?\b")
+SECCIONES_CODE_RE = re.compile(r"(?:^|-)0*(\d+)SEC(?:$|-)")
+NUMBER_IN_NAME_RE = re.compile(r"\b\d{2,}[.,]?\d*\b")
+NAME_KEYWORD_RE = re.compile(r"INTERIOR|LAMBRIN|MURO|PANEL|DECK|REVESTIMIENTO|PARED|FACHADA")
+FILENAME_SEPARATOR_RE = re.compile(r"[_-]+")
+PAGE_MARKER_RE = re.compile(r"\[\[PAGE:(\d+)\]\]")
+MONEY_CURRENCY_RE = re.compile(r"\$\s*([0-9]{1,4}(?:,[0-9]{3})*(?:\.\d{2})?)", re.IGNORECASE)
+MONEY_PLAIN_RE = re.compile(r"(?<!\d)([0-9]{1,4}(?:,[0-9]{3})*(?:\.\d{2}))(?!\d)", re.IGNORECASE)
+CODE_CANDIDATE_PATTERNS = [
+    re.compile(r"\b[A-Z]{1,5}\s*[- ]\s*\d{2,5}\s*[- ]\s*[A-Z0-9]{2,12}\b"),
+    re.compile(r"\b[A-Z]{1,5}-\d{2,5}[A-Z0-9]{2,12}\b"),
+    re.compile(r"\b[A-Z]{1,5}\d{2,5}\s*[- ]\s*[A-Z0-9]{2,12}\b"),
+    re.compile(r"\b\d{2,5}\s*[- ]\s*[A-Z0-9]{1,12}\s*[- ]\s*[A-Z0-9]{1,12}\s*[- ]\s*[A-Z0-9]{1,12}\b"),
+    re.compile(r"\b\d{2,5}\s+[A-Z0-9]{1,12}\s+\d{2,5}\s+\d{2,5}\b"),
+    re.compile(r"\b[A-Z]{2,6}\d{2,6}\b"),
+    re.compile(r"\b\d{4,6}\b"),
+    re.compile(r"\b\d{3}\s+[A-Z]{4,20}\b"),
+    re.compile(r"\b[A-Z]{1,4}\d{4,6}-[A-Z0-9]{2,12}\b"),
+]
+CODE_THREE_DIGITS_RE = re.compile(r"\d{3}")
+CODE_THREE_FOUR_DIGITS_RE = re.compile(r"\d{3,4}")
+CODE_FOUR_SIX_DIGITS_RE = re.compile(r"\d{4,6}")
+CODE_THREE_SIX_DIGITS_RE = re.compile(r"\d{3,6}")
+NON_DIGIT_RE = re.compile(r"\D")
+TAGGED_COST_RE = re.compile(r"(?:costo|distribuidor|precio|p\.\s*distribuidor|p/pza|pza\.|p/par|del par)[^0-9$]{0,12}\$?\s*([0-9]{1,4}(?:,[0-9]{3})*(?:\.\d{2})?)", re.IGNORECASE)
+COST_KEYWORD_RE = re.compile(r"P/PZA|PZA\.|P/PAR|DEL PAR|PRECIO|COSTO|DISTRIBUIDOR", re.IGNORECASE)
+
+
+def _clean_line(line: str) -> str:
+    return WHITESPACE_RE.sub(" ", line).strip()
+
+
+def _clean_lines(text: str) -> list[str]:
+    lines = [_clean_line(line) for line in (text or "").splitlines()]
+    return [line for line in lines if line]
+
+
+def _slug_text(texto: str) -> str:
+    value = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    value = SLUG_RE.sub("-", value.lower()).strip("-")
+    return value[:160] or f"producto-{uuid.uuid4().hex[:8]}"
+
+
+def _extract_price_from_text(text: str) -> float | None:
+    if not text:
+        return None
+    return _extract_price_from_lines(_clean_lines(text), text)
+
+
+def _extract_price_from_lines(lines: list[str], text: str) -> float | None:
+    candidates = []
+
+    for index, line in enumerate(lines[:80]):
+        for raw in PRICE_RE.findall(line):
+            try:
+                value = float(raw.replace(",", ""))
+            except Exception:
+                continue
+            if not (1 <= value <= 1000000):
+                continue
+            score = 5
+            upper_line = line.upper()
+            if "PUBLIC" in upper_line:
+                score += 8
+            if "PRECIO" in upper_line or "VENTA" in upper_line:
+                score += 5
+            if "P/PZA" in upper_line or "PZA." in upper_line:
+                score += 3
+            if "DISTRIBUIDOR" in upper_line or "COSTO" in upper_line:
+                score -= 7
+            if index < 20:
+                score += 2
+            candidates.append((score, value))
+
+    if candidates:
+        candidates.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return round(candidates[0][1], 2)
+
+    for raw in PRICE_RE.findall(text):
+        try:
+            value = float(raw.replace(",", ""))
+        except Exception:
+            continue
+        if 1 <= value <= 1000000:
+            return round(value, 2)
+    return None
+
+
+def _extract_pieces_from_text(text: str) -> int | None:
+    match = PIECES_RE.search(text)
+    return int(match.group(1)) if match else None
+
+
+def _extract_code_from_text(text: str, filename: str) -> str | None:
+    return _extract_code_from_lines(_clean_lines(text), filename)
+
+
+@lru_cache(maxsize=PARSER_LINE_CACHE_SIZE)
+def _line_code_features(line: str) -> tuple[tuple[str, ...], tuple[str, ...], bool]:
+    labeled = []
+    for raw in LABELED_CODE_RE.findall(line.upper()):
+        candidate = _normalize_code_candidate(raw)
+        if candidate:
+            labeled.append(candidate)
+    return tuple(labeled), _code_candidates(line), bool(CODE_KEYWORD_RE.search(line))
+
+
+def _extract_code_from_lines(lines: list[str], filename: str) -> str | None:
+    ranked: list[tuple[int, str]] = []
+    for index, line in enumerate(lines[:80]):
+        labeled, candidates, has_keyword = _line_code_features(line)
+        for candidate in labeled:
+            ranked.append((12 + _code_score(candidate) - min(index, 8), candidate))
+
+        for candidate in candidates:
+            bonus = 0
+            if has_keyword:
+                bonus += 5
+            if index < 12:
+                bonus += 2
+            ranked.append((_code_score(candidate) + bonus, candidate))
+
+    for candidate in _code_candidates((filename or "").upper()):
+        ranked.append((_code_score(candidate) + 1, candidate))
+
+    if not ranked:
+        return None
+    ranked.sort(key=lambda item: (item[0], len(item[1]), item[1]), reverse=True)
+    return ranked[0][1]
+
+
+@lru_cache(maxsize=PARSER_LINE_CACHE_SIZE)
+def _normalized_name_text(value: str) -> str:
+    normalized = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode("ascii")
+    return WHITESPACE_RE.sub(" ", normalized).strip().upper()
+
+
+@lru_cache(maxsize=256)
+def _filename_name_tokens(filename: str) -> frozenset[str]:
+    base = os.path.splitext(filename or "")[0]
+    normalized = NON_ALNUM_UPPER_RE.sub(" ", _normalized_name_text(base)).strip()
+    return frozenset(token for token in normalized.split() if len(token) >= 4)
+
+
+GENERIC_NAME_PATTERNS = [
+    r"^\d+\s+SECCIONES?$",
+    r"^SECCIONES?$",
+    r"^PROXIMAMENTE$",
+    r"^NOVEDAD(?:ES)?$",
+    r"^DISPONIBLE(?:S)?$",
+    r"^AGOTADO(?:S)?$",
+    r"^CAT(?:ALOGO)?$",
+    r"^CAT\.?.*$",
+]
+GENERIC_NAME_RES = [re.compile(pattern) for pattern in GENERIC_NAME_PATTERNS]
+
+
+def _catalog_line_key(line: str) -> str:
+    upper = _normalized_name_text(line)
+    return NON_ALNUM_UPPER_RE.sub(" ", upper).strip()
+
+
+def _is_spec_like_name(line: str) -> bool:
+    upper = _normalized_name_text(line)
+    if not upper:
+        return True
+    if SPEC_KEYWORD_RE.search(upper):
+        return True
+    if ":" in (line or "") and SPEC_UNIT_RE.search(upper):
+        return True
+    if SPEC_SHORT_RE.fullmatch(upper):
+        return True
+    return False
+
+
+def _is_category_like_name(line: str) -> bool:
+    clean = WHITESPACE_RE.sub(" ", (line or "")).strip()
+    upper = _normalized_name_text(clean)
+    if not upper:
+        return True
+    if any(symbol in clean for symbol in ["&", ","]) and len(clean.split()) >= 3 and not DIGIT_RE.search(clean):
+        return True
+    return False
+
+
+def _is_generic_catalog_name(line: str, filename: str) -> bool:
+    clean = WHITESPACE_RE.sub(" ", (line or "")).strip()
+    upper = _normalized_name_text(clean)
+    if not upper:
+        return True
+    if clean.startswith(("-", "*", "•")) and len(clean.split()) <= 4:
+        return True
+    if clean.endswith(":") and len(clean.split()) <= 4:
+        return True
+    if _is_spec_like_name(clean) or _is_category_like_name(clean):
+        return True
+    if any(token in upper for token in ["TEPEYAC", "CATALOGO", "COMPRIMIDO", "PDF"]):
+        return True
+    if GENERIC_KEYWORD_RE.search(upper):
+        return True
+    if CODE_ONLY_RE.fullmatch(upper):
+        return True
+    if any(pattern.fullmatch(upper) for pattern in GENERIC_NAME_RES):
+        return True
+    if SECCIONES_RE.search(upper):
+        return True
+    filename_tokens = _filename_name_tokens(filename)
+    line_tokens = {token for token in NON_ALNUM_UPPER_RE.sub(" ", upper).split() if len(token) >= 4}
+    if filename_tokens and line_tokens and len(line_tokens & filename_tokens) >= max(2, len(line_tokens) - 1):
+        return True
+    return False
+
+
+@lru_cache(maxsize=PARSER_LINE_CACHE_SIZE)
+def _score_name_candidate(line: str, filename: str, repeated_count: int = 1) -> int:
+    clean = WHITESPACE_RE.sub(" ", (line or "").strip())
+    upper = _normalized_name_text(clean)
+    if len(clean) < 4:
+        return -100
+    if clean.startswith(("-", "*", "•")):
+        return -90
+    if clean.endswith(":") and len(clean.split()) <= 5:
+        return -90
+    if "$" in clean:
+        return -100
+    if NUMBER_IN_NAME_RE.search(clean):
+        return -40
+    if repeated_count >= 4 and len(clean.split()) <= 4:
+        return -85
+    if _is_generic_catalog_name(clean, filename):
+        return -80
+
+    score = 0
+    words = [word for word in clean.split() if word]
+    if len(words) >= 2:
+        score += 5
+    if 8 <= len(clean) <= 60:
+        score += 4
+    if UPPER_LETTER_RE.search(upper) and not DIGIT_RE.search(clean):
+        score += 3
+    if NAME_KEYWORD_RE.search(upper):
+        score += 4
+    score += min(len(words), 5)
+    if repeated_count >= 3:
+        score -= min(8, repeated_count * 2)
+    return score
+
+
+def _extract_name_from_text(text: str, filename: str, *, allow_filename_fallback: bool = True) -> str:
+
+    best_line = None
+    best_score = -100
+    if text:
+        for raw in text.splitlines()[:50]:
+            line = _clean_line(raw)
+            score = _score_name_candidate(line, filename)
+            if score > best_score:
+                best_score = score
+                best_line = line
+    if best_line and best_score >= 0:
+        return best_line.title()[:140]
+    if not allow_filename_fallback:
+        return "Producto sin nombre"
+    base = os.path.splitext(filename or "")[0]
+    return FILENAME_SEPARATOR_RE.sub(" ", base).strip()[:140] or "Producto sin nombre"
+
+
+def _variant_label_from_code(codigo_producto: str | None) -> str | None:
+    upper = _normalized_name_text(codigo_producto or "")
+    match = SECCIONES_CODE_RE.search(upper)
+    if match:
+        cantidad = int(match.group(1))
+        return f"{cantidad} Secciones"
+    return None
+
+
+def _extract_catalog_variant_near_index(lines: list[str], index: int, codigo_producto: str | None) -> str | None:
+    start = max(0, index - 4)
+    end = min(len(lines), index + 2)
+    for pos in range(start, end):
+        upper = _normalized_name_text(_clean_line(lines[pos] or ""))
+        if not upper:
+            continue
+        match = SECCIONES_COUNT_RE.search(upper)
+        if match:
+            return f"{int(match.group(1))} Secciones"
+    return _variant_label_from_code(codigo_producto)
+
+
+def _compose_catalog_name(base_name: str, variant_label: str | None) -> str:
+    name = (base_name or "").strip() or "Producto sin nombre"
+    if not variant_label:
+        return name[:140]
+    normalized_name = _normalized_name_text(name)
+    normalized_variant = _normalized_name_text(variant_label)
+    if normalized_variant and normalized_variant in normalized_name:
+        return name[:140]
+    if name == "Producto sin nombre":
+        return variant_label[:140]
+    return f"{name} {variant_label}"[:140]
+
+
+def _extract_catalog_name_near_index(
+    lines: list[str],
+    index: int,
+    filename: str,
+    codigo_producto: str | None = None,
+    line_counts: dict[str, int] | None = None,
+) -> str:
+    start = max(0, index - 8)
+    end = min(len(lines), index + 3)
+    ranked = []
+    for pos in range(start, end):
+        line = _clean_line(lines[pos] or "")
+        if not line:
+            continue
+        repeated_count = (line_counts or {}).get(_catalog_line_key(line), 1)
+        score = _score_name_candidate(line, filename, repeated_count=repeated_count)
+        if score < 0:
+            continue
+        distance = abs(index - pos)
+        if pos <= index:
+            score += 3
+        if distance <= 2:
+            score += 2
+        if distance >= 6:
+            score -= 2
+        ranked.append((score, -distance, -pos, line))
+    if ranked:
+        ranked.sort(reverse=True)
+        base_name = ranked[0][3].title()[:140]
+    else:
+        window = "\n".join(lines[start:end])
+        base_name = _extract_name_from_text(window, filename, allow_filename_fallback=False)
+    variant_label = _extract_catalog_variant_near_index(lines, index, codigo_producto)
+    return _compose_catalog_name(base_name, variant_label)
+
+
+def _page_marker(page_number: int) -> str:
+    return f"[[PAGE:{page_number}]]"
+
+
+def _parse_page_marker(line: str) -> int | None:
+    match = PAGE_MARKER_RE.fullmatch((line or "").strip())
+    if not match:
+        return None
+    return int(match.group(1))
+
+
+def _extract_pdf_info_from_text(text: str, filename: str) -> dict:
+    clean = _clean_line(text)
+    return {
+        "codigo_producto": _extract_code_from_text(clean, filename),
+        "nombre": _extract_name_from_text(clean, filename),
+        "precio_publico": _extract_price_from_text(clean),
+        "piezas_por_caja": _extract_pieces_from_text(clean),
+        "descripcion": clean[:1200] or None,
+    }
+
+
+def _description_from_lines(lines: list[str]) -> str | None:
+    parts = []
+    for raw in lines:
+        line = _clean_line(raw)
+        upper = line.upper()
+        if len(line) < 5:
+            continue
+        if "$" in line:
+            continue
+        if DESCRIPTION_KEYWORD_RE.search(upper):
+            continue
+        if CODE_ONLY_RE.fullmatch(upper):
+            continue
+        parts.append(line)
+    if not parts:
+        return None
+    return " ".join(_dedupe_keep_order(parts))[:1200]
+
+
+def _candidate_key_for_item(file_id: str, data: dict, index: int) -> str:
+    code = _canonical_code(data.get("codigo_producto"))
+    if code:
+        suffix = code
+    else:
+        name_slug = _slug_text(data.get("nombre") or f"item-{index + 1}")
+        price = data.get("precio_publico")
+        price_key = "sin-precio"
+        try:
+            if price not in (None, ""):
+                price_key = str(int(round(float(price) * 100)))
+        except Exception:
+            price_key = "sin-precio"
+        suffix = f"{name_slug}-{price_key}"
+    return f"{file_id}::item::{suffix[:120]}"
+
+
+def _catalog_price_block(lines: list[str], index: int) -> dict | None:
+    line = lines[index]
+    if "$" not in line or not PRICE_RE.search(line):
+        return None
+    block_lines = lines[max(0, index - CATALOG_BLOCK_RADIUS): min(len(lines), index + CATALOG_BLOCK_RADIUS + 1)]
+    block_text = "\n".join(block_lines)
+    precio_publico = _extract_price_from_lines(block_lines, block_text)
+    if precio_publico in (None, ""):
+        return None
+    return {
+        "index": index,
+        "codigo_producto": _extract_code_from_lines(block_lines, ""),
+        "precio_publico": precio_publico,
+        "piezas_por_caja": _extract_pieces_from_text(block_text),
+        "descripcion": _description_from_lines(block_lines),
+    }
+
+
+def _extract_catalog_items_from_text(text: str | Iterable[str], filename: str, file_id: str) -> list[dict]:
+    chunks = [text] if isinstance(text, str) or text is None else text
+    text_parts = []
+    lines = []
+    line_pages: dict[int, int] = {}
+    line_counts: dict[str, int] = {}
+    blocks = []
+    parsed = 0
+    current_page = 1
+    for chunk in chunks:
+        text_parts.append(chunk or "")
+        for line in (chunk or "").splitlines():
+            raw_line = _clean_line(line)
+            if not raw_line:
+                continue
+            page_number = _parse_page_marker(raw_line)
+            if page_number is not None:
+                current_page = page_number
+                continue
+            line_pages[len(lines)] = current_page
+            lines.append(raw_line)
+            key = _catalog_line_key(raw_line)
+            if key:
+                line_counts[key] = line_counts.get(key, 0) + 1
+        while parsed < len(lines) - CATALOG_BLOCK_RADIUS:
+            block = _catalog_price_block(lines, parsed)
+            if block:
+                blocks.append(block)
+            parsed += 1
+    while parsed < len(lines):
+        block = _catalog_price_block(lines, parsed)
+        if block:
+            blocks.append(block)
+        parsed += 1
+
+    text = "\n".join(text_parts)
+    if not lines:
+        fallback = _extract_pdf_info_from_text(text, filename)
+        fallback["candidate_key"] = _candidate_key_for_item(file_id, fallback, 0)
+        fallback["orden_detectado"] = 0
+        fallback["page_detectada"] = 1
+        return [fallback]
+
+    candidates = {}
+    order = 0
+    for block in blocks:
+        index = block["index"]
+        codigo_producto = block["codigo_producto"]
+        descripcion = block["descripcion"]
+        piezas_por_caja = block["piezas_por_caja"]
+        nombre = _extract_catalog_name_near_index(lines, index, filename, codigo_producto, line_counts=line_counts)
+        item = {
+            "codigo_producto": codigo_producto,
+            "nombre": nombre,
+            "precio_publico": block["precio_publico"],
+            "piezas_por_caja": piezas_por_caja,
+            "descripcion": descripcion,
+            "orden_detectado": order,
+            "page_detectada": line_pages.get(index, 1),
+        }
+        candidate_key = _candidate_key_for_item(file_id, item, order)
+        item["candidate_key"] = candidate_key
+        item["codigo_normalizado"] = _canonical_code(codigo_producto)
+        quality = 0
+        if codigo_producto:
+            quality += 5 + _code_score(codigo_producto)
+        if nombre and nombre != "Producto sin nombre":
+            quality += 4
+        if descripcion:
+            quality += 2
+        if piezas_por_caja:
+            quality += 1
+        if not codigo_producto and (
+            nombre == "Producto sin nombre"
+            or _is_spec_like_name(nombre)
+            or _is_category_like_name(nombre)
+            or not descripcion
+        ):
+            continue
+        existing = candidates.get(candidate_key)
+        if not existing or quality > existing.get("_quality", -1):
+            item["_quality"] = quality
+            candidates[candidate_key] = item
+        order += 1
+
+    results = list(candidates.values())
+    results.sort(key=lambda item: item.get("orden_detectado", 0))
+    for item in results:
+        item.pop("_quality", None)
+
+    if results:
+        return results
+
+    fallback = _extract_pdf_info_from_text(text, filename)
+    fallback["candidate_key"] = _candidate_key_for_item(file_id, fallback, 0)
+    fallback["codigo_normalizado"] = _canonical_code(fallback.get("codigo_producto"))
+    fallback["orden_detectado"] = 0
+    fallback["page_detectada"] = 1
+    return [fallback]
+
+
+def _extract_money_values(text: str, *, allow_plain_numbers: bool = True, blocked_numbers: set[str] | None = None) -> list[float]:
+    blocked_numbers = blocked_numbers or set()
+    values = []
+    patterns = [MONEY_CURRENCY_RE]
+    if allow_plain_numbers:
+        patterns.append(MONEY_PLAIN_RE)
+    for pattern in patterns:
+        for raw in pattern.findall(text or ""):
+            normalized_raw = raw.replace(",", "")
+            integer_part = normalized_raw.split(".", 1)[0]
+            if integer_part in blocked_numbers:
+                continue
+            try:
+                value = float(normalized_raw)
+            except Exception:
+                continue
+            if 1 <= value <= 1000000:
+                values.append(round(value, 2))
+    deduped = []
+    seen = set()
+    for value in values:
+        if value in seen:
+            continue
+        seen.add(value)
+        deduped.append(value)
+    return deduped
+
+
+@lru_cache(maxsize=PARSER_LINE_CACHE_SIZE)
+def _code_score(code: str) -> int:
+    score = 0
+    if "-" in code:
+        score += code.count("-") * 2
+    if UPPER_LETTER_RE.search(code) and DIGIT_RE.search(code):
+        score += 3
+    if len(code) >= 8:
+        score += 2
+    if CODE_THREE_DIGITS_RE.fullmatch(code):
+        score -= 3
+    elif CODE_FOUR_SIX_DIGITS_RE.fullmatch(code):
+        score += 1
+    return score
+
+
+def _prune_code_candidates(codes: list[str]) -> list[str]:
+    unique = []
+    seen = set()
+    for code in codes:
+        if not code or code in seen:
+            continue
+        seen.add(code)
+        unique.append(code)
+    rich_codes = [code for code in unique if _code_score(code) >= 4]
+    pruned = []
+    for code in unique:
+        if any(code != rich and code in rich for rich in rich_codes):
+            continue
+        if rich_codes and CODE_THREE_FOUR_DIGITS_RE.fullmatch(code):
+            continue
+        pruned.append(code)
+    return pruned
+
+
+def _extract_code_candidates(text: str) -> list[str]:
+    return list(_code_candidates(text))
+
+
+@lru_cache(maxsize=PARSER_LINE_CACHE_SIZE)
+def _code_candidates(text: str) -> tuple[str, ...]:
+    if not text:
+        return ()
+    upper = text.upper()
+    found = []
+    for pattern in CODE_CANDIDATE_PATTERNS:
+        for raw in pattern.findall(upper):
+            normalized = _normalize_code_candidate(raw)
+            if normalized:
+                found.append(normalized)
+    return tuple(_prune_code_candidates(found))
+
+
+def _pick_cost_from_context(lines: list[str], index: int, codes: list[str]) -> float | None:
+    window_lines = lines[max(0, index - 1): min(len(lines), index + 3)]
+    window = " ".join(window_lines)
+    digits = [NON_DIGIT_RE.sub("", code) for code in codes]
+    blocked_numbers = {value for value in digits if CODE_THREE_SIX_DIGITS_RE.fullmatch(value)}
+
+    tagged = TAGGED_COST_RE.findall(window)
+    for raw in tagged:
+        try:
+            return round(float(raw.replace(",", "")), 2)
+        except Exception:
+            continue
+
+    currency_values = _extract_money_values(window, allow_plain_numbers=False, blocked_numbers=blocked_numbers)
+    if currency_values:
+        return currency_values[0]
+
+    if COST_KEYWORD_RE.search(window):
+        plain_values = _extract_money_values(window, allow_plain_numbers=True, blocked_numbers=blocked_numbers)
+        if plain_values:
+            return plain_values[0]
+
+    return None
+
+
+def _extract_cost_rows_from_text(raw_text: str, filename: str) -> list[dict]:
+    if not raw_text.strip():
+        return []
+    lines = _clean_lines(raw_text)
+    results = {}
+    for index, line in enumerate(lines):
+        window_text = line
+        if index + 1 < len(lines):
+            window_text = f"{line} {lines[index + 1]}"
+        codes = _code_candidates(window_text)
+        if not codes:
+            continue
+        cost = _pick_cost_from_context(lines, index, codes)
+        if cost is None:
+            continue
+        name = _extract_name_from_text("\n".join(lines[max(0, index - 1): min(len(lines), index + 2)]), filename)
+        for code in codes:
+            quality = _code_score(code) + (2 if "$" in window_text else 0)
+            row = {
+                "codigo_producto": code.upper(),
+                "costo_adquisicion": cost,
+                "nombre_detectado": name,
+                "calidad": quality,
+            }
+            existing = results.get(code)
+            if not existing or row["calidad"] > existing.get("calidad", 0):
+                results[code] = row
+    ordered = sorted(results.values(), key=lambda item: (-item.get("calidad", 0), item.get("codigo_producto") or ""))
+    for item in ordered:
+        item.pop("calidad", None)
+    return ordered
+
+
+def _row_requires_review(row: dict) -> bool:
+    code = (row.get("codigo_producto") or "").strip().upper()
+    if not code:
+        return True
+    if CODE_THREE_DIGITS_RE.fullmatch(code):
+        return True
+    if len(code) < 5:
+        return True
+    if code.count("-") >= 3 and len(code) < 8:
+        return True
+    return False
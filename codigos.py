@@ -0,0 +1,116 @@
+import re
+
+
+def _dedupe_keep_order(values: list[str]) -> list[str]:
+    ordered = []
+    seen = set()
+    for value in values:
+        clean = (value or "").strip()
+        if not clean or clean in seen:
+            continue
+        seen.add(clean)
+        ordered.append(clean)
+    return ordered
+
+
+def _clean_compact_code(value: str | None) -> str:
+    return re.sub(r"[^A-Z0-9]", "", (value or "").upper())
+
+
+def _normalize_letters_segment(value: str) -> str:
+    return (value or "").upper().translate(str.maketrans({"0": "O", "1": "I", "5": "S", "8": "B"}))
+
+
+def _normalize_digits_segment(value: str) -> str:
+    return (value or "").upper().translate(str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "B": "8"}))
+
+
+def _normalize_alnum_segment(value: str) -> str:
+    return re.sub(r"[^A-Z0-9]", "", (value or "").upper())
+
+
+def _normalize_code_candidate(raw: str) -> str | None:
+    cleaned = (raw or "").upper()
+    cleaned = re.sub(r"[^A-Z0-9]+", "-", cleaned)
+    cleaned = re.sub(r"-{2,}", "-", cleaned).strip("-")
+    parts = [part for part in cleaned.split("-") if part]
+
+    if len(parts) == 1:
+        single = _normalize_alnum_segment(parts[0])
+        for index, char in enumerate(single):
+            if index < 2:
+                continue
+            if char.isdigit() or char in {"O", "Q", "D", "I", "L", "S", "B", "Z"}:
+                prefix = _normalize_letters_segment(single[:index])
+                suffix = _normalize_digits_segment(single[index:])
+                if re.fullmatch(r"[A-Z]{2,6}", prefix) and re.fullmatch(r"\d{2,6}", suffix):
+                    return prefix + suffix
+                break
+        if re.fullmatch(r"[A-Z]{2,6}\d{2,6}", _normalize_letters_segment(single[:6]) + _normalize_digits_segment(single[6:])):
+            return single
+        if re.fullmatch(r"\d{3,6}", _normalize_digits_segment(single)):
+            return _normalize_digits_segment(single)
+
+    if len(parts) == 2:
+        first = _normalize_alnum_segment(parts[0])
+        second = _normalize_alnum_segment(parts[1])
+        first_candidate = _normalize_letters_segment(re.sub(r"\d", "", first)) + _normalize_digits_segment(re.sub(r"\D", "", first))
+        if re.fullmatch(r"\d{3}", _normalize_digits_segment(first)) and re.fullmatch(r"[A-Z]{4,20}", _normalize_letters_segment(second)):
+            return _normalize_digits_segment(first)
+        if re.fullmatch(r"[A-Z]{1,4}\d{4,6}", first_candidate) and re.fullmatch(r"[A-Z0-9]{2,12}", second):
+            return f"{first_candidate}-{second}"
+
+    if len(parts) >= 3:
+        first = _normalize_letters_segment(parts[0])
+        second = _normalize_digits_segment(parts[1])
+        third = _normalize_alnum_segment(parts[2])
+        if re.fullmatch(r"[A-Z]{1,5}", first) and re.fullmatch(r"\d{2,5}", second) and re.fullmatch(r"[A-Z0-9]{2,12}", third):
+            return "-".join([first, second, third])
+
+    if 3 <= len(parts) <= 4:
+        fixed_parts = [_normalize_digits_segment(parts[0])] + [_normalize_alnum_segment(part) for part in parts[1:4]]
+        if re.fullmatch(r"\d{2,5}", fixed_parts[0]) and all(re.fullmatch(r"[A-Z0-9]{1,12}", part) for part in fixed_parts[1:]):
+            return "-".join(fixed_parts[: len(parts)])
+
+    return None
+
+
+def _canonical_code(value: str | None) -> str | None:
+    raw = (value or "").strip().upper()
+    if not raw:
+        return None
+    normalized = _normalize_code_candidate(raw)
+    if normalized:
+        return normalized
+    compact = _clean_compact_code(raw)
+    return compact or None
+
+
+def _code_lookup_keys(value: str | None) -> list[str]:
+    raw = (value or "").strip().upper()
+    canonical = _canonical_code(raw)
+    compact_raw = _clean_compact_code(raw)
+    compact_canonical = _clean_compact_code(canonical)
+    return _dedupe_keep_order([raw, canonical or "", compact_raw, compact_canonical])
+
+
+def _indexed_code_keys(value: str | None) -> list[str]:
+    return [key for key in _code_lookup_keys(value) if re.fullmatch(r"[A-Z0-9-]+", key)]
+
+
+def _codigo_columns(codigo_producto: str | None) -> dict:
+    raw = (codigo_producto or "").strip().upper()
+    canonico = _canonical_code(raw)
+    return {
+        "codigo_canonico": canonico,
+        "codigo_compacto": _clean_compact_code(raw) or None,
+        "codigo_canonico_compacto": _clean_compact_code(canonico) or None,
+    }
+
+
+def _variant_code_keys(variantes: list[dict]) -> list[str]:
+    keys = []
+    for variante in variantes or []:
+        columns = _codigo_columns(variante.get("codigo"))
+        keys.extend([columns["codigo_canonico"] or "", columns["codigo_compacto"] or "", columns["codigo_canonico_compacto"] or ""])
+    return _dedupe_keep_order(keys)
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from database import supabase
+
+ESQUEMA_TABLAS = ("productos", "movimientos_caja", "sesiones_caja", "detalle_ventas")
+ESQUEMA_REINTENTO_SEGUNDOS = 60
+
+_columnas: dict[str, frozenset[str]] = {}
+_reintentos: dict[str, float] = {}
+_columnas_lock = threading.Lock()
+
+
+def _columnas_por_rpc(tablas: list[str]) -> dict[str, frozenset[str]] | None:
+    try:
+        rows = supabase.rpc("columnas_tablas", {"p_tablas": tablas}).execute().data or []
+    except Exception:
+        return None
+    encontradas: dict[str, set[str]] = {}
+    for row in rows:
+        encontradas.setdefault(row.get("tabla"), set()).add(row.get("columna"))
+    return {tabla: frozenset(encontradas[tabla]) for tabla in tablas if encontradas.get(tabla)}
+
+
+def _columnas_por_muestra(tabla: str) -> frozenset[str] | None:
+    try:
+        rows = supabase.table(tabla).select("*").limit(1).execute().data or []
+    except Exception:
+        return None
+    return frozenset(rows[0].keys()) if rows else None
+
+
+def _refrescar_esquema(tablas: list[str] | None = None) -> dict[str, list[str] | None]:
+    tablas = list(tablas or ESQUEMA_TABLAS)
+    por_rpc = _columnas_por_rpc(tablas) or {}
+    cargadas = {tabla: por_rpc.get(tabla) or _columnas_por_muestra(tabla) for tabla in tablas}
+    reintento = time.monotonic() + ESQUEMA_REINTENTO_SEGUNDOS
+    with _columnas_lock:
+        for tabla, columnas in cargadas.items():
+            if columnas is None:
+                _reintentos[tabla] = reintento
+            else:
+                _columnas[tabla] = columnas
+                _reintentos.pop(tabla, None)
+    return {tabla: sorted(columnas) if columnas is not None else None for tabla, columnas in cargadas.items()}
+
+
+def _columnas_tabla(tabla: str) -> frozenset[str] | None:
+    if tabla not in _columnas and time.monotonic() >= _reintentos.get(tabla, 0):
+        _refrescar_esquema([tabla])
+    return _columnas.get(tabla)
+
+
+def _tiene_columna(tabla: str, columna: str) -> bool:
+    columnas = _columnas_tabla(tabla)
+    return columnas is None or columna in columnas
+
+
+def _payloads_esquema(tabla: str, payloads: list[dict]) -> list[dict]:
+    candidatos = [dict(payload) for payload in payloads if payload]
+    columnas = _columnas_tabla(tabla)
+    if columnas is None:
+        return candidatos
+    recortados = [{k: v for k, v in payload.items() if k in columnas} for payload in candidatos]
+    mejor = max(recortados, key=len, default=None)
+    return [mejor] if mejor else []
+
+
+def _escribir_esquema(tabla: str, payloads: list[dict], escribir):
+    ultimo_error = None
+    for payload in _payloads_esquema(tabla, payloads):
+        try:
+            return escribir(payload)
+        except Exception as e:
+            ultimo_error = e
+    if ultimo_error is not None:
+        raise ultimo_error
+    return None
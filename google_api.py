@@ -0,0 +1,208 @@
+from typing import BinaryIO
+import os
+import random
+import tempfile
+import threading
+import time
+
+from fastapi import HTTPException
+from requests.adapters import HTTPAdapter
+import requests
+
+GOOGLE_DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+GOOGLE_RETRY_STATUS = {429, 500, 502, 503, 504}
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_SPOOL_BYTES = 8 * 1024 * 1024
+DRIVE_DOWNLOAD_MAX_MB_DEFAULT = 100
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+_metrics: dict[str, dict] = {}
+_metrics_lock = threading.Lock()
+
+
+def _env_number(name: str, default: float, minimum: float = 0) -> float:
+    try:
+        return max(minimum, float(os.getenv(name) or default))
+    except ValueError:
+        return default
+
+
+def _google_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = int(_env_number("GOOGLE_HTTP_POOL_SIZE", 16, minimum=1))
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _record_metric(operation: str, elapsed_ms: float, status_code: int | None, intentos: int) -> None:
+    with _metrics_lock:
+        metric = _metrics.setdefault(operation, {
+            "llamadas": 0,
+            "errores": 0,
+            "reintentos": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "ultimo_status": None,
+        })
+        metric["llamadas"] += 1
+        metric["reintentos"] += max(0, intentos - 1)
+        if status_code is None or status_code >= 400:
+            metric["errores"] += 1
+        metric["total_ms"] += elapsed_ms
+        metric["max_ms"] = max(metric["max_ms"], elapsed_ms)
+        metric["ultimo_status"] = status_code
+
+
+def _google_api_metrics() -> dict:
+    with _metrics_lock:
+        return {
+            operation: {
+                **metric,
+                "total_ms": round(metric["total_ms"], 1),
+                "max_ms": round(metric["max_ms"], 1),
+                "promedio_ms": round(metric["total_ms"] / metric["llamadas"], 1) if metric["llamadas"] else 0.0,
+            }
+            for operation, metric in _metrics.items()
+        }
+
+
+def _retry_delay(response: requests.Response | None, intento: int) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(30.0, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    base = _env_number("GOOGLE_HTTP_BACKOFF_SECONDS", 0.5)
+    return min(30.0, base * (2 ** (intento - 1))) + random.uniform(0, base)
+
+
+def _error_detail(response: requests.Response) -> str:
+    try:
+        payload = response.json()
+    except Exception:
+        payload = None
+    if isinstance(payload, dict):
+        error = payload.get("error")
+        if isinstance(error, dict) and error.get("message"):
+            return error["message"]
+        if isinstance(error, str):
+            return payload.get("error_description") or error
+    return response.text or response.reason or f"HTTP {response.status_code}"
+
+
+def _google_request(
+    method: str,
+    url: str,
+    *,
+    operation: str,
+    error_prefix: str,
+    access_token: str | None = None,
+    timeout: float = 25,
+    stream: bool = False,
+    **kwargs,
+) -> requests.Response:
+    headers = dict(kwargs.pop("headers", None) or {})
+    if access_token:
+        headers["Authorization"] = f"Bearer {access_token}"
+    max_intentos = int(_env_number("GOOGLE_HTTP_MAX_INTENTOS", 4, minimum=1))
+    session = _google_session()
+    inicio = time.perf_counter()
+    intento = 0
+    while True:
+        intento += 1
+        try:
+            response = session.request(method, url, headers=headers, timeout=timeout, stream=stream, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            if intento < max_intentos:
+                time.sleep(_retry_delay(None, intento))
+                continue
+            _record_metric(operation, (time.perf_counter() - inicio) * 1000, None, intento)
+            raise HTTPException(status_code=400, detail=f"{error_prefix}: {exc}")
+        except requests.RequestException as exc:
+            _record_metric(operation, (time.perf_counter() - inicio) * 1000, None, intento)
+            raise HTTPException(status_code=400, detail=f"{error_prefix}: {exc}")
+
+        if response.status_code in GOOGLE_RETRY_STATUS and intento < max_intentos:
+            delay = _retry_delay(response, intento)
+            response.close()
+            time.sleep(delay)
+            continue
+
+        _record_metric(operation, (time.perf_counter() - inicio) * 1000, response.status_code, intento)
+        if response.status_code >= 400:
+            detail = _error_detail(response)
+            response.close()
+            raise HTTPException(status_code=400, detail=f"{error_prefix}: {detail}")
+        return response
+
+
+def _google_json(method: str, url: str, *, operation: str, error_prefix: str, **kwargs) -> dict:
+    response = _google_request(method, url, operation=operation, error_prefix=error_prefix, **kwargs)
+    try:
+        return response.json()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"{error_prefix}: respuesta invalida ({exc})")
+
+
+def _drive_list_children(folder_id: str, access_token: str) -> list[dict]:
+    payload = _google_json(
+        "GET",
+        GOOGLE_DRIVE_FILES_URL,
+        operation="drive.files.list",
+        error_prefix="No se pudo listar la carpeta de Drive",
+        access_token=access_token,
+        params={
+            "q": f"'{folder_id}' in parents and trashed = false",
+            "fields": "files(id,name,mimeType,modifiedTime,size,webViewLink)",
+            "orderBy": "folder,name_natural",
+            "pageSize": "200",
+            "supportsAllDrives": "true",
+            "includeItemsFromAllDrives": "true",
+        },
+    )
+    return payload.get("files") or []
+
+
+def _drive_download_max_bytes() -> int:
+    return int(_env_number("DRIVE_DOWNLOAD_MAX_MB", DRIVE_DOWNLOAD_MAX_MB_DEFAULT, minimum=1) * 1024 * 1024)
+
+
+def _drive_download_file(file_id: str, access_token: str, *, max_bytes: int | None = None) -> BinaryIO:
+    max_bytes = max_bytes or _drive_download_max_bytes()
+    response = _google_request(
+        "GET",
+        f"{GOOGLE_DRIVE_FILES_URL}/{file_id}",
+        operation="drive.files.get_media",
+        error_prefix="No se pudo descargar el archivo de Drive",
+        access_token=access_token,
+        params={"alt": "media", "supportsAllDrives": "true"},
+        timeout=30,
+        stream=True,
+    )
+    limite = f"El archivo de Drive {file_id} excede el tamano maximo de {max_bytes / (1024 * 1024):.0f} MB"
+    with response:
+        declared = str(response.headers.get("Content-Length") or "")
+        if declared.isdigit() and int(declared) > max_bytes:
+            raise HTTPException(status_code=400, detail=limite)
+        buffer = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES)
+        total = 0
+        try:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise HTTPException(status_code=400, detail=limite)
+                buffer.write(chunk)
+        except BaseException:
+            buffer.close()
+            raise
+    buffer.seek(0)
+    return buffer
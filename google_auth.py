@@ -0,0 +1,86 @@
+import threading
+import time
+
+from fastapi import HTTPException
+import jwt
+
+from google_api import _google_json
+
+GOOGLE_OAUTH_TOKEN_URL = "https://oauth2.googleapis.com/token"
+TOKEN_LIFETIME_SECONDS = 3600
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+_token_cache: dict[tuple[str, tuple[str, ...]], tuple[str, float]] = {}
+_token_locks: dict[tuple[str, tuple[str, ...]], threading.Lock] = {}
+_token_locks_guard = threading.Lock()
+
+
+def _token_key(config: dict, scopes: list[str]) -> tuple[str, tuple[str, ...]]:
+    return config["client_email"], tuple(sorted(set(scopes)))
+
+
+def _token_lock(key: tuple[str, tuple[str, ...]]) -> threading.Lock:
+    with _token_locks_guard:
+        lock = _token_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _token_locks[key] = lock
+        return lock
+
+
+def _cached_token(key: tuple[str, tuple[str, ...]]) -> str | None:
+    cached = _token_cache.get(key)
+    if cached and cached[1] - TOKEN_REFRESH_MARGIN_SECONDS > time.time():
+        return cached[0]
+    return None
+
+
+def _request_google_token(config: dict, scopes: tuple[str, ...], service_name: str) -> tuple[str, float]:
+    now = int(time.time())
+    assertion = jwt.encode(
+        {
+            "iss": config["client_email"],
+            "scope": " ".join(scopes),
+            "aud": GOOGLE_OAUTH_TOKEN_URL,
+            "exp": now + TOKEN_LIFETIME_SECONDS,
+            "iat": now,
+        },
+        config["private_key"],
+        algorithm="RS256",
+    )
+    payload = _google_json(
+        "POST",
+        GOOGLE_OAUTH_TOKEN_URL,
+        operation="oauth.token",
+        error_prefix=f"No se pudo autenticar con {service_name}",
+        data={
+            "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+            "assertion": assertion,
+        },
+    )
+    access_token = payload.get("access_token")
+    if not access_token:
+        raise HTTPException(status_code=400, detail=f"{service_name} no devolvio access_token")
+    try:
+        expires_in = int(payload.get("expires_in") or TOKEN_LIFETIME_SECONDS)
+    except (TypeError, ValueError):
+        expires_in = TOKEN_LIFETIME_SECONDS
+    return access_token, now + expires_in
+
+
+def _google_access_token(config: dict, scopes: list[str], service_name: str) -> str:
+    key = _token_key(config, scopes)
+    access_token = _cached_token(key)
+    if access_token:
+        return access_token
+    with _token_lock(key):
+        access_token = _cached_token(key)
+        if access_token:
+            return access_token
+        access_token, expires_at = _request_google_token(config, key[1], service_name)
+        _token_cache[key] = (access_token, expires_at)
+        return access_token
+
+
+def _invalidate_google_token(config: dict, scopes: list[str]) -> None:
+    _token_cache.pop(_token_key(config, scopes), None)
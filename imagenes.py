@@ -0,0 +1,100 @@
+import io
+import multiprocessing
+import os
+import re
+import threading
+
+IMAGEN_TAMANOS = (("thumb", 200), ("sm", 480), ("md", 960), ("lg", 1600))
+IMAGEN_VARIANTE_PRINCIPAL = "lg"
+IMAGEN_EXTENSION = ".webp"
+IMAGEN_CONTENT_TYPE = "image/webp"
+IMAGEN_MAX_PIXELES = 50_000_000
+IMAGEN_MIME_PROCESABLES = {"image/jpeg", "image/jpg", "image/png", "image/webp"}
+IMAGEN_VARIANTE_URL_RE = re.compile(r"^(?P<base>.+)/(?P<nombre>" + "|".join(nombre for nombre, _ in IMAGEN_TAMANOS) + r")\.webp$")
+
+
+def _env_int(name: str, default: int, *, minimum: int = 1) -> int:
+    try:
+        value = int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        value = default
+    return max(minimum, value)
+
+
+_imagen_slots = threading.BoundedSemaphore(_env_int("IMAGEN_WORKERS", 2))
+
+
+def _generar_variantes_imagen(contenido: bytes, calidad: int) -> dict[str, bytes]:
+    from PIL import Image, ImageOps
+
+    lado_maximo = max(lado for _, lado in IMAGEN_TAMANOS)
+    with Image.open(io.BytesIO(contenido)) as original:
+        if original.width * original.height > IMAGEN_MAX_PIXELES:
+            raise ValueError("La imagen excede el maximo de pixeles permitido")
+        transparente = "A" in original.getbands() or "transparency" in original.info
+        if original.format == "JPEG":
+            original.draft("RGB", (lado_maximo, lado_maximo))
+        imagen = ImageOps.exif_transpose(original).convert("RGBA" if transparente else "RGB")
+
+    variantes = {}
+    actual = imagen
+    for nombre, lado in sorted(IMAGEN_TAMANOS, key=lambda item: item[1], reverse=True):
+        if max(actual.size) > lado:
+            actual = actual.copy()
+            actual.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        actual.save(buffer, format="WEBP", quality=calidad, method=4)
+        variantes[nombre] = buffer.getvalue()
+    return variantes
+
+
+def _proceso_variantes_imagen(conexion, contenido: bytes, calidad: int) -> None:
+    try:
+        conexion.send((True, _generar_variantes_imagen(contenido, calidad)))
+    except Exception as e:
+        conexion.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        conexion.close()
+
+
+def _procesar_imagen(contenido: bytes, content_type: str | None) -> dict[str, bytes] | None:
+    if (content_type or "").lower() not in IMAGEN_MIME_PROCESABLES:
+        return None
+    calidad = min(100, _env_int("IMAGEN_CALIDAD_WEBP", 80))
+    timeout = _env_int("IMAGEN_TIMEOUT_SEGUNDOS", 30)
+    contexto = multiprocessing.get_context("spawn")
+    with _imagen_slots:
+        receptor, emisor = contexto.Pipe(duplex=False)
+        proceso = contexto.Process(target=_proceso_variantes_imagen, args=(emisor, contenido, calidad), daemon=True)
+        try:
+            proceso.start()
+            emisor.close()
+            if not receptor.poll(timeout):
+                print(f"ERROR PROCESANDO IMAGEN: tiempo agotado ({timeout} s), se guarda la original")
+                return None
+            ok, resultado = receptor.recv()
+        except EOFError:
+            print("ERROR PROCESANDO IMAGEN: el proceso termino inesperadamente, se guarda la original")
+            return None
+        except Exception as e:
+            print("ERROR PROCESANDO IMAGEN:", e)
+            return None
+        finally:
+            receptor.close()
+            if proceso.is_alive():
+                proceso.terminate()
+            proceso.join(timeout=5)
+            if proceso.is_alive():
+                proceso.kill()
+                proceso.join()
+    if not ok:
+        print(f"ERROR PROCESANDO IMAGEN: {resultado}, se guarda la original")
+        return None
+    return resultado
+
+
+def _variantes_desde_url(url: str | None) -> dict[str, str]:
+    match = IMAGEN_VARIANTE_URL_RE.match((url or "").strip())
+    if not match:
+        return {}
+    return {nombre: f"{match.group('base')}/{nombre}{IMAGEN_EXTENSION}" for nombre, _ in IMAGEN_TAMANOS}
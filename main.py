@@ -20,6 +20,8 @@ from auth import (
 )
 from dependencies import get_current_user
 from dependencies import require_role
+from esquema import _refrescar_esquema
+from storefront_cache import _invalidar_catalogo_storefront, _invalidar_config_storefront
 
 
 from routes.usuarios import router as usuarios_router
@@ -57,6 +59,20 @@ ALGORITHM = os.getenv("ALGORITHM")
 
 app = FastAPI()
 
+
+@app.on_event("startup")
+def cargar_esquema():
+    _refrescar_esquema()
+
+
+@app.on_event("startup")
+def cargar_storefront():
+    try:
+        storefront._storefront_config()
+    except Exception as e:
+        print("ERROR CARGANDO STOREFRONT:", e)
+
+
 # Routers
 app.include_router(mr.router)
 app.include_router(storefront.router)
@@ -768,6 +784,9 @@ def cancelar_empresa(
             detail=f"No se pudo cancelar empresa desde función SQL: {exc}"
         )
 
+    _invalidar_config_storefront()
+    _invalidar_catalogo_storefront()
+
     return {
         "mensaje": "Empresa cancelada definitivamente y respaldada correctamente"
     }
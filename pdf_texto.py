@@ -0,0 +1,109 @@
+from typing import BinaryIO
+import base64
+import io
+import os
+import time
+
+from fastapi import HTTPException
+
+PDF_MAX_PAGINAS_DEFAULT = 120
+PDF_MAX_SEGUNDOS_DEFAULT = 60.0
+BASE64_READ_CHUNK = 3 * 256 * 1024
+
+
+def _pdf_budget(max_paginas: int | None = None, max_segundos: float | None = None) -> tuple[int, float]:
+    if max_paginas is None:
+        try:
+            max_paginas = int((os.getenv("PDF_MAX_PAGINAS") or "").strip() or PDF_MAX_PAGINAS_DEFAULT)
+        except ValueError:
+            max_paginas = PDF_MAX_PAGINAS_DEFAULT
+    if max_segundos is None:
+        try:
+            max_segundos = float((os.getenv("PDF_MAX_SEGUNDOS") or "").strip() or PDF_MAX_SEGUNDOS_DEFAULT)
+        except ValueError:
+            max_segundos = PDF_MAX_SEGUNDOS_DEFAULT
+    return max(1, int(max_paginas)), max(1.0, float(max_segundos))
+
+
+def _nuevo_reporte_paginas() -> dict:
+    return {
+        "paginas_totales": 0,
+        "paginas_procesadas": 0,
+        "paginas_con_texto": 0,
+        "paginas_omitidas": [],
+        "paginas_con_error": [],
+        "limite_alcanzado": None,
+    }
+
+
+def _pdf_reader(source):
+    try:
+        from pypdf import PdfReader
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"pypdf no esta disponible en el backend: {exc}")
+
+    if isinstance(source, (bytes, bytearray)):
+        stream = io.BytesIO(source)
+    else:
+        stream = source
+        stream.seek(0)
+    try:
+        return PdfReader(stream)
+    except Exception:
+        return None
+
+
+def _iter_pdf_pages(source, reporte: dict | None = None, *, max_paginas: int | None = None, max_segundos: float | None = None):
+    reporte = reporte if reporte is not None else _nuevo_reporte_paginas()
+    reporte.update(_nuevo_reporte_paginas())
+    reader = _pdf_reader(source)
+    if reader is None:
+        return
+
+    max_paginas, max_segundos = _pdf_budget(max_paginas, max_segundos)
+    total = len(reader.pages)
+    reporte["paginas_totales"] = total
+    started = time.monotonic()
+    for page_number in range(1, total + 1):
+        if page_number > max_paginas:
+            reporte["limite_alcanzado"] = "paginas"
+        elif time.monotonic() - started > max_segundos:
+            reporte["limite_alcanzado"] = "tiempo"
+        if reporte["limite_alcanzado"]:
+            reporte["paginas_omitidas"] = list(range(page_number, total + 1))
+            return
+        try:
+            page_text = reader.pages[page_number - 1].extract_text() or ""
+        except Exception:
+            reporte["paginas_con_error"].append(page_number)
+            continue
+        reporte["paginas_procesadas"] += 1
+        if page_text.strip():
+            reporte["paginas_con_texto"] += 1
+        yield page_number, page_text
+
+
+def _pdf_page_count(source) -> int:
+    reader = _pdf_reader(source)
+    return len(reader.pages) if reader is not None else 0
+
+
+def _pdf_base64(source: bytes | BinaryIO) -> bytes | bytearray:
+    if isinstance(source, (bytes, bytearray)):
+        return base64.b64encode(source)
+    source.seek(0)
+    encoded = bytearray()
+    while True:
+        chunk = source.read(BASE64_READ_CHUNK)
+        if not chunk:
+            break
+        encoded += base64.b64encode(chunk)
+    return encoded
+
+
+def _advertencia_paginas(reporte: dict | None) -> str | None:
+    if not reporte or not reporte.get("paginas_omitidas"):
+        return None
+    omitidas = reporte["paginas_omitidas"]
+    motivo = "limite de paginas" if reporte.get("limite_alcanzado") == "paginas" else "limite de tiempo"
+    return f"Se omitieron {len(omitidas)} de {reporte.get('paginas_totales')} paginas (desde la {omitidas[0]}) por {motivo}; aumenta max_paginas o max_segundos para leer el PDF completo."
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, EmailStr, Field
 from dependencies import get_current_user
 from database import supabase
+from esquema import _refrescar_esquema
 from datetime import datetime
 from typing import Literal
 import bcrypt
@@ -875,6 +876,12 @@ def resumen_empresa(empresa_id: str, usuario=Depends(get_current_user)):
     }
 
 
+@router.post("/esquema/refrescar")
+def refrescar_esquema(usuario=Depends(get_current_user)):
+    validar_admin(usuario)
+    return {"mensaje": "Esquema actualizado", "columnas": _refrescar_esquema()}
+
+
 @router.get("/saas-metrics")
 def saas_metrics(usuario=Depends(get_current_user)):
     validar_admin(usuario)
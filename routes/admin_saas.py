@@ -4,6 +4,7 @@ from datetime import date, datetime
 from fastapi.responses import JSONResponse
 from dependencies import require_role
 from pydantic import BaseModel, Field
+from storefront_cache import _invalidar_config_storefront
 from typing import Literal
 import uuid
 
@@ -382,6 +383,7 @@ def suspender_empresa(empresa_id: str, usuario=Depends(require_role(ADMIN_MASTER
         .update({"estado": "suspendida"}) \
         .eq("id", empresa_id) \
         .execute()
+    _invalidar_config_storefront()
 
     return {"mensaje": "Empresa suspendida manualmente"}
 
@@ -433,6 +435,7 @@ def reactivar_empresa(
         .update({"cancelacion_pendiente": False}) \
         .eq("id", empresa_id) \
         .execute()
+    _invalidar_config_storefront()
 
     return {"mensaje": "Empresa reactivada correctamente"}
 
@@ -494,6 +497,7 @@ def marcar_pagado(
         .update({"cancelacion_pendiente": False}) \
         .eq("id", empresa_id) \
         .execute()
+    _invalidar_config_storefront()
 
     return {"mensaje": "Pago confirmado y empresa reactivada"}
 
@@ -519,6 +523,7 @@ def aprobar_cancelacion(empresa_id: str, usuario=Depends(require_role(ADMIN_MAST
         }) \
         .eq("id", empresa_id) \
         .execute()
+    _invalidar_config_storefront()
 
     return {"mensaje": "Empresa suspendida tras cancelación aprobada"}
 
@@ -541,6 +546,7 @@ def eliminar_empresa(
             status_code=400,
             detail=f"No se pudo eliminar empresa desde función SQL: {exc}"
         )
+    _invalidar_config_storefront()
 
     if descargar:
         backup = (
@@ -6,6 +6,7 @@ from pydantic import BaseModel, Field
 
 from database import supabase
 from dependencies import get_current_user
+from esquema import _escribir_esquema
 
 router = APIRouter(prefix="/caja", tags=["Caja"])
 
@@ -224,10 +225,7 @@ def registrar_movimiento(datos: MovimientoCaja, usuario=Depends(get_current_user
         "fecha_creacion": datetime.utcnow().isoformat(),
     }
 
-    try:
-        mov = supabase.table("movimientos_caja").insert(payload_full).execute()
-    except Exception:
-        mov = supabase.table("movimientos_caja").insert(payload_min).execute()
+    mov = _escribir_esquema("movimientos_caja", [payload_full, payload_min], lambda payload: supabase.table("movimientos_caja").insert(payload).execute())
 
     return {"mensaje": "Movimiento registrado", "data": mov.data[0] if mov.data else payload_full}
 
@@ -295,22 +293,17 @@ def cerrar_caja(id_sesion: str, datos: CierreCaja, usuario=Depends(get_current_u
         "abierta": False,
     }
 
-    try:
-        resp = (
+    resp = _escribir_esquema(
+        "sesiones_caja",
+        [payload, payload_min],
+        lambda cambios: (
             supabase.table("sesiones_caja")
-            .update(payload)
+            .update(cambios)
             .eq("id", id_sesion)
             .eq("id_empresa", id_empresa)
             .execute()
-        )
-    except Exception:
-        resp = (
-            supabase.table("sesiones_caja")
-            .update(payload_min)
-            .eq("id", id_sesion)
-            .eq("id_empresa", id_empresa)
-            .execute()
-        )
+        ),
+    )
 
     return {
         "mensaje": "Caja cerrada",
@@ -1,38 +1,68 @@
-from datetime import datetime
-import base64
-import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from multiprocessing.connection import wait as wait_connections
+from typing import BinaryIO
 import json
+import multiprocessing
 import os
 import re
+import shutil
+import tempfile
 import time
-import unicodedata
-import urllib.error
-import urllib.parse
-import urllib.request
 import uuid
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-import jwt
 
+from catalogo_parser import (
+    _candidate_key_for_item,
+    _code_score,
+    _extract_catalog_items_from_text,
+    _extract_code_from_text,
+    _extract_cost_rows_from_text,
+    _extract_name_from_text,
+    _extract_pdf_info_from_text,
+    _is_generic_catalog_name,
+    _page_marker,
+    _row_requires_review,
+    _slug_text,
+)
+from busqueda_codigos import CODE_LOOKUP_CHUNK_SIZE, _chunked, _rows_by_code_keys
+from codigos import (
+    _canonical_code,
+    _code_lookup_keys,
+    _codigo_columns,
+    _dedupe_keep_order,
+    _indexed_code_keys,
+)
 from database import supabase
 from dependencies import get_current_user
-from routes.productos import _extract_variantes_metadata
+from google_api import _drive_download_file, _drive_list_children, _google_api_metrics, _google_json
+from google_auth import _google_access_token
+from pdf_texto import _advertencia_paginas, _iter_pdf_pages, _nuevo_reporte_paginas, _pdf_base64, _pdf_budget, _pdf_page_count
+from routes.productos import _variantes_producto
+from storefront_cache import _invalidar_catalogo_storefront
 
 router = APIRouter(prefix="/drive-sync", tags=["Drive Sync"])
 
 GOOGLE_DRIVE_SCOPE = "https://www.googleapis.com/auth/drive.readonly"
 GOOGLE_VISION_SCOPE = "https://www.googleapis.com/auth/cloud-vision"
-GOOGLE_OAUTH_TOKEN_URL = "https://oauth2.googleapis.com/token"
-GOOGLE_DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
 GOOGLE_VISION_FILES_ANNOTATE_URL = "https://vision.googleapis.com/v1/files:annotate"
 GOOGLE_DRIVE_FOLDER_MIME = "application/vnd.google-apps.folder"
+VISION_PAGES_PER_REQUEST = 5
+VISION_CONTENT_PLACEHOLDER = "__vision_content__"
+RPC_INEXISTENTE_CODIGOS = {"PGRST202", "42883"}
+REVISION_BATCH_MAX = 1000
+STAGE_CLAVES_REQUERIDAS = ("id", "id_empresa", "id_fuente", "drive_file_id", "nombre_archivo", "drive_item_id", "tipo_cambio")
 
 
 class DriveSyncRequest(BaseModel):
     folder_id: str | None = None
     nombre_fuente: str | None = None
     proveedor: str | None = None
+    max_paginas: int | None = Field(default=None, ge=1)
+    max_segundos: float | None = Field(default=None, ge=1)
 
 
 class DriveReviewResolveRequest(BaseModel):
@@ -46,6 +76,14 @@ class DriveReviewResolveRequest(BaseModel):
     destacado: bool | None = None
 
 
+class DriveReviewBatchDecision(DriveReviewResolveRequest):
+    id_revision: str = Field(min_length=1, max_length=64)
+
+
+class DriveReviewBatchRequest(BaseModel):
+    decisiones: list[DriveReviewBatchDecision]
+
+
 class CostoProveedorIn(BaseModel):
     codigo_producto: str = Field(min_length=2, max_length=80)
     costo_adquisicion: float = Field(ge=0)
@@ -64,12 +102,6 @@ def _id_empresa(usuario: dict) -> str:
     return id_empresa
 
 
-def _slug_text(texto: str) -> str:
-    value = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
-    value = re.sub(r"[^a-zA-Z0-9]+", "-", value.lower()).strip("-")
-    return value[:160] or f"producto-{uuid.uuid4().hex[:8]}"
-
-
 def _drive_private_key() -> str:
     return (os.getenv("GOOGLE_SERVICE_ACCOUNT_PRIVATE_KEY") or "").replace("\\n", "\n").strip()
 
@@ -89,424 +121,18 @@ def _drive_config(folder_id_override: str | None = None) -> dict:
     return {**_google_service_config(), "folder_id": folder_id}
 
 
-def _google_access_token(config: dict, scopes: list[str], service_name: str) -> str:
-    now = int(time.time())
-    assertion = jwt.encode(
-        {
-            "iss": config["client_email"],
-            "scope": " ".join(scopes),
-            "aud": GOOGLE_OAUTH_TOKEN_URL,
-            "exp": now + 3600,
-            "iat": now,
-        },
-        config["private_key"],
-        algorithm="RS256",
-    )
-    body = urllib.parse.urlencode({
-        "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
-        "assertion": assertion,
-    }).encode("utf-8")
-    request = urllib.request.Request(
-        GOOGLE_OAUTH_TOKEN_URL,
-        data=body,
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        method="POST",
-    )
-    try:
-        with urllib.request.urlopen(request, timeout=25) as response:
-            payload = json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as exc:
-        detail = exc.read().decode("utf-8", errors="ignore")
-        raise HTTPException(status_code=400, detail=f"No se pudo autenticar con {service_name}: {detail or exc.reason}")
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"No se pudo autenticar con {service_name}: {exc}")
-    access_token = payload.get("access_token")
-    if not access_token:
-        raise HTTPException(status_code=400, detail=f"{service_name} no devolvio access_token")
-    return access_token
-
-
 def _drive_access_token(config: dict) -> str:
     return _google_access_token(config, [GOOGLE_DRIVE_SCOPE], "Google Drive")
 
 
-def _drive_list_children(folder_id: str, access_token: str) -> list[dict]:
-    params = urllib.parse.urlencode({
-        "q": f"'{folder_id}' in parents and trashed = false",
-        "fields": "files(id,name,mimeType,modifiedTime,size,webViewLink)",
-        "orderBy": "folder,name_natural",
-        "pageSize": "200",
-        "supportsAllDrives": "true",
-        "includeItemsFromAllDrives": "true",
-    })
-    request = urllib.request.Request(
-        f"{GOOGLE_DRIVE_FILES_URL}?{params}",
-        headers={"Authorization": f"Bearer {access_token}"},
-        method="GET",
-    )
-    try:
-        with urllib.request.urlopen(request, timeout=25) as response:
-            payload = json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as exc:
-        detail = exc.read().decode("utf-8", errors="ignore")
-        raise HTTPException(status_code=400, detail=f"No se pudo listar la carpeta de Drive: {detail or exc.reason}")
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"No se pudo listar la carpeta de Drive: {exc}")
-    return payload.get("files") or []
-
-
-def _drive_download_file(file_id: str, access_token: str) -> bytes:
-    request = urllib.request.Request(
-        f"{GOOGLE_DRIVE_FILES_URL}/{file_id}?alt=media&supportsAllDrives=true",
-        headers={"Authorization": f"Bearer {access_token}"},
-        method="GET",
-    )
-    with urllib.request.urlopen(request, timeout=30) as response:
-        return response.read()
-
-
-def _dedupe_keep_order(values: list[str]) -> list[str]:
-    ordered = []
-    seen = set()
-    for value in values:
-        clean = (value or "").strip()
-        if not clean or clean in seen:
-            continue
-        seen.add(clean)
-        ordered.append(clean)
-    return ordered
-
-
-def _clean_compact_code(value: str | None) -> str:
-    return re.sub(r"[^A-Z0-9]", "", (value or "").upper())
-
-
-def _extract_price_from_text(text: str) -> float | None:
-    if not text:
-        return None
-    lines = [re.sub(r"\s+", " ", line).strip() for line in (text or "").splitlines()]
-    lines = [line for line in lines if line]
-    candidates = []
-
-    for index, line in enumerate(lines[:80]):
-        for raw in re.findall(r"\$\s*([0-9][0-9,.]{0,12})", line, flags=re.IGNORECASE):
-            try:
-                value = float(raw.replace(",", ""))
-            except Exception:
-                continue
-            if not (1 <= value <= 1000000):
-                continue
-            score = 5
-            upper_line = line.upper()
-            if "PUBLIC" in upper_line:
-                score += 8
-            if "PRECIO" in upper_line or "VENTA" in upper_line:
-                score += 5
-            if "P/PZA" in upper_line or "PZA." in upper_line:
-                score += 3
-            if "DISTRIBUIDOR" in upper_line or "COSTO" in upper_line:
-                score -= 7
-            if index < 20:
-                score += 2
-            candidates.append((score, value))
-
-    if candidates:
-        candidates.sort(key=lambda item: (item[0], item[1]), reverse=True)
-        return round(candidates[0][1], 2)
-
-    for raw in re.findall(r"\$\s*([0-9][0-9,.]{0,12})", text, flags=re.IGNORECASE):
-        try:
-            value = float(raw.replace(",", ""))
-        except Exception:
-            continue
-        if 1 <= value <= 1000000:
-            return round(value, 2)
-    return None
-
-
-def _extract_pieces_from_text(text: str) -> int | None:
-    match = re.search(r"(\d+)\s+PIEZAS", text, flags=re.IGNORECASE)
-    return int(match.group(1)) if match else None
-
-
-def _extract_code_from_text(text: str, filename: str) -> str | None:
-    ranked: list[tuple[int, str]] = []
-    lines = [re.sub(r"\s+", " ", line).strip() for line in (text or "").splitlines()]
-    lines = [line for line in lines if line]
-
-    labeled_patterns = [
-        r"(?:CODIGO|CLAVE|MODELO|SKU|REF(?:ERENCIA)?)[:#\s-]{0,6}([A-Z0-9][A-Z0-9\-\s]{2,40})",
-    ]
-    for index, line in enumerate(lines[:80]):
-        for pattern in labeled_patterns:
-            for raw in re.findall(pattern, line.upper()):
-                candidate = _normalize_code_candidate(raw)
-                if candidate:
-                    ranked.append((12 + _code_score(candidate) - min(index, 8), candidate))
-
-        for candidate in _extract_code_candidates(line):
-            bonus = 0
-            if re.search(r"CODIGO|CLAVE|MODELO|SKU|REF", line, flags=re.IGNORECASE):
-                bonus += 5
-            if index < 12:
-                bonus += 2
-            ranked.append((_code_score(candidate) + bonus, candidate))
-
-    for candidate in _extract_code_candidates((filename or "").upper()):
-        ranked.append((_code_score(candidate) + 1, candidate))
-
-    if not ranked:
-        return None
-    ranked.sort(key=lambda item: (item[0], len(item[1]), item[1]), reverse=True)
-    return ranked[0][1]
-
-
-def _normalized_name_text(value: str) -> str:
-    normalized = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode("ascii")
-    return re.sub(r"\s+", " ", normalized).strip().upper()
-
-
-def _filename_name_tokens(filename: str) -> set[str]:
-    base = os.path.splitext(filename or "")[0]
-    normalized = re.sub(r"[^A-Z0-9]+", " ", _normalized_name_text(base)).strip()
-    return {token for token in normalized.split() if len(token) >= 4}
-
-
-GENERIC_NAME_PATTERNS = [
-    r"^\d+\s+SECCIONES?$",
-    r"^SECCIONES?$",
-    r"^PROXIMAMENTE$",
-    r"^NOVEDAD(?:ES)?$",
-    r"^DISPONIBLE(?:S)?$",
-    r"^AGOTADO(?:S)?$",
-    r"^CAT(?:ALOGO)?$",
-    r"^CAT\.?.*$",
-]
-
-
-def _catalog_line_key(line: str) -> str:
-    upper = _normalized_name_text(line)
-    return re.sub(r"[^A-Z0-9]+", " ", upper).strip()
-
-
-def _is_spec_like_name(line: str) -> bool:
-    upper = _normalized_name_text(line)
-    if not upper:
-        return True
-    if re.search(r"\b(FRECUENCIA|POTENCIA|VOLTAJE|VOLTAGE|AMPERAJE|AMPERAJE|LUMEN(?:ES)?|TEMPERATURA|MEDIDA|MEDIDAS|DIMENSION(?:ES)?|CONTROL REMOTO|BLUETOOTH|WIFI|CRI|COLOR|MATERIAL)\b", upper):
-        return True
-    if ":" in (line or "") and re.search(r"\b\d+(?:\.\d+)?\s*(W|V|HZ|H|K|LM|G)\b", upper):
-        return True
-    if re.fullmatch(r"[A-Z]{1,4}\s+\d+(?:\.\d+)?[A-Z]+", upper):
-        return True
-    return False
-
-
-def _is_category_like_name(line: str) -> bool:
-    clean = re.sub(r"\s+", " ", (line or "")).strip()
-    upper = _normalized_name_text(clean)
-    if not upper:
-        return True
-    if any(symbol in clean for symbol in ["&", ","]) and len(clean.split()) >= 3 and not re.search(r"\d", clean):
-        return True
-    return False
-
-
-def _is_generic_catalog_name(line: str, filename: str) -> bool:
-    clean = re.sub(r"\s+", " ", (line or "")).strip()
-    upper = _normalized_name_text(clean)
-    if not upper:
-        return True
-    if clean.startswith(("-", "*", "•")) and len(clean.split()) <= 4:
-        return True
-    if clean.endswith(":") and len(clean.split()) <= 4:
-        return True
-    if _is_spec_like_name(clean) or _is_category_like_name(clean):
-        return True
-    if any(token in upper for token in ["TEPEYAC", "CATALOGO", "COMPRIMIDO", "PDF"]):
-        return True
-    if re.search(r"CODIGO|CLAVE|MODELO|SKU|PIEZAS|MEDIDAS|COLOR|PRECIO|PUBLICO|VENTA", upper):
-        return True
-    if re.fullmatch(r"[A-Z0-9-]{4,}", upper):
-        return True
-    if any(re.fullmatch(pattern, upper) for pattern in GENERIC_NAME_PATTERNS):
-        return True
-    if re.search(r"\b\d+\s+SECCIONES?\b", upper):
-        return True
-    filename_tokens = _filename_name_tokens(filename)
-    line_tokens = {token for token in re.sub(r"[^A-Z0-9]+", " ", upper).split() if len(token) >= 4}
-    if filename_tokens and line_tokens and len(line_tokens & filename_tokens) >= max(2, len(line_tokens) - 1):
-        return True
-    return False
-
-
-def _score_name_candidate(line: str, filename: str, repeated_count: int = 1) -> int:
-    clean = re.sub(r"\s+", " ", (line or "").strip())
-    upper = _normalized_name_text(clean)
-    if len(clean) < 4:
-        return -100
-    if clean.startswith(("-", "*", "•")):
-        return -90
-    if clean.endswith(":") and len(clean.split()) <= 5:
-        return -90
-    if "$" in clean:
-        return -100
-    if re.search(r"\b\d{2,}[.,]?\d*\b", clean):
-        return -40
-    if repeated_count >= 4 and len(clean.split()) <= 4:
-        return -85
-    if _is_generic_catalog_name(clean, filename):
-        return -80
-
-    score = 0
-    words = [word for word in clean.split() if word]
-    if len(words) >= 2:
-        score += 5
-    if 8 <= len(clean) <= 60:
-        score += 4
-    if re.search(r"[A-Z]", upper) and not re.search(r"\d", clean):
-        score += 3
-    if re.search(r"INTERIOR|LAMBRIN|MURO|PANEL|DECK|REVESTIMIENTO|PARED|FACHADA", upper):
-        score += 4
-    score += min(len(words), 5)
-    if repeated_count >= 3:
-        score -= min(8, repeated_count * 2)
-    return score
-
-
-def _extract_name_from_text(text: str, filename: str, *, allow_filename_fallback: bool = True) -> str:
-
-    best_line = None
-    best_score = -100
-    if text:
-        for raw in text.splitlines()[:50]:
-            line = re.sub(r"\s+", " ", raw).strip()
-            score = _score_name_candidate(line, filename)
-            if score > best_score:
-                best_score = score
-                best_line = line
-    if best_line and best_score >= 0:
-        return best_line.title()[:140]
-    if not allow_filename_fallback:
-        return "Producto sin nombre"
-    base = os.path.splitext(filename or "")[0]
-    return re.sub(r"[_-]+", " ", base).strip()[:140] or "Producto sin nombre"
-
-
-def _variant_label_from_code(codigo_producto: str | None) -> str | None:
-    upper = _normalized_name_text(codigo_producto or "")
-    match = re.search(r"(?:^|-)0*(\d+)SEC(?:$|-)", upper)
-    if match:
-        cantidad = int(match.group(1))
-        return f"{cantidad} Secciones"
-    return None
-
-
-def _extract_catalog_variant_near_index(lines: list[str], index: int, codigo_producto: str | None) -> str | None:
-    start = max(0, index - 4)
-    end = min(len(lines), index + 2)
-    for pos in range(start, end):
-        line = re.sub(r"\s+", " ", (lines[pos] or "")).strip()
-        upper = _normalized_name_text(line)
-        if not upper:
-            continue
-        match = re.search(r"\b(\d+)\s+SECCIONES?\b", upper)
-        if match:
-            return f"{int(match.group(1))} Secciones"
-    return _variant_label_from_code(codigo_producto)
-
-
-def _compose_catalog_name(base_name: str, variant_label: str | None) -> str:
-    name = (base_name or "").strip() or "Producto sin nombre"
-    if not variant_label:
-        return name[:140]
-    normalized_name = _normalized_name_text(name)
-    normalized_variant = _normalized_name_text(variant_label)
-    if normalized_variant and normalized_variant in normalized_name:
-        return name[:140]
-    if name == "Producto sin nombre":
-        return variant_label[:140]
-    return f"{name} {variant_label}"[:140]
-
-
-def _extract_catalog_name_near_index(
-    lines: list[str],
-    index: int,
-    filename: str,
-    codigo_producto: str | None = None,
-    line_counts: dict[str, int] | None = None,
-) -> str:
-    start = max(0, index - 8)
-    end = min(len(lines), index + 3)
-    ranked = []
-    for pos in range(start, end):
-        line = re.sub(r"\s+", " ", (lines[pos] or "")).strip()
-        if not line:
-            continue
-        repeated_count = (line_counts or {}).get(_catalog_line_key(line), 1)
-        score = _score_name_candidate(line, filename, repeated_count=repeated_count)
-        if score < 0:
-            continue
-        distance = abs(index - pos)
-        if pos <= index:
-            score += 3
-        if distance <= 2:
-            score += 2
-        if distance >= 6:
-            score -= 2
-        ranked.append((score, -distance, -pos, line))
-    if ranked:
-        ranked.sort(reverse=True)
-        base_name = ranked[0][3].title()[:140]
-    else:
-        window = "\n".join(lines[start:end])
-        base_name = _extract_name_from_text(window, filename, allow_filename_fallback=False)
-    variant_label = _extract_catalog_variant_near_index(lines, index, codigo_producto)
-    return _compose_catalog_name(base_name, variant_label)
-
-
-def _page_marker(page_number: int) -> str:
-    return f"[[PAGE:{page_number}]]"
-
-
-def _parse_page_marker(line: str) -> int | None:
-    match = re.fullmatch(r"\[\[PAGE:(\d+)\]\]", (line or "").strip())
-    if not match:
-        return None
-    return int(match.group(1))
-
-
-def _extract_pdf_text(file_bytes: bytes) -> str:
-
-    try:
-        from pypdf import PdfReader
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"pypdf no esta disponible en el backend: {exc}")
-
-    try:
-        reader = PdfReader(io.BytesIO(file_bytes))
-    except Exception:
-        return ""
-
-    chunks = []
-    for page_number, page in enumerate(reader.pages[:12], start=1):
-        try:
-            page_text = page.extract_text() or ""
-        except Exception:
-            continue
+def _pdf_text_chunks(source: bytes | BinaryIO, reporte: dict | None = None, *, max_paginas: int | None = None, max_segundos: float | None = None):
+    for page_number, page_text in _iter_pdf_pages(source, reporte, max_paginas=max_paginas, max_segundos=max_segundos):
         if page_text.strip():
-            chunks.append(_page_marker(page_number))
-            chunks.append(page_text)
-    return "\n".join(chunks)
+            yield f"{_page_marker(page_number)}\n{page_text}"
 
 
-def _pdf_page_count(file_bytes: bytes) -> int:
-    try:
-        from pypdf import PdfReader
-        reader = PdfReader(io.BytesIO(file_bytes))
-        return len(reader.pages)
-    except Exception:
-        return 0
+def _extract_pdf_text(source: bytes | BinaryIO, reporte: dict | None = None, *, max_paginas: int | None = None, max_segundos: float | None = None) -> str:
+    return "\n".join(_pdf_text_chunks(source, reporte, max_paginas=max_paginas, max_segundos=max_segundos))
 
 
 def _vision_parent() -> str | None:
@@ -529,209 +155,92 @@ def _vision_enabled() -> bool:
     return value not in {"0", "false", "no", "off"}
 
 
-def _vision_ocr_pdf(file_bytes: bytes, filename: str, config: dict) -> str:
-    if not _vision_enabled():
-        return ""
-
-    total_pages = _pdf_page_count(file_bytes)
-    if total_pages <= 0:
-        return ""
-
-    access_token = _google_access_token(config, [GOOGLE_VISION_SCOPE], "Google Vision")
-    full_chunks = []
-    encoded_content = base64.b64encode(file_bytes).decode("utf-8")
-    parent = _vision_parent()
-
-    for start in range(1, total_pages + 1, 5):
-        pages = list(range(start, min(start + 5, total_pages + 1)))
-        payload = {
-            "requests": [
-                {
-                    "inputConfig": {
-                        "mimeType": "application/pdf",
-                        "content": encoded_content,
-                    },
-                    "features": [{"type": "DOCUMENT_TEXT_DETECTION"}],
-                    "pages": pages,
-                }
-            ]
-        }
-        endpoint_url = _vision_endpoint(parent)
-
-        request = urllib.request.Request(
-            endpoint_url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json; charset=utf-8",
-            },
-            method="POST",
-        )
-        try:
-            with urllib.request.urlopen(request, timeout=120) as response:
-                response_payload = json.loads(response.read().decode("utf-8"))
-        except urllib.error.HTTPError as exc:
-            detail = exc.read().decode("utf-8", errors="ignore")
-            raise HTTPException(status_code=400, detail=f"No se pudo ejecutar OCR con Google Vision para {filename}: {detail or exc.reason}")
-        except Exception as exc:
-            raise HTTPException(status_code=400, detail=f"No se pudo ejecutar OCR con Google Vision para {filename}: {exc}")
-
-        file_responses = response_payload.get("responses") or []
-        annotate_file = file_responses[0] if file_responses else {}
-        image_responses = annotate_file.get("responses") or []
-        for response_index, image_response in enumerate(image_responses):
-            if image_response.get("error", {}).get("message"):
-                continue
-            text_value = ((image_response.get("fullTextAnnotation") or {}).get("text") or "").strip()
-            if text_value:
-                page_number = pages[response_index] if response_index < len(pages) else pages[0]
-                full_chunks.append(_page_marker(page_number))
-                full_chunks.append(text_value)
-
-    return "\n".join(full_chunks)
+def _vision_ocr_concurrency() -> int:
+    return _env_int("GOOGLE_VISION_OCR_CONCURRENCY", 4)
 
 
-def _extract_pdf_info_from_text(text: str, filename: str) -> dict:
-    clean = re.sub(r"\s+", " ", text).strip()
-    return {
-        "codigo_producto": _extract_code_from_text(clean, filename),
-        "nombre": _extract_name_from_text(clean, filename),
-        "precio_publico": _extract_price_from_text(clean),
-        "piezas_por_caja": _extract_pieces_from_text(clean),
-        "descripcion": clean[:1200] or None,
+def _vision_request_body(encoded_content: bytes | bytearray, pages: list[int]) -> bytes:
+    payload = {
+        "requests": [
+            {
+                "inputConfig": {
+                    "mimeType": "application/pdf",
+                    "content": VISION_CONTENT_PLACEHOLDER,
+                },
+                "features": [{"type": "DOCUMENT_TEXT_DETECTION"}],
+                "pages": pages,
+            }
+        ]
     }
+    prefix, suffix = json.dumps(payload).encode("utf-8").split(VISION_CONTENT_PLACEHOLDER.encode("utf-8"), 1)
+    return b"".join([prefix, encoded_content, suffix])
+
+
+def _vision_annotate_window(endpoint_url: str, access_token: str, encoded_content: bytes | bytearray, pages: list[int], filename: str) -> list[tuple[int, str]]:
+    response_payload = _google_json(
+        "POST",
+        endpoint_url,
+        operation="vision.files.annotate",
+        error_prefix=f"No se pudo ejecutar OCR con Google Vision para {filename}",
+        access_token=access_token,
+        data=_vision_request_body(encoded_content, pages),
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        timeout=120,
+    )
 
-
-def _description_from_lines(lines: list[str]) -> str | None:
-    parts = []
-    for raw in lines:
-        line = re.sub(r"\s+", " ", raw).strip()
-        upper = line.upper()
-        if len(line) < 5:
-            continue
-        if "$" in line:
-            continue
-        if re.search(r"CODIGO|CLAVE|MODELO|SKU|REF|PIEZAS|MEDIDAS|COLOR|PRECIO|PUBLICO|VENTA", upper):
-            continue
-        if re.fullmatch(r"[A-Z0-9\-]{4,}", upper):
+    file_responses = response_payload.get("responses") or []
+    annotate_file = file_responses[0] if file_responses else {}
+    image_responses = annotate_file.get("responses") or []
+    page_texts = []
+    for response_index, image_response in enumerate(image_responses):
+        if image_response.get("error", {}).get("message"):
             continue
-        parts.append(line)
-    if not parts:
-        return None
-    return " ".join(_dedupe_keep_order(parts))[:1200]
+        text_value = ((image_response.get("fullTextAnnotation") or {}).get("text") or "").strip()
+        if text_value:
+            page_number = pages[response_index] if response_index < len(pages) else pages[0]
+            page_texts.append((page_number, text_value))
+    return page_texts
 
 
-def _candidate_key_for_item(file_id: str, data: dict, index: int) -> str:
-    code = _canonical_code(data.get("codigo_producto"))
-    if code:
-        suffix = code
-    else:
-        name_slug = _slug_text(data.get("nombre") or f"item-{index + 1}")
-        price = data.get("precio_publico")
-        price_key = "sin-precio"
-        try:
-            if price not in (None, ""):
-                price_key = str(int(round(float(price) * 100)))
-        except Exception:
-            price_key = "sin-precio"
-        suffix = f"{name_slug}-{price_key}"
-    return f"{file_id}::item::{suffix[:120]}"
-
-
-def _extract_catalog_items_from_text(text: str, filename: str, file_id: str) -> list[dict]:
-    raw_lines = [re.sub(r"\s+", " ", line).strip() for line in (text or "").splitlines()]
-    lines = []
-    line_pages: dict[int, int] = {}
-    current_page = 1
-    for raw_line in raw_lines:
-        if not raw_line:
-            continue
-        page_number = _parse_page_marker(raw_line)
-        if page_number is not None:
-            current_page = page_number
-            continue
-        line_pages[len(lines)] = current_page
-        lines.append(raw_line)
-    if not lines:
-        fallback = _extract_pdf_info_from_text(text, filename)
-        fallback["candidate_key"] = _candidate_key_for_item(file_id, fallback, 0)
-        fallback["orden_detectado"] = 0
-        fallback["page_detectada"] = 1
-        return [fallback]
-
-    line_counts = {}
-    for line in lines:
-        key = _catalog_line_key(line)
-        if key:
-            line_counts[key] = line_counts.get(key, 0) + 1
-
-    candidates = {}
-    order = 0
-    for index, line in enumerate(lines):
-        joined_prices = re.findall(r"\$\s*([0-9][0-9,.]{0,12})", line, flags=re.IGNORECASE)
-        if not joined_prices:
-            continue
-        block_lines = lines[max(0, index - 3): min(len(lines), index + 4)]
-        block_text = "\n".join(block_lines)
-        precio_publico = _extract_price_from_text(block_text)
-        if precio_publico in (None, ""):
-            continue
-        codigo_producto = _extract_code_from_text(block_text, "")
-        nombre = _extract_catalog_name_near_index(lines, index, filename, codigo_producto, line_counts=line_counts)
-        descripcion = _description_from_lines(block_lines)
-        piezas_por_caja = _extract_pieces_from_text(block_text)
-        item = {
-            "codigo_producto": codigo_producto,
-            "nombre": nombre,
-            "precio_publico": precio_publico,
-            "piezas_por_caja": piezas_por_caja,
-            "descripcion": descripcion,
-            "orden_detectado": order,
-            "page_detectada": line_pages.get(index, 1),
-        }
-        candidate_key = _candidate_key_for_item(file_id, item, order)
-        item["candidate_key"] = candidate_key
-        item["codigo_normalizado"] = _canonical_code(codigo_producto)
-        quality = 0
-        if codigo_producto:
-            quality += 5 + _code_score(codigo_producto)
-        if nombre and nombre != "Producto sin nombre":
-            quality += 4
-        if descripcion:
-            quality += 2
-        if piezas_por_caja:
-            quality += 1
-        if not codigo_producto and (
-            nombre == "Producto sin nombre"
-            or _is_spec_like_name(nombre)
-            or _is_category_like_name(nombre)
-            or not descripcion
-        ):
-            continue
-        existing = candidates.get(candidate_key)
-        if not existing or quality > existing.get("_quality", -1):
-            item["_quality"] = quality
-            candidates[candidate_key] = item
-        order += 1
+def _vision_ocr_pdf(source: bytes | BinaryIO, filename: str, config: dict, total_pages: int | None = None) -> str:
+    if not _vision_enabled():
+        return ""
 
-    results = list(candidates.values())
-    results.sort(key=lambda item: item.get("orden_detectado", 0))
-    for item in results:
-        item.pop("_quality", None)
+    if total_pages is None:
+        total_pages = _pdf_page_count(source)
+    if total_pages <= 0:
+        return ""
+
+    access_token = _google_access_token(config, [GOOGLE_VISION_SCOPE], "Google Vision")
+    encoded_content = _pdf_base64(source)
+    endpoint_url = _vision_endpoint(_vision_parent())
+    windows = [
+        list(range(start, min(start + VISION_PAGES_PER_REQUEST, total_pages + 1)))
+        for start in range(1, total_pages + 1, VISION_PAGES_PER_REQUEST)
+    ]
 
-    if results:
-        return results
+    if len(windows) == 1:
+        results = [_vision_annotate_window(endpoint_url, access_token, encoded_content, windows[0], filename)]
+    else:
+        workers = min(_vision_ocr_concurrency(), len(windows))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision-ocr") as executor:
+            results = list(executor.map(
+                lambda pages: _vision_annotate_window(endpoint_url, access_token, encoded_content, pages, filename),
+                windows,
+            ))
 
-    fallback = _extract_pdf_info_from_text(text, filename)
-    fallback["candidate_key"] = _candidate_key_for_item(file_id, fallback, 0)
-    fallback["codigo_normalizado"] = _canonical_code(fallback.get("codigo_producto"))
-    fallback["orden_detectado"] = 0
-    fallback["page_detectada"] = 1
-    return [fallback]
+    full_chunks = []
+    for page_number, text_value in sorted(
+        (entry for window_result in results for entry in window_result),
+        key=lambda entry: entry[0],
+    ):
+        full_chunks.append(_page_marker(page_number))
+        full_chunks.append(text_value)
+    return "\n".join(full_chunks)
 
 
-def _extract_catalog_items(file_bytes: bytes, filename: str, file_id: str) -> list[dict]:
-    return _extract_catalog_items_from_text(_extract_pdf_text(file_bytes), filename, file_id)
+def _extract_catalog_items(source: bytes | BinaryIO, filename: str, file_id: str) -> list[dict]:
+    return _extract_catalog_items_from_text(_pdf_text_chunks(source), filename, file_id)
 
 
 def _scan_drive(folder_id: str, access_token: str) -> tuple[list[dict], list[dict], list[dict]]:
@@ -797,19 +306,43 @@ def _ensure_fuente(id_empresa: str, folder_id: str, nombre_fuente: str | None, p
     created = supabase.table("catalogo_drive_fuentes").insert(payload).execute()
     return created.data[0]
 
-def _pending_revision_for_item(drive_item_id: str):
-    return (
-        supabase.table("catalogo_drive_revisiones")
-        .delete()
-        .eq("drive_item_id", drive_item_id)
-        .eq("estado_revision", "pendiente")
-        .execute()
-    )
 
+def _env_int(name: str, default: int, *, minimum: int = 1) -> int:
+    try:
+        value = int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        value = default
+    return max(minimum, value)
 
-def _upsert_revision(id_empresa: str, fuente_id: str, item_record: dict, tipo_cambio: str, titulo: str, detalle: str, anteriores: dict, propuestos: dict):
-    _pending_revision_for_item(item_record["id"])
-    payload = {
+
+def _sync_batch_size() -> int:
+    return _env_int("DRIVE_SYNC_BATCH_SIZE", 500)
+
+
+def _bulk_insert(table: str, rows: list[dict], batch_size: int) -> None:
+    for chunk in _chunked(rows, batch_size):
+        supabase.table(table).insert(chunk).execute()
+
+
+def _bulk_upsert(table: str, rows: list[dict], batch_size: int, *, on_conflict: str = "id") -> None:
+    for chunk in _chunked(rows, batch_size):
+        supabase.table(table).upsert(chunk, on_conflict=on_conflict).execute()
+
+
+def _delete_pending_revisions(drive_item_ids: list[str], batch_size: int) -> None:
+    unique_ids = _dedupe_keep_order(drive_item_ids)
+    for chunk in _chunked(unique_ids, batch_size):
+        (
+            supabase.table("catalogo_drive_revisiones")
+            .delete()
+            .in_("drive_item_id", chunk)
+            .eq("estado_revision", "pendiente")
+            .execute()
+        )
+
+
+def _revision_payload(id_empresa: str, fuente_id: str, item_record: dict, tipo_cambio: str, titulo: str, detalle: str, anteriores: dict, propuestos: dict) -> dict:
+    return {
         "id": str(uuid.uuid4()),
         "id_empresa": id_empresa,
         "id_fuente": fuente_id,
@@ -823,7 +356,27 @@ def _upsert_revision(id_empresa: str, fuente_id: str, item_record: dict, tipo_ca
         "estado_revision": "pendiente",
         "fecha_detectada": _utcnow(),
     }
-    supabase.table("catalogo_drive_revisiones").insert(payload).execute()
+
+
+def _stage_item_update(staged: dict[str, dict], existing: dict, changes: dict) -> dict:
+    cambios = staged.setdefault(existing["id"], {key: existing[key] for key in STAGE_CLAVES_REQUERIDAS if key in existing})
+    cambios.update(changes)
+    return {**existing, **cambios}
+
+
+def _bulk_upsert_parcial(table: str, rows: list[dict], batch_size: int) -> None:
+    grupos: dict[tuple[str, ...], list[dict]] = {}
+    for row in rows:
+        grupos.setdefault(tuple(sorted(row)), []).append(row)
+    for grupo in grupos.values():
+        _bulk_upsert(table, grupo, batch_size)
+
+
+def _flush_sync_writes(nuevos: list[dict], actualizados: dict[str, dict], revisiones: list[dict], revisiones_a_limpiar: list[str], batch_size: int) -> None:
+    _bulk_insert("catalogo_drive_items", nuevos, batch_size)
+    _bulk_upsert_parcial("catalogo_drive_items", list(actualizados.values()), batch_size)
+    _delete_pending_revisions(revisiones_a_limpiar, batch_size)
+    _bulk_insert("catalogo_drive_revisiones", revisiones, batch_size)
 
 
 @router.get("/preview")
@@ -841,6 +394,11 @@ def preview_drive(folder_id: str | None = Query(default=None), _usuario=Depends(
     }
 
 
+@router.get("/google/metricas")
+def metricas_google(_usuario=Depends(get_current_user)):
+    return {"operaciones": _google_api_metrics()}
+
+
 @router.post("/sync")
 def sync_drive(datos: DriveSyncRequest, usuario=Depends(get_current_user)):
     id_empresa = _id_empresa(usuario)
@@ -861,20 +419,36 @@ def sync_drive(datos: DriveSyncRequest, usuario=Depends(get_current_user)):
             legacy_map.setdefault(real_file_id, []).append(stored_item)
     seen = set()
     resumen = {"nuevos": 0, "actualizados": 0, "precios_modificados": 0, "removidos": 0, "sin_cambios": 0}
+    nuevos_items: list[dict] = []
+    items_actualizados: dict[str, dict] = {}
+    revisiones: list[dict] = []
+    revisiones_a_limpiar: list[str] = []
+    archivos_truncados: list[dict] = []
+    archivos_omitidos: list[dict] = []
 
     for item in archivos:
         extraction_source = "filename"
         catalog_items = []
         if item.get("mimeType") == "application/pdf":
             try:
-                pdf_bytes = _drive_download_file(item["id"], access_token)
-                catalog_items, ocr_usado, extraction_source = _extract_catalog_items_with_optional_ocr(
-                    pdf_bytes,
-                    item.get("name") or "catalogo.pdf",
-                    google_config,
-                    item["id"],
-                )
-            except Exception:
+                with _drive_download_file(item["id"], access_token) as pdf_file:
+                    catalog_items, ocr_usado, extraction_source, reporte_paginas = _extract_catalog_items_with_optional_ocr(
+                        pdf_file,
+                        item.get("name") or "catalogo.pdf",
+                        google_config,
+                        item["id"],
+                        max_paginas=datos.max_paginas,
+                        max_segundos=datos.max_segundos,
+                    )
+                if reporte_paginas["paginas_omitidas"]:
+                    archivos_truncados.append({
+                        "nombre_archivo": item.get("name"),
+                        "paginas_totales": reporte_paginas["paginas_totales"],
+                        "paginas_omitidas": reporte_paginas["paginas_omitidas"],
+                    })
+            except Exception as exc:
+                motivo = exc.detail if isinstance(exc, HTTPException) else str(exc)
+                archivos_omitidos.append({"nombre_archivo": item.get("name"), "motivo": motivo})
                 fallback = _extract_pdf_info_from_text("", item.get("name") or "")
                 fallback["candidate_key"] = _candidate_key_for_item(item["id"], fallback, 0)
                 fallback["orden_detectado"] = 0
@@ -894,12 +468,15 @@ def sync_drive(datos: DriveSyncRequest, usuario=Depends(get_current_user)):
 
         for index, info in enumerate(catalog_items):
             candidate_key = info.get("candidate_key") or _candidate_key_for_item(item["id"], info, index)
+            if candidate_key in seen:
+                continue
             seen.add(candidate_key)
             existing = existing_map.get(candidate_key)
             if not existing:
                 legacy_candidates = legacy_map.get(item["id"], [])
                 if len(legacy_candidates) == 1 and len(catalog_items) == 1:
                     existing = legacy_candidates[0]
+                    seen.add(existing.get("drive_file_id"))
 
             proposed = {
                 "candidate_key": candidate_key,
@@ -941,10 +518,9 @@ def sync_drive(datos: DriveSyncRequest, usuario=Depends(get_current_user)):
                     "synced_at": _utcnow(),
                     "fecha_creacion": _utcnow(),
                 }
-                created = supabase.table("catalogo_drive_items").insert(payload).execute()
-                item_record = created.data[0]
+                nuevos_items.append(payload)
                 titulo_producto = proposed.get("nombre") or item.get("name") or "Producto sin nombre"
-                _upsert_revision(id_empresa, fuente["id"], item_record, "nuevo", f"Nuevo producto detectado: {titulo_producto}", "Se detecto un producto nuevo dentro del catalogo del proveedor pendiente de revision.", {}, proposed)
+                revisiones.append(_revision_payload(id_empresa, fuente["id"], payload, "nuevo", f"Nuevo producto detectado: {titulo_producto}", "Se detecto un producto nuevo dentro del catalogo del proveedor pendiente de revision.", {}, proposed))
                 resumen["nuevos"] += 1
                 continue
 
@@ -959,7 +535,7 @@ def sync_drive(datos: DriveSyncRequest, usuario=Depends(get_current_user)):
                 "synced_at": _utcnow(),
             }
             if existing.get("signature") == sign:
-                supabase.table("catalogo_drive_items").update(update_payload).eq("id", existing["id"]).execute()
+                _stage_item_update(items_actualizados, existing, update_payload)
                 resumen["sin_cambios"] += 1
                 continue
 
@@ -972,109 +548,166 @@ def sync_drive(datos: DriveSyncRequest, usuario=Depends(get_current_user)):
                 resumen["actualizados"] += 1
 
             update_payload.update({"signature": sign, "extracted_data": proposed, "estado_sync": "vigente", "drive_file_id": candidate_key})
-            updated = supabase.table("catalogo_drive_items").update(update_payload).eq("id", existing["id"]).execute()
-            item_record = updated.data[0] if updated.data else {**existing, **update_payload}
+            item_record = _stage_item_update(items_actualizados, existing, update_payload)
             titulo_producto = proposed.get("nombre") or item.get("name") or "Producto sin nombre"
-            _upsert_revision(id_empresa, fuente["id"], item_record, tipo, f"Cambio detectado en {titulo_producto}", "Se detecto un cambio en el catalogo del proveedor.", anterior, proposed)
+            revisiones_a_limpiar.append(item_record["id"])
+            revisiones.append(_revision_payload(id_empresa, fuente["id"], item_record, tipo, f"Cambio detectado en {titulo_producto}", "Se detecto un cambio en el catalogo del proveedor.", anterior, proposed))
 
     for drive_file_id, item in existing_map.items():
         if drive_file_id in seen:
             continue
         if item.get("estado_sync") == "removido":
             continue
-        updated = supabase.table("catalogo_drive_items").update({"estado_sync": "removido", "synced_at": _utcnow()}).eq("id", item["id"]).execute()
-        item_record = updated.data[0] if updated.data else {**item, "estado_sync": "removido"}
-        _upsert_revision(id_empresa, fuente["id"], item_record, "no_encontrado_en_drive", f"Archivo removido: {item.get('nombre_archivo')}", "El proveedor ya no tiene este archivo en su carpeta.", item.get("extracted_data") or {}, {})
+        item_record = _stage_item_update(items_actualizados, item, {"estado_sync": "removido", "synced_at": _utcnow()})
+        revisiones_a_limpiar.append(item_record["id"])
+        revisiones.append(_revision_payload(id_empresa, fuente["id"], item_record, "no_encontrado_en_drive", f"Archivo removido: {item.get('nombre_archivo')}", "El proveedor ya no tiene este archivo en su carpeta.", item.get("extracted_data") or {}, {}))
         resumen["removidos"] += 1
 
+    _materializar_revisiones(id_empresa, revisiones)
+    _flush_sync_writes(nuevos_items, items_actualizados, revisiones, revisiones_a_limpiar, _sync_batch_size())
+    resumen["archivos_truncados"] = archivos_truncados
+    resumen["archivos_omitidos"] = archivos_omitidos
     supabase.table("catalogo_drive_fuentes").update({"ultima_sincronizacion": _utcnow(), "ultimo_resumen": resumen, "fecha_actualizacion": _utcnow()}).eq("id", fuente["id"]).execute()
     return {"mensaje": "Sincronizacion completada", "resumen": resumen, "fuente": {"id": fuente["id"], "folder_id": config["folder_id"]}}
 
 
+def _revision_codigo(revision: dict) -> str | None:
+    proposed = revision.get("datos_propuestos") or {}
+    previous = revision.get("datos_anteriores") or {}
+    return (proposed.get("codigo_producto") or previous.get("codigo_producto") or "").strip().upper() or None
+
+
+def _revision_review_fields(revision: dict, costos_index: dict) -> dict:
+    proposed = revision.get("datos_propuestos") or {}
+    previous = revision.get("datos_anteriores") or {}
+    codigo = _revision_codigo(revision)
+    costo = _pick_best_row_from_index(codigo, costos_index) if codigo else None
+    precio_base = proposed.get("precio_publico")
+    if precio_base in (None, ""):
+        precio_base = previous.get("precio_publico") or previous.get("precio")
+    utilidad_estimada = None
+    margen_estimado = None
+    if costo and precio_base not in (None, ""):
+        try:
+            precio_num = float(precio_base)
+            costo_num = float(costo.get("costo_adquisicion") or 0)
+            utilidad_estimada = round(precio_num - costo_num, 2)
+            margen_estimado = round((utilidad_estimada / precio_num) * 100, 2) if precio_num else None
+        except Exception:
+            utilidad_estimada = None
+            margen_estimado = None
+
+    motivos = []
+    for source in [previous.get("motivos_revision") or [], proposed.get("motivos_revision") or []]:
+        for item in source:
+            if item:
+                motivos.append(str(item).strip())
+    if codigo and not costo:
+        motivos.append("No hay costo interno ligado para este codigo.")
+    motivos = _dedupe_keep_order(motivos)
+
+    return {
+        "codigo_normalizado": proposed.get("codigo_normalizado") or previous.get("codigo_normalizado") or _canonical_code(codigo),
+        "codigo_claves": _indexed_code_keys(codigo),
+        "codigo_costo_ligado": costo.get("codigo_producto") if costo else None,
+        "costo_registrado": costo,
+        "utilidad_estimada": utilidad_estimada,
+        "margen_estimado": margen_estimado,
+        "motivos_revision": motivos,
+        "requiere_revision": bool(motivos),
+        "origen_extraccion": proposed.get("origen_extraccion") or previous.get("origen_extraccion"),
+        "revision_calculada_en": _utcnow(),
+    }
+
+
+def _materializar_revisiones(id_empresa: str, revisiones: list[dict]) -> list[dict]:
+    codigos = _dedupe_keep_order([codigo for codigo in (_revision_codigo(revision) for revision in revisiones) if codigo])
+    costos_index = _costos_code_index(id_empresa, codigos) if codigos else _build_code_index([])
+    for revision in revisiones:
+        revision.update(_revision_review_fields(revision, costos_index))
+    return revisiones
+
+
+def _refrescar_revisiones_por_costos(id_empresa: str, codigos: list[str]) -> int:
+    keys = _dedupe_keep_order([key for codigo in codigos for key in _indexed_code_keys(codigo)])
+    revisiones: dict[str, dict] = {}
+    for chunk in _chunked(keys, CODE_LOOKUP_CHUNK_SIZE):
+        resp = (
+            supabase.table("catalogo_drive_revisiones")
+            .select("*")
+            .eq("id_empresa", id_empresa)
+            .eq("estado_revision", "pendiente")
+            .filter("codigo_claves", "ov", "{" + ",".join(chunk) + "}")
+            .execute()
+        )
+        for row in resp.data or []:
+            revisiones[row["id"]] = row
+    if not revisiones:
+        return 0
+    _bulk_upsert("catalogo_drive_revisiones", _materializar_revisiones(id_empresa, list(revisiones.values())), _sync_batch_size())
+    return len(revisiones)
+
+
 @router.get("/revisiones")
-def listar_revisiones(usuario=Depends(get_current_user)):
+def listar_revisiones(
+    pagina: int = Query(default=1, ge=1),
+    por_pagina: int = Query(default=50, ge=1, le=200),
+    tipo_cambio: str | None = Query(default=None),
+    id_fuente: str | None = Query(default=None),
+    requiere_revision: bool | None = Query(default=None),
+    sin_costo: bool | None = Query(default=None),
+    busqueda: str | None = Query(default=None),
+    usuario=Depends(get_current_user),
+):
     id_empresa = _id_empresa(usuario)
-    revisiones_resp = supabase.table("catalogo_drive_revisiones").select("*").eq("id_empresa", id_empresa).eq("estado_revision", "pendiente").order("fecha_detectada", desc=True).execute()
+    query = (
+        supabase.table("catalogo_drive_revisiones")
+        .select("*", count="exact")
+        .eq("id_empresa", id_empresa)
+        .eq("estado_revision", "pendiente")
+    )
+    if tipo_cambio:
+        query = query.eq("tipo_cambio", tipo_cambio.strip())
+    if id_fuente:
+        query = query.eq("id_fuente", id_fuente.strip())
+    if requiere_revision is not None:
+        query = query.eq("requiere_revision", requiere_revision)
+    if sin_costo is True:
+        query = query.is_("codigo_costo_ligado", "null")
+    elif sin_costo is False:
+        query = query.not_.is_("codigo_costo_ligado", "null")
+    termino = re.sub(r"[,()*%]", " ", busqueda or "").strip()
+    if termino:
+        query = query.or_(f"titulo.ilike.*{termino}*,codigo_normalizado.ilike.*{termino}*")
+    inicio = (pagina - 1) * por_pagina
+    revisiones_resp = query.order("fecha_detectada", desc=True).range(inicio, inicio + por_pagina - 1).execute()
     revisiones = revisiones_resp.data or []
+
     item_ids = [item.get("drive_item_id") for item in revisiones if item.get("drive_item_id")]
     items_map = {}
     if item_ids:
         items_resp = supabase.table("catalogo_drive_items").select("id,producto_id,drive_file_id,nombre_archivo,categoria,mime_type,web_view_link,modified_time").in_("id", item_ids).execute()
         items_map = {item["id"]: item for item in (items_resp.data or [])}
 
-    codigos = []
-    for revision in revisiones:
-        before = revision.get("datos_anteriores") or {}
-        after = revision.get("datos_propuestos") or {}
-        codigos.extend([before.get("codigo_producto"), after.get("codigo_producto")])
-    costos_map = _buscar_costos(id_empresa, codigos)
+    salida = [{**revision, "drive_item": items_map.get(revision.get("drive_item_id"), {})} for revision in revisiones]
+    total = revisiones_resp.count if revisiones_resp.count is not None else inicio + len(salida)
+    return {"pendientes": salida, "total": total, "pagina": pagina, "por_pagina": por_pagina}
 
-    salida = []
-    for revision in revisiones:
-        proposed = revision.get("datos_propuestos") or {}
-        previous = revision.get("datos_anteriores") or {}
-        codigo = (proposed.get("codigo_producto") or previous.get("codigo_producto") or "").strip().upper() or None
-        costo = costos_map.get(codigo) if codigo else None
-        precio_base = proposed.get("precio_publico")
-        if precio_base in (None, ""):
-            precio_base = previous.get("precio_publico") or previous.get("precio")
-        utilidad_estimada = None
-        margen_estimado = None
-        if costo and precio_base not in (None, ""):
-            try:
-                precio_num = float(precio_base)
-                costo_num = float(costo.get("costo_adquisicion") or 0)
-                utilidad_estimada = round(precio_num - costo_num, 2)
-                margen_estimado = round((utilidad_estimada / precio_num) * 100, 2) if precio_num else None
-            except Exception:
-                utilidad_estimada = None
-                margen_estimado = None
 
-        motivos = []
-        for source in [previous.get("motivos_revision") or [], proposed.get("motivos_revision") or []]:
-            for item in source:
-                if item:
-                    motivos.append(str(item).strip())
-        if codigo and not costo:
-            motivos.append("No hay costo interno ligado para este codigo.")
-
-        salida.append({
-            **revision,
-            "drive_item": items_map.get(revision.get("drive_item_id"), {}),
-            "costo_registrado": costo,
-            "codigo_normalizado": proposed.get("codigo_normalizado") or previous.get("codigo_normalizado") or _canonical_code(codigo),
-            "codigo_costo_ligado": costo.get("codigo_producto") if costo else None,
-            "motivos_revision": _dedupe_keep_order(motivos),
-            "requiere_revision": bool(_dedupe_keep_order(motivos)),
-            "origen_extraccion": proposed.get("origen_extraccion") or previous.get("origen_extraccion"),
-            "utilidad_estimada": utilidad_estimada,
-            "margen_estimado": margen_estimado,
-        })
-    return {"pendientes": salida}
+def _costos_code_index(id_empresa: str, codigos: list[str]) -> dict:
+    return _build_code_index(_rows_by_code_keys("catalogo_costos_proveedor", "*", id_empresa, codigos))
+
 
-def _buscar_costo(id_empresa: str, codigo_producto: str | None):
+def _buscar_costo(id_empresa: str, codigo_producto: str | None, costos_index: dict | None = None):
     if not codigo_producto:
         return None
     codigo = codigo_producto.strip().upper()
+    if costos_index is not None:
+        return _lookup_code_in_index(codigo, costos_index)
     resp = supabase.table("catalogo_costos_proveedor").select("*").eq("id_empresa", id_empresa).eq("codigo_producto", codigo).limit(1).execute()
     if resp.data:
         return resp.data[0]
-    fallback = supabase.table("catalogo_costos_proveedor").select("*").eq("id_empresa", id_empresa).execute()
-    return _pick_best_row_by_code(codigo, fallback.data or [])
-
-
-def _buscar_costos(id_empresa: str, codigos: list[str]) -> dict[str, dict]:
-    clean = [codigo.strip().upper() for codigo in codigos if codigo and codigo.strip()]
-    if not clean:
-        return {}
-    resp = supabase.table("catalogo_costos_proveedor").select("*").eq("id_empresa", id_empresa).execute()
-    rows = resp.data or []
-    resultados = {}
-    for codigo in clean:
-        match = _pick_best_row_by_code(codigo, rows)
-        if match:
-            resultados[codigo] = match
-    return resultados
+    return _pick_best_row_from_index(codigo, _costos_code_index(id_empresa, [codigo]))
 
 
 def _guardar_costo(id_empresa: str, codigo_producto: str, costo_adquisicion: float, proveedor: str | None, notas: str | None = None):
@@ -1082,6 +715,7 @@ def _guardar_costo(id_empresa: str, codigo_producto: str, costo_adquisicion: flo
     existing = supabase.table("catalogo_costos_proveedor").select("id").eq("id_empresa", id_empresa).eq("codigo_producto", codigo).limit(1).execute()
     payload = {
         "codigo_producto": codigo,
+        **_codigo_columns(codigo),
         "costo_adquisicion": float(costo_adquisicion),
         "proveedor": (proveedor or "Proveedor Domus").strip(),
         "notas": (notas or "").strip() or None,
@@ -1095,6 +729,51 @@ def _guardar_costo(id_empresa: str, codigo_producto: str, costo_adquisicion: flo
     return saved.data[0] if saved.data else payload
 
 
+def _guardar_costos_lote(id_empresa: str, rows: list[dict], proveedor: str | None, notas: str | None = None) -> dict[str, dict]:
+    ahora = _utcnow()
+    payloads: dict[str, dict] = {}
+    for row in rows:
+        codigo = (row.get("codigo_producto") or "").strip().upper()
+        if not codigo:
+            continue
+        payloads[codigo] = {
+            "id_empresa": id_empresa,
+            "codigo_producto": codigo,
+            **_codigo_columns(codigo),
+            "costo_adquisicion": float(row["costo_adquisicion"]),
+            "proveedor": (proveedor or "Proveedor Domus").strip(),
+            "notas": (notas or "").strip() or None,
+            "fecha_actualizacion": ahora,
+        }
+    _bulk_upsert("catalogo_costos_proveedor", list(payloads.values()), _sync_batch_size(), on_conflict="id_empresa,codigo_producto")
+    _propagar_costos_productos(id_empresa, {codigo: payload["costo_adquisicion"] for codigo, payload in payloads.items()})
+    _refrescar_revisiones_por_costos(id_empresa, list(payloads))
+    return payloads
+
+
+def _rpc_inexistente(exc: Exception) -> bool:
+    return str(getattr(exc, "code", "") or "") in RPC_INEXISTENTE_CODIGOS
+
+
+def _propagar_costos_productos(id_empresa: str, costos: dict[str, float]) -> None:
+    if not costos:
+        return
+    try:
+        for codigos in _chunked(list(costos), _sync_batch_size()):
+            supabase.rpc("aplicar_costos_proveedor", {"p_id_empresa": id_empresa, "p_codigos": codigos}).execute()
+        return
+    except Exception as exc:
+        if not _rpc_inexistente(exc):
+            raise
+
+    codigos_por_costo: dict[float, list[str]] = {}
+    for codigo, costo in costos.items():
+        codigos_por_costo.setdefault(costo, []).append(codigo)
+    for costo, codigos in codigos_por_costo.items():
+        for chunk in _chunked(codigos, CODE_LOOKUP_CHUNK_SIZE):
+            supabase.table("productos").update({"costo_adquisicion": costo}).eq("id_empresa", id_empresa).in_("codigo_producto", chunk).execute()
+
+
 def _registrar_importacion_costos(id_empresa: str, nombre_archivo: str, proveedor: str, resumen: dict):
     try:
         supabase.table("catalogo_costos_importaciones").insert({
@@ -1109,224 +788,8 @@ def _registrar_importacion_costos(id_empresa: str, nombre_archivo: str, proveedo
         pass
 
 
-def _extract_money_values(text: str, *, allow_plain_numbers: bool = True, blocked_numbers: set[str] | None = None) -> list[float]:
-    blocked_numbers = blocked_numbers or set()
-    values = []
-    patterns = [
-        r"\$\s*([0-9]{1,4}(?:,[0-9]{3})*(?:\.\d{2})?)",
-    ]
-    if allow_plain_numbers:
-        patterns.append(r"(?<!\d)([0-9]{1,4}(?:,[0-9]{3})*(?:\.\d{2}))(?!\d)")
-    for pattern in patterns:
-        for raw in re.findall(pattern, text or "", flags=re.IGNORECASE):
-            normalized_raw = raw.replace(",", "")
-            integer_part = normalized_raw.split(".", 1)[0]
-            if integer_part in blocked_numbers:
-                continue
-            try:
-                value = float(normalized_raw)
-            except Exception:
-                continue
-            if 1 <= value <= 1000000:
-                values.append(round(value, 2))
-    deduped = []
-    seen = set()
-    for value in values:
-        if value in seen:
-            continue
-        seen.add(value)
-        deduped.append(value)
-    return deduped
-
-
-def _normalize_letters_segment(value: str) -> str:
-    return (value or "").upper().translate(str.maketrans({"0": "O", "1": "I", "5": "S", "8": "B"}))
-
-
-def _normalize_digits_segment(value: str) -> str:
-    return (value or "").upper().translate(str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "B": "8"}))
-
-
-def _normalize_alnum_segment(value: str) -> str:
-    return re.sub(r"[^A-Z0-9]", "", (value or "").upper())
-
-
-def _normalize_code_candidate(raw: str) -> str | None:
-    cleaned = (raw or "").upper()
-    cleaned = re.sub(r"[^A-Z0-9]+", "-", cleaned)
-    cleaned = re.sub(r"-{2,}", "-", cleaned).strip("-")
-    parts = [part for part in cleaned.split("-") if part]
-
-    if len(parts) == 1:
-        single = _normalize_alnum_segment(parts[0])
-        for index, char in enumerate(single):
-            if index < 2:
-                continue
-            if char.isdigit() or char in {"O", "Q", "D", "I", "L", "S", "B", "Z"}:
-                prefix = _normalize_letters_segment(single[:index])
-                suffix = _normalize_digits_segment(single[index:])
-                if re.fullmatch(r"[A-Z]{2,6}", prefix) and re.fullmatch(r"\d{2,6}", suffix):
-                    return prefix + suffix
-                break
-        if re.fullmatch(r"[A-Z]{2,6}\d{2,6}", _normalize_letters_segment(single[:6]) + _normalize_digits_segment(single[6:])):
-            return single
-        if re.fullmatch(r"\d{3,6}", _normalize_digits_segment(single)):
-            return _normalize_digits_segment(single)
-
-    if len(parts) == 2:
-        first = _normalize_alnum_segment(parts[0])
-        second = _normalize_alnum_segment(parts[1])
-        first_candidate = _normalize_letters_segment(re.sub(r"\d", "", first)) + _normalize_digits_segment(re.sub(r"\D", "", first))
-        if re.fullmatch(r"\d{3}", _normalize_digits_segment(first)) and re.fullmatch(r"[A-Z]{4,20}", _normalize_letters_segment(second)):
-            return _normalize_digits_segment(first)
-        if re.fullmatch(r"[A-Z]{1,4}\d{4,6}", first_candidate) and re.fullmatch(r"[A-Z0-9]{2,12}", second):
-            return f"{first_candidate}-{second}"
-
-    if len(parts) >= 3:
-        first = _normalize_letters_segment(parts[0])
-        second = _normalize_digits_segment(parts[1])
-        third = _normalize_alnum_segment(parts[2])
-        if re.fullmatch(r"[A-Z]{1,5}", first) and re.fullmatch(r"\d{2,5}", second) and re.fullmatch(r"[A-Z0-9]{2,12}", third):
-            return "-".join([first, second, third])
-
-    if 3 <= len(parts) <= 4:
-        fixed_parts = [_normalize_digits_segment(parts[0])] + [_normalize_alnum_segment(part) for part in parts[1:4]]
-        if re.fullmatch(r"\d{2,5}", fixed_parts[0]) and all(re.fullmatch(r"[A-Z0-9]{1,12}", part) for part in fixed_parts[1:]):
-            return "-".join(fixed_parts[: len(parts)])
-
-    return None
-
-
-def _code_score(code: str) -> int:
-    score = 0
-    if "-" in code:
-        score += code.count("-") * 2
-    if re.search(r"[A-Z]", code) and re.search(r"\d", code):
-        score += 3
-    if len(code) >= 8:
-        score += 2
-    if re.fullmatch(r"\d{3}", code):
-        score -= 3
-    elif re.fullmatch(r"\d{4,6}", code):
-        score += 1
-    return score
-
-
-def _prune_code_candidates(codes: list[str]) -> list[str]:
-    unique = []
-    seen = set()
-    for code in codes:
-        if not code or code in seen:
-            continue
-        seen.add(code)
-        unique.append(code)
-    rich_codes = [code for code in unique if _code_score(code) >= 4]
-    pruned = []
-    for code in unique:
-        if any(code != rich and code in rich for rich in rich_codes):
-            continue
-        if rich_codes and re.fullmatch(r"\d{3,4}", code):
-            continue
-        pruned.append(code)
-    return pruned
-
-
-def _extract_code_candidates(text: str) -> list[str]:
-    if not text:
-        return []
-    patterns = [
-        r"\b[A-Z]{1,5}\s*[- ]\s*\d{2,5}\s*[- ]\s*[A-Z0-9]{2,12}\b",
-        r"\b[A-Z]{1,5}-\d{2,5}[A-Z0-9]{2,12}\b",
-        r"\b[A-Z]{1,5}\d{2,5}\s*[- ]\s*[A-Z0-9]{2,12}\b",
-        r"\b\d{2,5}\s*[- ]\s*[A-Z0-9]{1,12}\s*[- ]\s*[A-Z0-9]{1,12}\s*[- ]\s*[A-Z0-9]{1,12}\b",
-        r"\b\d{2,5}\s+[A-Z0-9]{1,12}\s+\d{2,5}\s+\d{2,5}\b",
-        r"\b[A-Z]{2,6}\d{2,6}\b",
-        r"\b\d{4,6}\b",
-        r"\b\d{3}\s+[A-Z]{4,20}\b",
-        r"\b[A-Z]{1,4}\d{4,6}-[A-Z0-9]{2,12}\b",
-    ]
-    found = []
-    for pattern in patterns:
-        for raw in re.findall(pattern, (text or "").upper()):
-            normalized = _normalize_code_candidate(raw)
-            if normalized:
-                found.append(normalized)
-    return _prune_code_candidates(found)
-
-
-def _pick_cost_from_context(lines: list[str], index: int, codes: list[str]) -> float | None:
-    window_lines = lines[max(0, index - 1): min(len(lines), index + 3)]
-    window = " ".join(window_lines)
-    blocked_numbers = {re.sub(r"\D", "", code) for code in codes if re.fullmatch(r"\d{3,6}", re.sub(r"\D", "", code))}
-
-    tagged = re.findall(r"(?:costo|distribuidor|precio|p\.\s*distribuidor|p/pza|pza\.|p/par|del par)[^0-9$]{0,12}\$?\s*([0-9]{1,4}(?:,[0-9]{3})*(?:\.\d{2})?)", window, flags=re.IGNORECASE)
-    for raw in tagged:
-        try:
-            return round(float(raw.replace(",", "")), 2)
-        except Exception:
-            continue
-
-    currency_values = _extract_money_values(window, allow_plain_numbers=False, blocked_numbers=blocked_numbers)
-    if currency_values:
-        return currency_values[0]
-
-    if re.search(r"P/PZA|PZA\.|P/PAR|DEL PAR|PRECIO|COSTO|DISTRIBUIDOR", window, flags=re.IGNORECASE):
-        plain_values = _extract_money_values(window, allow_plain_numbers=True, blocked_numbers=blocked_numbers)
-        if plain_values:
-            return plain_values[0]
-
-    return None
-
-
-def _extract_cost_rows_from_text(raw_text: str, filename: str) -> list[dict]:
-    if not raw_text.strip():
-        return []
-    lines = [re.sub(r"\s+", " ", line).strip() for line in raw_text.splitlines()]
-    lines = [line for line in lines if line]
-    results = {}
-    for index, line in enumerate(lines):
-        window_text = line
-        if index + 1 < len(lines):
-            window_text = f"{line} {lines[index + 1]}"
-        codes = _extract_code_candidates(window_text)
-        if not codes:
-            continue
-        cost = _pick_cost_from_context(lines, index, codes)
-        if cost is None:
-            continue
-        name = _extract_name_from_text("\n".join(lines[max(0, index - 1): min(len(lines), index + 2)]), filename)
-        for code in codes:
-            quality = _code_score(code) + (2 if "$" in window_text else 0)
-            row = {
-                "codigo_producto": code.upper(),
-                "costo_adquisicion": cost,
-                "nombre_detectado": name,
-                "calidad": quality,
-            }
-            existing = results.get(code)
-            if not existing or row["calidad"] > existing.get("calidad", 0):
-                results[code] = row
-    ordered = sorted(results.values(), key=lambda item: (-item.get("calidad", 0), item.get("codigo_producto") or ""))
-    for item in ordered:
-        item.pop("calidad", None)
-    return ordered
-
-
-def _extract_cost_rows_from_pdf(file_bytes: bytes, filename: str) -> list[dict]:
-    return _extract_cost_rows_from_text(_extract_pdf_text(file_bytes), filename)
-
-
-def _row_requires_review(row: dict) -> bool:
-    code = (row.get("codigo_producto") or "").strip().upper()
-    if not code:
-        return True
-    if re.fullmatch(r"\d{3}", code):
-        return True
-    if len(code) < 5:
-        return True
-    if code.count("-") >= 3 and len(code) < 8:
-        return True
-    return False
+def _extract_cost_rows_from_pdf(source: bytes | BinaryIO, filename: str) -> list[dict]:
+    return _extract_cost_rows_from_text(_extract_pdf_text(source), filename)
 
 
 def _build_import_warnings(rows: list[dict], *, ocr_usado: bool, review_rows: list[dict] | None = None) -> list[str]:
@@ -1352,8 +815,9 @@ def _merge_catalog_items(base_items: list[dict], extra_items: list[dict], *, fil
 
     merged = []
     used_extra_keys = set()
+    extra_index_by_code = _build_code_index(extra_items)
     for index, base_item in enumerate(base_items):
-        match = _pick_best_row_by_code(base_item.get("codigo_producto"), extra_items) or (extra_items[index] if index < len(extra_items) else None)
+        match = _pick_best_row_from_index(base_item.get("codigo_producto"), extra_index_by_code) or (extra_items[index] if index < len(extra_items) else None)
         merged_item = dict(base_item)
         if match:
             used_extra_keys.add(match.get("candidate_key") or _candidate_key_for_item(file_id, match, index))
@@ -1380,20 +844,32 @@ def _merge_catalog_items(base_items: list[dict], extra_items: list[dict], *, fil
     return merged
 
 
-def _extract_catalog_items_with_optional_ocr(file_bytes: bytes, filename: str, google_config: dict, file_id: str) -> tuple[list[dict], bool, str | None]:
-    texto_pdf = _extract_pdf_text(file_bytes)
+def _extract_catalog_items_with_optional_ocr(
+    source: bytes | BinaryIO,
+    filename: str,
+    google_config: dict,
+    file_id: str,
+    *,
+    max_paginas: int | None = None,
+    max_segundos: float | None = None,
+) -> tuple[list[dict], bool, str | None, dict]:
+    reporte_paginas = _nuevo_reporte_paginas()
+    text_chunks = _pdf_text_chunks(source, reporte_paginas, max_paginas=max_paginas, max_segundos=max_segundos)
+    items = _extract_catalog_items_from_text(text_chunks, filename, file_id)
+    has_pdf_text = reporte_paginas["paginas_con_texto"] > 0
     ocr_usado = False
     extraction_source = "filename"
-    items = []
 
-    if texto_pdf.strip():
-        items = _extract_catalog_items_from_text(texto_pdf, filename, file_id)
+    if has_pdf_text:
         extraction_source = "pdf_text"
+    else:
+        items = []
 
-    needs_ocr = not texto_pdf.strip() or not items or any(not row.get("codigo_producto") or row.get("precio_publico") in (None, "") for row in items)
+    needs_ocr = not has_pdf_text or not items or any(not row.get("codigo_producto") or row.get("precio_publico") in (None, "") for row in items)
     if needs_ocr:
         try:
-            ocr_text = _vision_ocr_pdf(file_bytes, filename, google_config)
+            ocr_pages = min(reporte_paginas["paginas_totales"], _pdf_budget(max_paginas, max_segundos)[0])
+            ocr_text = _vision_ocr_pdf(source, filename, google_config, total_pages=ocr_pages)
             if ocr_text.strip():
                 ocr_usado = True
                 ocr_items = _extract_catalog_items_from_text(ocr_text, filename, file_id)
@@ -1414,7 +890,7 @@ def _extract_catalog_items_with_optional_ocr(file_bytes: bytes, filename: str, g
     for index, item in enumerate(items):
         item.setdefault("candidate_key", _candidate_key_for_item(file_id, item, index))
         item["codigo_normalizado"] = _canonical_code(item.get("codigo_producto"))
-    return items, ocr_usado, extraction_source
+    return items, ocr_usado, extraction_source, reporte_paginas
 
 
 def _build_public_catalog_warnings(items: list[dict], *, ocr_usado: bool) -> list[str]:
@@ -1440,26 +916,33 @@ def _build_public_catalog_warnings(items: list[dict], *, ocr_usado: bool) -> lis
     return warnings
 
 
-def _canonical_code(value: str | None) -> str | None:
-    raw = (value or "").strip().upper()
-    if not raw:
-        return None
-    normalized = _normalize_code_candidate(raw)
-    if normalized:
-        return normalized
-    compact = _clean_compact_code(raw)
-    return compact or None
+def _build_code_index(rows: list[dict], *, field: str = "codigo_producto") -> dict:
+    exact: dict[str, dict] = {}
+    keys: dict[str, list[int]] = {}
+    entries = []
+    for row in rows:
+        row_code = row.get(field)
+        row_keys = set(_code_lookup_keys(row_code))
+        if not row_keys:
+            continue
+        if row_code and row_code not in exact:
+            exact[row_code] = row
+        canonical = _canonical_code(row_code) or ""
+        position = len(entries)
+        entries.append((row, row_keys, canonical, _code_score(canonical) if canonical else 0))
+        for key in row_keys:
+            keys.setdefault(key, []).append(position)
+    return {"exact": exact, "keys": keys, "entries": entries}
 
 
-def _code_lookup_keys(value: str | None) -> list[str]:
-    raw = (value or "").strip().upper()
-    canonical = _canonical_code(raw)
-    compact_raw = _clean_compact_code(raw)
-    compact_canonical = _clean_compact_code(canonical)
-    return _dedupe_keep_order([raw, canonical or "", compact_raw, compact_canonical])
+def _index_positions(lookup_keys: set[str], index: dict) -> list[int]:
+    positions = set()
+    for key in lookup_keys:
+        positions.update(index["keys"].get(key) or [])
+    return sorted(positions)
 
 
-def _pick_best_row_by_code(code: str | None, rows: list[dict], *, field: str = "codigo_producto") -> dict | None:
+def _pick_best_row_from_index(code: str | None, index: dict) -> dict | None:
     requested_canonical = _canonical_code(code)
     lookup_keys = set(_code_lookup_keys(code))
     if not lookup_keys:
@@ -1467,26 +950,24 @@ def _pick_best_row_by_code(code: str | None, rows: list[dict], *, field: str = "
 
     best = None
     best_score = -1
-    for row in rows:
-        row_code = row.get(field)
-        row_keys = set(_code_lookup_keys(row_code))
-        if not row_keys:
-            continue
-        overlap = lookup_keys & row_keys
-        if not overlap:
-            continue
-        canonical = _canonical_code(row_code) or ""
-        score = len(overlap) * 10
+    for position in _index_positions(lookup_keys, index):
+        row, row_keys, canonical, canonical_score = index["entries"][position]
+        score = len(lookup_keys & row_keys) * 10
         if requested_canonical and canonical == requested_canonical:
             score += 8
-        if canonical:
-            score += _code_score(canonical)
+        score += canonical_score
         if best is None or score > best_score:
             best = row
             best_score = score
     return best
 
 
+def _lookup_code_in_index(code: str | None, index: dict) -> dict | None:
+    if not code:
+        return None
+    return index["exact"].get(code.strip().upper()) or _pick_best_row_from_index(code, index)
+
+
 def _build_public_revision_flags(proposed: dict, *, extraction_source: str) -> list[str]:
     flags = []
     codigo = (proposed.get("codigo_producto") or "").strip().upper()
@@ -1507,43 +988,71 @@ def _build_public_revision_flags(proposed: dict, *, extraction_source: str) -> l
     return flags
 
 
-def _buscar_producto_por_codigo(id_empresa: str, codigo_producto: str | None):
+def _productos_code_index(id_empresa: str, codigos: list[str]) -> dict:
+    columns = "id,codigo_producto,descripcion,variantes"
+    rows = _rows_by_code_keys("productos", columns, id_empresa, codigos)
+    variant_keys = _dedupe_keep_order([key for codigo in codigos for key in _indexed_code_keys(codigo)])
+    variantes_rows = []
+    for chunk in _chunked(variant_keys, CODE_LOOKUP_CHUNK_SIZE):
+        resp = (
+            supabase.table("productos")
+            .select(columns)
+            .eq("id_empresa", id_empresa)
+            .filter("codigos_variantes", "ov", "{" + ",".join(chunk) + "}")
+            .execute()
+        )
+        for row in resp.data or []:
+            _, variantes = _variantes_producto(row)
+            variantes_rows.extend({"codigo": variante.get("codigo"), "producto": row} for variante in variantes)
+    return {
+        "productos": _build_code_index(rows),
+        "variantes": _build_code_index(variantes_rows, field="codigo"),
+    }
+
+
+def _buscar_producto_por_codigo(id_empresa: str, codigo_producto: str | None, productos_index: dict | None = None):
     if not codigo_producto:
         return None
     codigo = codigo_producto.strip().upper()
-    resp = (
-        supabase.table("productos")
-        .select("id,codigo_producto,descripcion")
-        .eq("id_empresa", id_empresa)
-        .eq("codigo_producto", codigo)
-        .limit(1)
-        .execute()
-    )
-    if resp.data:
-        return resp.data[0]
-    fallback = supabase.table("productos").select("id,codigo_producto,descripcion").eq("id_empresa", id_empresa).execute()
-    rows = fallback.data or []
-    direct_match = _pick_best_row_by_code(codigo, rows)
+    if productos_index is None:
+        resp = (
+            supabase.table("productos")
+            .select("id,codigo_producto,descripcion")
+            .eq("id_empresa", id_empresa)
+            .eq("codigo_producto", codigo)
+            .limit(1)
+            .execute()
+        )
+        if resp.data:
+            return resp.data[0]
+        productos_index = _productos_code_index(id_empresa, [codigo])
+    else:
+        exact = productos_index["productos"]["exact"].get(codigo)
+        if exact:
+            return exact
+
+    direct_match = _pick_best_row_from_index(codigo, productos_index["productos"])
     if direct_match:
         return direct_match
 
-    for row in rows:
-        _, variantes = _extract_variantes_metadata(row.get("descripcion"))
-        if _pick_best_row_by_code(codigo, variantes, field="codigo"):
-            return row
+    variant_positions = _index_positions(set(_code_lookup_keys(codigo)), productos_index["variantes"])
+    if variant_positions:
+        return productos_index["variantes"]["entries"][variant_positions[0]][0]["producto"]
     return None
-def _guardar_producto_desde_revision(id_empresa: str, revision: dict, drive_item: dict, proposed: dict):
+
+
+def _producto_payload_desde_revision(drive_item: dict, proposed: dict, costo: dict | None) -> dict:
     codigo_producto = (proposed.get("codigo_producto") or "").strip().upper() or None
     nombre = (proposed.get("nombre") or "").strip()
     categoria = (proposed.get("categoria") or "Sin categoria").strip()
     precio_publico = proposed.get("precio_publico")
     if precio_publico in (None, ""):
         raise HTTPException(status_code=400, detail="No se detecto precio publico. Editalo antes de publicar.")
-    costo = _buscar_costo(id_empresa, codigo_producto)
     costo_adquisicion = float(costo.get("costo_adquisicion") or 0) if costo else 0
-    producto_payload = {
+    return {
         "nombre": nombre,
         "codigo_producto": codigo_producto,
+        **_codigo_columns(codigo_producto),
         "categoria": categoria,
         "descripcion": proposed.get("descripcion"),
         "precio": float(precio_publico),
@@ -1558,6 +1067,11 @@ def _guardar_producto_desde_revision(id_empresa: str, revision: dict, drive_item
         "origen_drive_file_id": proposed.get("drive_file_real_id") or drive_item.get("drive_file_id"),
         "activo": True,
     }
+
+
+def _guardar_producto_desde_revision(id_empresa: str, revision: dict, drive_item: dict, proposed: dict):
+    codigo_producto = (proposed.get("codigo_producto") or "").strip().upper() or None
+    producto_payload = _producto_payload_desde_revision(drive_item, proposed, _buscar_costo(id_empresa, codigo_producto))
     producto_id = revision.get("producto_id")
     if not producto_id:
         existing_producto = _buscar_producto_por_codigo(id_empresa, codigo_producto)
@@ -1566,13 +1080,32 @@ def _guardar_producto_desde_revision(id_empresa: str, revision: dict, drive_item
         updated = supabase.table("productos").update(producto_payload).eq("id", producto_id).eq("id_empresa", id_empresa).execute()
         if updated.data:
             return updated.data[0]
-    producto_payload.update({"id": str(uuid.uuid4()), "id_empresa": id_empresa, "fecha_creacion": _utcnow()})
+    producto_payload.update({"id": str(uuid.uuid4()), "id_empresa": id_empresa, "variantes": [], "fecha_creacion": _utcnow()})
     created = supabase.table("productos").insert(producto_payload).execute()
     if not created.data:
         raise HTTPException(status_code=400, detail="No se pudo crear producto desde revision")
     return created.data[0]
 
 
+def _datos_propuestos_con_cambios(revision: dict, datos: DriveReviewResolveRequest) -> dict:
+    proposed = dict(revision.get("datos_propuestos") or {})
+    if datos.nombre is not None:
+        proposed["nombre"] = datos.nombre.strip()
+    if datos.codigo_producto is not None:
+        proposed["codigo_producto"] = datos.codigo_producto.strip().upper()
+    if datos.categoria is not None:
+        proposed["categoria"] = datos.categoria.strip()
+    if datos.descripcion is not None:
+        proposed["descripcion"] = datos.descripcion.strip()
+    if datos.precio_publico is not None:
+        proposed["precio_publico"] = datos.precio_publico
+    if datos.visible_publico is not None:
+        proposed["visible_publico"] = datos.visible_publico
+    if datos.destacado is not None:
+        proposed["destacado"] = datos.destacado
+    return proposed
+
+
 @router.post("/revisiones/{id_revision}/resolver")
 def resolver_revision(id_revision: str, datos: DriveReviewResolveRequest, usuario=Depends(get_current_user)):
     id_empresa = _id_empresa(usuario)
@@ -1594,31 +1127,120 @@ def resolver_revision(id_revision: str, datos: DriveReviewResolveRequest, usuari
         producto_id = revision.get("producto_id") or drive_item.get("producto_id")
         if producto_id:
             supabase.table("productos").update({"visible_publico": False, "activo": False}).eq("id", producto_id).eq("id_empresa", id_empresa).execute()
+            _invalidar_catalogo_storefront()
         supabase.table("catalogo_drive_revisiones").update({"estado_revision": "oculto", "fecha_resuelta": _utcnow()}).eq("id", id_revision).execute()
         return {"mensaje": "Producto ocultado"}
 
-    proposed = dict(revision.get("datos_propuestos") or {})
-    if datos.nombre is not None:
-        proposed["nombre"] = datos.nombre.strip()
-    if datos.codigo_producto is not None:
-        proposed["codigo_producto"] = datos.codigo_producto.strip().upper()
-    if datos.categoria is not None:
-        proposed["categoria"] = datos.categoria.strip()
-    if datos.descripcion is not None:
-        proposed["descripcion"] = datos.descripcion.strip()
-    if datos.precio_publico is not None:
-        proposed["precio_publico"] = datos.precio_publico
-    if datos.visible_publico is not None:
-        proposed["visible_publico"] = datos.visible_publico
-    if datos.destacado is not None:
-        proposed["destacado"] = datos.destacado
-
+    proposed = _datos_propuestos_con_cambios(revision, datos)
     producto = _guardar_producto_desde_revision(id_empresa, revision, drive_item, proposed)
+    _invalidar_catalogo_storefront()
     supabase.table("catalogo_drive_items").update({"producto_id": producto["id"], "estado_sync": "vigente", "synced_at": _utcnow()}).eq("id", revision["drive_item_id"]).execute()
     supabase.table("catalogo_drive_revisiones").update({"estado_revision": "aplicado", "fecha_resuelta": _utcnow(), "producto_id": producto["id"]}).eq("id", id_revision).execute()
     return {"mensaje": "Revision aplicada", "producto": producto}
 
 
+def _rows_by_ids(table: str, id_empresa: str, ids: list[str], columns: str = "*") -> dict[str, dict]:
+    rows = {}
+    for chunk in _chunked(_dedupe_keep_order([value for value in ids if value]), CODE_LOOKUP_CHUNK_SIZE):
+        resp = supabase.table(table).select(columns).eq("id_empresa", id_empresa).in_("id", chunk).execute()
+        rows.update({row["id"]: row for row in resp.data or []})
+    return rows
+
+
+@router.post("/revisiones/resolver-lote")
+def resolver_revisiones_lote(datos: DriveReviewBatchRequest, usuario=Depends(get_current_user)):
+    id_empresa = _id_empresa(usuario)
+    if not datos.decisiones:
+        raise HTTPException(status_code=400, detail="Envia al menos una decision")
+    if len(datos.decisiones) > REVISION_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Maximo {REVISION_BATCH_MAX} decisiones por lote")
+
+    decisiones = {decision.id_revision: decision for decision in datos.decisiones}
+    revisiones = _rows_by_ids("catalogo_drive_revisiones", id_empresa, list(decisiones))
+    drive_items = _rows_by_ids("catalogo_drive_items", id_empresa, [revision.get("drive_item_id") for revision in revisiones.values()])
+    ahora = _utcnow()
+    resultados: dict[str, dict] = {}
+    revisiones_resueltas: dict[str, dict] = {}
+    items_actualizados: dict[str, dict] = {}
+    productos_a_ocultar: list[str] = []
+    por_publicar: list[tuple[dict, dict, dict]] = []
+
+    for id_revision, decision in decisiones.items():
+        revision = revisiones.get(id_revision)
+        if not revision:
+            resultados[id_revision] = {"estado": "error", "detalle": "Revision no encontrada"}
+            continue
+        accion = decision.accion.strip().lower()
+        if accion not in {"publicar", "actualizar", "ocultar", "ignorar"}:
+            resultados[id_revision] = {"estado": "error", "detalle": "Accion invalida"}
+            continue
+        drive_item = drive_items.get(revision.get("drive_item_id"), {})
+        if accion == "ignorar":
+            _stage_item_update(revisiones_resueltas, revision, {"estado_revision": "ignorado", "fecha_resuelta": ahora})
+            resultados[id_revision] = {"estado": "ignorado"}
+        elif accion == "ocultar":
+            producto_id = revision.get("producto_id") or drive_item.get("producto_id")
+            if producto_id:
+                productos_a_ocultar.append(producto_id)
+            _stage_item_update(revisiones_resueltas, revision, {"estado_revision": "oculto", "fecha_resuelta": ahora})
+            resultados[id_revision] = {"estado": "oculto", "producto_id": producto_id}
+        else:
+            por_publicar.append((revision, drive_item, _datos_propuestos_con_cambios(revision, decision)))
+
+    codigos = _dedupe_keep_order([
+        (proposed.get("codigo_producto") or "").strip().upper()
+        for _, _, proposed in por_publicar
+        if (proposed.get("codigo_producto") or "").strip()
+    ])
+    costos_index = _costos_code_index(id_empresa, codigos) if codigos else _build_code_index([])
+    productos_index = _productos_code_index(id_empresa, codigos) if codigos else None
+    productos_existentes = set(_rows_by_ids("productos", id_empresa, [revision.get("producto_id") for revision, _, _ in por_publicar], "id"))
+    productos_nuevos: dict[str, dict] = {}
+    productos_actualizados: dict[str, dict] = {}
+    nuevos_por_codigo: dict[str, str] = {}
+
+    for revision, drive_item, proposed in por_publicar:
+        codigo_producto = (proposed.get("codigo_producto") or "").strip().upper() or None
+        try:
+            payload = _producto_payload_desde_revision(drive_item, proposed, _lookup_code_in_index(codigo_producto, costos_index) if codigo_producto else None)
+        except HTTPException as exc:
+            resultados[revision["id"]] = {"estado": "error", "detalle": str(exc.detail)}
+            continue
+
+        producto_id = revision.get("producto_id") if revision.get("producto_id") in productos_existentes else None
+        if not producto_id and codigo_producto:
+            producto_id = nuevos_por_codigo.get(codigo_producto)
+            if not producto_id and productos_index is not None:
+                existing_producto = _buscar_producto_por_codigo(id_empresa, codigo_producto, productos_index)
+                producto_id = existing_producto.get("id") if existing_producto else None
+        if producto_id and producto_id not in productos_nuevos:
+            productos_actualizados[producto_id] = {**payload, "id": producto_id, "id_empresa": id_empresa}
+        else:
+            producto_id = producto_id or str(uuid.uuid4())
+            productos_nuevos[producto_id] = {**payload, "id": producto_id, "id_empresa": id_empresa, "variantes": [], "fecha_creacion": ahora}
+            if codigo_producto:
+                nuevos_por_codigo[codigo_producto] = producto_id
+
+        if drive_item:
+            _stage_item_update(items_actualizados, drive_item, {"producto_id": producto_id, "estado_sync": "vigente", "synced_at": ahora})
+        _stage_item_update(revisiones_resueltas, revision, {"estado_revision": "aplicado", "fecha_resuelta": ahora, "producto_id": producto_id})
+        resultados[revision["id"]] = {"estado": "aplicado", "producto_id": producto_id}
+
+    batch_size = _sync_batch_size()
+    _bulk_insert("productos", list(productos_nuevos.values()), batch_size)
+    _bulk_upsert("productos", list(productos_actualizados.values()), batch_size)
+    for chunk in _chunked(_dedupe_keep_order(productos_a_ocultar), CODE_LOOKUP_CHUNK_SIZE):
+        supabase.table("productos").update({"visible_publico": False, "activo": False}).eq("id_empresa", id_empresa).in_("id", chunk).execute()
+    if productos_nuevos or productos_actualizados or productos_a_ocultar:
+        _invalidar_catalogo_storefront()
+    _bulk_upsert_parcial("catalogo_drive_items", list(items_actualizados.values()), batch_size)
+    _bulk_upsert_parcial("catalogo_drive_revisiones", list(revisiones_resueltas.values()), batch_size)
+
+    salida = [{"id_revision": id_revision, **resultados[id_revision]} for id_revision in decisiones]
+    resumen = {estado: sum(1 for item in salida if item["estado"] == estado) for estado in ("aplicado", "ignorado", "oculto", "error")}
+    return {"mensaje": "Revisiones procesadas", "resumen": resumen, "resultados": salida}
+
+
 @router.get("/costos")
 def listar_costos(usuario=Depends(get_current_user)):
     id_empresa = _id_empresa(usuario)
@@ -1632,187 +1254,400 @@ def guardar_costo(datos: CostoProveedorIn, usuario=Depends(get_current_user)):
     codigo = datos.codigo_producto.strip().upper()
     row = _guardar_costo(id_empresa, codigo, datos.costo_adquisicion, datos.proveedor, datos.notas)
     supabase.table("productos").update({"costo_adquisicion": float(datos.costo_adquisicion)}).eq("id_empresa", id_empresa).eq("codigo_producto", codigo).execute()
+    _refrescar_revisiones_por_costos(id_empresa, [codigo])
     return {"mensaje": "Costo guardado", "data": row}
 
 
+def _pdf_import_workers() -> int:
+    return _env_int("PDF_IMPORT_WORKERS", min(4, os.cpu_count() or 1))
+
+
+def _pdf_import_timeout() -> int:
+    return _env_int("PDF_IMPORT_TIMEOUT_SEGUNDOS", 300)
+
+
+def _guardar_pdfs_subidos(files: list[UploadFile]) -> list[tuple[str, str]]:
+    archivos = [file for file in files if file and (file.filename or "").lower().endswith(".pdf")]
+    if not archivos:
+        raise HTTPException(status_code=400, detail="Adjunta al menos un PDF valido")
+    rutas: list[tuple[str, str]] = []
+    try:
+        for archivo in archivos:
+            with tempfile.NamedTemporaryFile(prefix="pdf-import-", suffix=".pdf", delete=False) as destino:
+                shutil.copyfileobj(archivo.file, destino)
+            rutas.append((archivo.filename or "catalogo.pdf", destino.name))
+    except BaseException:
+        _borrar_pdfs_temporales([ruta for _, ruta in rutas])
+        raise
+    return rutas
+
+
+def _borrar_pdfs_temporales(rutas: list[str]) -> None:
+    for ruta in rutas:
+        try:
+            os.unlink(ruta)
+        except OSError:
+            pass
+
+
+def _ejecutar_trabajo_pdf(worker, args: tuple) -> dict:
+    nombre_archivo, ruta, *resto = args
+    try:
+        with open(ruta, "rb") as contenido:
+            return worker(nombre_archivo, contenido, *resto)
+    except Exception as exc:
+        return {"error": f"No se pudo procesar el PDF: {exc}"}
+
+
+def _proceso_trabajo_pdf(conexion, worker, args: tuple) -> None:
+    try:
+        conexion.send(_ejecutar_trabajo_pdf(worker, args))
+    finally:
+        conexion.close()
+
+
+def _terminar_proceso_pdf(proceso, receptor) -> None:
+    receptor.close()
+    if proceso.is_alive():
+        proceso.terminate()
+    proceso.join(timeout=5)
+    if proceso.is_alive():
+        proceso.kill()
+        proceso.join()
+
+
+def _procesar_pdfs_en_paralelo(worker, trabajos: list[tuple]):
+    try:
+        workers = _pdf_import_workers()
+        if len(trabajos) <= 1 or workers <= 1:
+            for index, args in enumerate(trabajos):
+                yield index, _ejecutar_trabajo_pdf(worker, args)
+            return
+
+        contexto = multiprocessing.get_context("spawn")
+        timeout = _pdf_import_timeout()
+        pendientes = list(enumerate(trabajos))
+        activos: dict[int, tuple] = {}
+        try:
+            while pendientes or activos:
+                while pendientes and len(activos) < workers:
+                    index, args = pendientes.pop(0)
+                    receptor, emisor = contexto.Pipe(duplex=False)
+                    proceso = contexto.Process(target=_proceso_trabajo_pdf, args=(emisor, worker, args), daemon=True)
+                    proceso.start()
+                    emisor.close()
+                    activos[index] = (proceso, receptor, time.monotonic() + timeout)
+
+                limite_proximo = min(limite for _, _, limite in activos.values())
+                listos = wait_connections([receptor for _, receptor, _ in activos.values()], timeout=max(0.0, limite_proximo - time.monotonic()))
+                ahora = time.monotonic()
+                for index, (proceso, receptor, limite) in list(activos.items()):
+                    if receptor in listos:
+                        try:
+                            resultado = receptor.recv()
+                        except EOFError:
+                            resultado = {"error": "El proceso de extraccion del PDF termino inesperadamente"}
+                    elif ahora >= limite:
+                        resultado = {"error": f"Tiempo agotado procesando el PDF (limite {timeout} s por archivo)"}
+                    else:
+                        continue
+                    del activos[index]
+                    _terminar_proceso_pdf(proceso, receptor)
+                    yield index, resultado
+        finally:
+            for proceso, receptor, _ in activos.values():
+                _terminar_proceso_pdf(proceso, receptor)
+    finally:
+        _borrar_pdfs_temporales([args[1] for args in trabajos])
+
+
+def _extraer_catalogo_publico(nombre_archivo: str, contenido: BinaryIO, google_config: dict, max_paginas: int | None, max_segundos: float | None) -> dict:
+    file_id = f"upload:{uuid.uuid4().hex}"
+    try:
+        items, ocr_usado, extraction_source, reporte_paginas = _extract_catalog_items_with_optional_ocr(
+            contenido,
+            nombre_archivo,
+            google_config,
+            file_id,
+            max_paginas=max_paginas,
+            max_segundos=max_segundos,
+        )
+        ocr_error = None
+    except HTTPException as exc:
+        items = []
+        ocr_usado = False
+        extraction_source = "error"
+        ocr_error = str(exc.detail)
+        reporte_paginas = _nuevo_reporte_paginas()
+    return {
+        "file_id": file_id,
+        "items": items,
+        "ocr_usado": ocr_usado,
+        "ocr_error": ocr_error,
+        "origen_extraccion": extraction_source,
+        "reporte_paginas": reporte_paginas,
+    }
+
+
+def _resumen_catalogo_publico(id_empresa: str, nombre_archivo: str, extraido: dict) -> dict:
+    if extraido.get("error"):
+        extraido = {
+            "file_id": f"upload:{uuid.uuid4().hex}",
+            "items": [],
+            "ocr_usado": False,
+            "ocr_error": extraido["error"],
+            "origen_extraccion": "error",
+            "reporte_paginas": _nuevo_reporte_paginas(),
+        }
+    file_id = extraido["file_id"]
+    items = extraido["items"]
+    ocr_usado = extraido["ocr_usado"]
+    reporte_paginas = extraido["reporte_paginas"]
+
+    warnings = _build_public_catalog_warnings(items, ocr_usado=ocr_usado)
+    advertencia_paginas = _advertencia_paginas(reporte_paginas)
+    if advertencia_paginas:
+        warnings.append(advertencia_paginas)
+    costos_index = _costos_code_index(id_empresa, [item.get("codigo_producto") for item in items if item.get("codigo_producto")])
+    ejemplos = []
+    items_payload = []
+    for index, item in enumerate(items):
+        codigo_producto = item.get("codigo_producto")
+        costo = _buscar_costo(id_empresa, codigo_producto, costos_index) if codigo_producto else None
+        costo_adquisicion = float(costo.get("costo_adquisicion") or 0) if costo else None
+        precio_publico = item.get("precio_publico")
+        utilidad_estimada = None
+        margen_estimado = None
+        if precio_publico not in (None, "") and costo_adquisicion is not None:
+            try:
+                utilidad_estimada = round(float(precio_publico) - float(costo_adquisicion), 2)
+                if float(precio_publico) > 0:
+                    margen_estimado = round((utilidad_estimada / float(precio_publico)) * 100, 2)
+            except Exception:
+                utilidad_estimada = None
+                margen_estimado = None
+
+        payload_item = {
+            "id": item.get("candidate_key") or f"{file_id}:{index}",
+            "candidate_key": item.get("candidate_key") or f"{file_id}:{index}",
+            "nombre": item.get("nombre"),
+            "codigo_producto": codigo_producto,
+            "precio_publico": precio_publico,
+            "piezas_por_caja": item.get("piezas_por_caja"),
+            "descripcion": item.get("descripcion"),
+            "orden_detectado": item.get("orden_detectado", index),
+            "page_detectada": item.get("page_detectada", 1),
+            "costo_adquisicion": costo_adquisicion,
+            "utilidad_estimada": utilidad_estimada,
+            "margen_estimado": margen_estimado,
+            "requiere_revision": not codigo_producto or not item.get("nombre") or item.get("nombre") == "Producto sin nombre",
+        }
+        items_payload.append(payload_item)
+        if index < 8:
+            ejemplos.append({
+                "nombre": payload_item.get("nombre"),
+                "codigo_producto": payload_item.get("codigo_producto"),
+                "precio_publico": payload_item.get("precio_publico"),
+                "piezas_por_caja": payload_item.get("piezas_por_caja"),
+            })
+
+    return {
+        "nombre_archivo": nombre_archivo,
+        "productos_detectados": len(items),
+        "ocr_usado": ocr_usado,
+        "ocr_error": extraido["ocr_error"],
+        "origen_extraccion": extraido["origen_extraccion"],
+        "paginas_totales": reporte_paginas["paginas_totales"],
+        "paginas_omitidas": reporte_paginas["paginas_omitidas"],
+        "requiere_revision": bool(warnings),
+        "advertencias": warnings,
+        "ejemplos": ejemplos,
+        "items": items_payload,
+    }
+
+
+def _ndjson_line(payload: dict) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def _responder_importacion(resultados, resumen_global: dict, acumular, mensaje: str, stream: bool):
+    if stream:
+        def generar():
+            for index, resumen_archivo in resultados:
+                acumular(resumen_global, resumen_archivo)
+                yield _ndjson_line({"tipo": "archivo", "indice": index, **resumen_archivo})
+            yield _ndjson_line({"tipo": "resumen", "mensaje": mensaje, "resumen": resumen_global})
+
+        return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+    archivos = []
+    for index, resumen_archivo in resultados:
+        acumular(resumen_global, resumen_archivo)
+        archivos.append((index, resumen_archivo))
+    resumen_global["archivos"] = [resumen_archivo for _, resumen_archivo in sorted(archivos, key=lambda entry: entry[0])]
+    return {"mensaje": mensaje, "resumen": resumen_global}
+
+
+def _acumular_catalogo_publico(resumen_global: dict, resumen_archivo: dict) -> None:
+    resumen_global["archivos_procesados"] += 1
+    resumen_global["productos_detectados"] += resumen_archivo["productos_detectados"]
+
+
 @router.post("/catalogos/importar-pdfs-publicos")
 def importar_catalogos_publicos_pdf(
     files: list[UploadFile] = File(...),
+    max_paginas: int | None = Form(default=None, ge=1),
+    max_segundos: float | None = Form(default=None, ge=1),
+    stream: bool = Form(default=False),
     usuario=Depends(get_current_user),
 ):
     id_empresa = _id_empresa(usuario)
-    archivos = [file for file in files if file and (file.filename or "").lower().endswith(".pdf")]
-    if not archivos:
-        raise HTTPException(status_code=400, detail="Adjunta al menos un PDF valido")
-
     google_config = _google_service_config()
+    archivos = _guardar_pdfs_subidos(files)
     resumen_global = {
         "archivos_procesados": 0,
         "productos_detectados": 0,
         "archivos": [],
     }
+    trabajos = [(nombre, ruta, google_config, max_paginas, max_segundos) for nombre, ruta in archivos]
+    resultados = (
+        (index, _resumen_catalogo_publico(id_empresa, archivos[index][0], extraido))
+        for index, extraido in _procesar_pdfs_en_paralelo(_extraer_catalogo_publico, trabajos)
+    )
+    return _responder_importacion(resultados, resumen_global, _acumular_catalogo_publico, "Analisis de catalogos publicos completado", stream)
 
-    for archivo in archivos:
-        contenido = archivo.file.read()
-        file_id = f"upload:{uuid.uuid4().hex}"
-        ocr_error = None
+
+def _extraer_costos_pdf(nombre_archivo: str, contenido: BinaryIO, google_config: dict, max_paginas: int | None, max_segundos: float | None) -> dict:
+    reporte_paginas = _nuevo_reporte_paginas()
+    try:
+        texto_pdf = _extract_pdf_text(contenido, reporte_paginas, max_paginas=max_paginas, max_segundos=max_segundos)
+    except HTTPException as exc:
+        return {"error": str(exc.detail)}
+    ocr_usado = False
+    ocr_error = None
+
+    if not texto_pdf.strip():
         try:
-            items, ocr_usado, extraction_source = _extract_catalog_items_with_optional_ocr(
-                contenido,
-                archivo.filename or "catalogo.pdf",
-                google_config,
-                file_id,
-            )
+            ocr_pages = min(reporte_paginas["paginas_totales"], _pdf_budget(max_paginas, max_segundos)[0])
+            texto_pdf = _vision_ocr_pdf(contenido, nombre_archivo, google_config, total_pages=ocr_pages)
+            ocr_usado = bool(texto_pdf.strip())
         except HTTPException as exc:
-            items = []
-            ocr_usado = False
-            extraction_source = "error"
             ocr_error = str(exc.detail)
+            texto_pdf = ""
 
-        warnings = _build_public_catalog_warnings(items, ocr_usado=ocr_usado)
-        ejemplos = []
-        items_payload = []
-        for index, item in enumerate(items):
-            codigo_producto = item.get("codigo_producto")
-            costo = _buscar_costo(id_empresa, codigo_producto) if codigo_producto else None
-            costo_adquisicion = float(costo.get("costo_adquisicion") or 0) if costo else None
-            precio_publico = item.get("precio_publico")
-            utilidad_estimada = None
-            margen_estimado = None
-            if precio_publico not in (None, "") and costo_adquisicion is not None:
-                try:
-                    utilidad_estimada = round(float(precio_publico) - float(costo_adquisicion), 2)
-                    if float(precio_publico) > 0:
-                        margen_estimado = round((utilidad_estimada / float(precio_publico)) * 100, 2)
-                except Exception:
-                    utilidad_estimada = None
-                    margen_estimado = None
-
-            payload_item = {
-                "id": item.get("candidate_key") or f"{file_id}:{index}",
-                "candidate_key": item.get("candidate_key") or f"{file_id}:{index}",
-                "nombre": item.get("nombre"),
-                "codigo_producto": codigo_producto,
-                "precio_publico": precio_publico,
-                "piezas_por_caja": item.get("piezas_por_caja"),
-                "descripcion": item.get("descripcion"),
-                "orden_detectado": item.get("orden_detectado", index),
-                "page_detectada": item.get("page_detectada", 1),
-                "costo_adquisicion": costo_adquisicion,
-                "utilidad_estimada": utilidad_estimada,
-                "margen_estimado": margen_estimado,
-                "requiere_revision": not codigo_producto or not item.get("nombre") or item.get("nombre") == "Producto sin nombre",
-            }
-            items_payload.append(payload_item)
-            if index < 8:
-                ejemplos.append({
-                    "nombre": payload_item.get("nombre"),
-                    "codigo_producto": payload_item.get("codigo_producto"),
-                    "precio_publico": payload_item.get("precio_publico"),
-                    "piezas_por_caja": payload_item.get("piezas_por_caja"),
-                })
-
-        resumen_archivo = {
-            "nombre_archivo": archivo.filename,
-            "productos_detectados": len(items),
-            "ocr_usado": ocr_usado,
-            "ocr_error": ocr_error,
-            "origen_extraccion": extraction_source,
-            "requiere_revision": bool(warnings),
-            "advertencias": warnings,
-            "ejemplos": ejemplos,
-            "items": items_payload,
+    rows = _extract_cost_rows_from_text(texto_pdf, nombre_archivo) if texto_pdf.strip() else []
+    ocr_preview = None
+    if texto_pdf.strip() and not rows:
+        compact_preview = re.sub(r"\s+", " ", texto_pdf).strip()
+        ocr_preview = compact_preview[:800] if compact_preview else None
+    return {
+        "rows": rows,
+        "requiere_ocr": not bool(texto_pdf.strip()),
+        "ocr_usado": ocr_usado,
+        "ocr_error": ocr_error,
+        "ocr_preview": ocr_preview,
+        "reporte_paginas": reporte_paginas,
+    }
+
+
+def _resumen_costos_pdf(id_empresa: str, proveedor_value: str, nombre_archivo: str, extraido: dict) -> dict:
+    if extraido.get("error"):
+        extraido = {
+            "rows": [],
+            "requiere_ocr": True,
+            "ocr_usado": False,
+            "ocr_error": extraido["error"],
+            "ocr_preview": None,
+            "reporte_paginas": _nuevo_reporte_paginas(),
         }
-        resumen_global["archivos_procesados"] += 1
-        resumen_global["productos_detectados"] += len(items)
-        resumen_global["archivos"].append(resumen_archivo)
+    rows = extraido["rows"]
+    ocr_usado = extraido["ocr_usado"]
+    reporte_paginas = extraido["reporte_paginas"]
+    approved_rows = [row for row in rows if not _row_requires_review(row)]
+    review_rows = [row for row in rows if _row_requires_review(row)]
+    codigos_guardados = len(_guardar_costos_lote(id_empresa, approved_rows, proveedor_value, f"Importado desde PDF: {nombre_archivo}"))
+
+    advertencias = _build_import_warnings(rows, ocr_usado=ocr_usado, review_rows=review_rows)
+    advertencia_paginas = _advertencia_paginas(reporte_paginas)
+    if advertencia_paginas:
+        advertencias.append(advertencia_paginas)
+    resumen_archivo = {
+        "nombre_archivo": nombre_archivo,
+        "costos_detectados": len(rows),
+        "costos_guardados": len(approved_rows),
+        "codigos_guardados": codigos_guardados,
+        "costos_revision": len(review_rows),
+        "requiere_ocr": extraido["requiere_ocr"],
+        "ocr_usado": ocr_usado,
+        "ocr_error": extraido["ocr_error"],
+        "ocr_preview": extraido["ocr_preview"],
+        "paginas_totales": reporte_paginas["paginas_totales"],
+        "paginas_omitidas": reporte_paginas["paginas_omitidas"],
+        "requiere_revision": bool(advertencias),
+        "advertencias": advertencias,
+        "ejemplos": approved_rows[:5],
+        "ejemplos_revision": review_rows[:5],
+    }
+    _registrar_importacion_costos(id_empresa, nombre_archivo, proveedor_value, resumen_archivo)
+    return resumen_archivo
+
 
-    return {"mensaje": "Analisis de catalogos publicos completado", "resumen": resumen_global}
+def _acumular_costos_pdf(resumen_global: dict, resumen_archivo: dict) -> None:
+    resumen_global["archivos_procesados"] += 1
+    resumen_global["costos_detectados"] += resumen_archivo["costos_detectados"]
+    resumen_global["costos_guardados"] += resumen_archivo["costos_guardados"]
+    resumen_global["codigos_guardados"] += resumen_archivo["codigos_guardados"]
 
 
 @router.post("/costos/importar-pdfs")
 def importar_costos_pdf(
     files: list[UploadFile] = File(...),
     proveedor: str = Form(default="Proveedor Domus"),
+    max_paginas: int | None = Form(default=None, ge=1),
+    max_segundos: float | None = Form(default=None, ge=1),
+    stream: bool = Form(default=False),
     usuario=Depends(get_current_user),
 ):
     id_empresa = _id_empresa(usuario)
     proveedor_value = (proveedor or "Proveedor Domus").strip()
-    archivos = [file for file in files if file and (file.filename or "").lower().endswith(".pdf")]
-    if not archivos:
-        raise HTTPException(status_code=400, detail="Adjunta al menos un PDF valido")
-
+    google_config = _google_service_config()
+    archivos = _guardar_pdfs_subidos(files)
     resumen_global = {
         "archivos_procesados": 0,
         "costos_detectados": 0,
         "costos_guardados": 0,
+        "codigos_guardados": 0,
         "archivos": [],
     }
 
-    google_config = _google_service_config()
+    trabajos = [(nombre, ruta, google_config, max_paginas, max_segundos) for nombre, ruta in archivos]
+    resultados = (
+        (index, _resumen_costos_pdf(id_empresa, proveedor_value, archivos[index][0], extraido))
+        for index, extraido in _procesar_pdfs_en_paralelo(_extraer_costos_pdf, trabajos)
+    )
+    return _responder_importacion(resultados, resumen_global, _acumular_costos_pdf, "Importacion de costos completada", stream)
 
-    for archivo in archivos:
-        contenido = archivo.file.read()
-        texto_pdf = _extract_pdf_text(contenido)
-        ocr_usado = False
-        ocr_error = None
 
-        if not texto_pdf.strip():
-            try:
-                texto_pdf = _vision_ocr_pdf(contenido, archivo.filename or "catalogo.pdf", google_config)
-                ocr_usado = bool(texto_pdf.strip())
-            except HTTPException as exc:
-                ocr_error = str(exc.detail)
-                texto_pdf = ""
-
-        requiere_ocr = not bool(texto_pdf.strip())
-        rows = _extract_cost_rows_from_text(texto_pdf, archivo.filename or "catalogo.pdf") if texto_pdf.strip() else []
-        approved_rows = [row for row in rows if not _row_requires_review(row)]
-        review_rows = [row for row in rows if _row_requires_review(row)]
-        guardados = 0
-        for row in approved_rows:
-            _guardar_costo(id_empresa, row["codigo_producto"], row["costo_adquisicion"], proveedor_value, f"Importado desde PDF: {archivo.filename}")
-            supabase.table("productos").update({"costo_adquisicion": float(row["costo_adquisicion"])}).eq("id_empresa", id_empresa).eq("codigo_producto", row["codigo_producto"]).execute()
-            guardados += 1
-
-        ocr_preview = None
-        if texto_pdf.strip() and not rows:
-            compact_preview = re.sub(r"\s+", " ", texto_pdf).strip()
-            ocr_preview = compact_preview[:800] if compact_preview else None
-
-        advertencias = _build_import_warnings(rows, ocr_usado=ocr_usado, review_rows=review_rows)
-        resumen_archivo = {
-            "nombre_archivo": archivo.filename,
-            "costos_detectados": len(rows),
-            "costos_guardados": guardados,
-            "costos_revision": len(review_rows),
-            "requiere_ocr": requiere_ocr,
-            "ocr_usado": ocr_usado,
-            "ocr_error": ocr_error,
-            "ocr_preview": ocr_preview,
-            "requiere_revision": bool(advertencias),
-            "advertencias": advertencias,
-            "ejemplos": approved_rows[:5],
-            "ejemplos_revision": review_rows[:5],
-        }
-        _registrar_importacion_costos(id_empresa, archivo.filename or "catalogo.pdf", proveedor_value, resumen_archivo)
-        resumen_global["archivos_procesados"] += 1
-        resumen_global["costos_detectados"] += len(rows)
-        resumen_global["costos_guardados"] += guardados
-        resumen_global["archivos"].append(resumen_archivo)
-
-    return {"mensaje": "Importacion de costos completada", "resumen": resumen_global}
+def _rango_rentabilidad(desde: date | None, hasta: date | None) -> tuple[str | None, str | None]:
+    if desde and hasta and desde > hasta:
+        raise HTTPException(status_code=400, detail="La fecha desde no puede ser mayor que hasta")
+    inicio = datetime.combine(desde, datetime.min.time()).isoformat() if desde else None
+    fin = datetime.combine(hasta + timedelta(days=1), datetime.min.time()).isoformat() if hasta else None
+    return inicio, fin
 
 
-@router.get("/rentabilidad")
-def rentabilidad(usuario=Depends(get_current_user)):
-    id_empresa = _id_empresa(usuario)
+def _rentabilidad_local(id_empresa: str, inicio: str | None, fin: str | None, limite: int | None) -> dict:
     productos = supabase.table("productos").select("id,nombre,codigo_producto,precio,costo_adquisicion").eq("id_empresa", id_empresa).execute().data or []
-    ventas = supabase.table("ventas").select("id").eq("id_empresa", id_empresa).execute().data or []
+    ventas_query = supabase.table("ventas").select("id").eq("id_empresa", id_empresa)
+    if inicio:
+        ventas_query = ventas_query.gte("fecha", inicio)
+    if fin:
+        ventas_query = ventas_query.lt("fecha", fin)
+    ventas = ventas_query.execute().data or []
     ids_venta = [item.get("id") for item in ventas if item.get("id")]
     detalles = []
-    if ids_venta:
-        detalles = supabase.table("detalle_ventas").select("id_producto,cantidad,precio_unitario").in_("id_venta", ids_venta).execute().data or []
+    for chunk in _chunked(ids_venta, CODE_LOOKUP_CHUNK_SIZE):
+        detalles.extend(supabase.table("detalle_ventas").select("id_producto,cantidad,precio_unitario").in_("id_venta", chunk).execute().data or [])
     productos_map = {p["id"]: p for p in productos if p.get("id")}
     por_producto = {}
     utilidad_total = 0.0
@@ -1843,8 +1678,34 @@ def rentabilidad(usuario=Depends(get_current_user)):
     rentables = sorted(por_producto.values(), key=lambda item: item["utilidad_total"], reverse=True)
     return {
         "utilidad_total_estimada": round(utilidad_total, 2),
+        "productos_con_ventas": len(ranking),
         "producto_mas_vendido": ranking[0] if ranking else None,
         "producto_mas_rentable": rentables[0] if rentables else None,
-        "productos": ranking,
+        "productos": ranking[:limite],
     }
 
+
+@router.get("/rentabilidad")
+def rentabilidad(
+    desde: date | None = Query(default=None),
+    hasta: date | None = Query(default=None),
+    limite: int | None = Query(default=None, ge=1, le=500),
+    usuario=Depends(get_current_user),
+):
+    id_empresa = _id_empresa(usuario)
+    inicio, fin = _rango_rentabilidad(desde, hasta)
+    try:
+        resp = supabase.rpc("rentabilidad_productos", {
+            "p_id_empresa": id_empresa,
+            "p_desde": inicio,
+            "p_hasta": fin,
+            "p_limite": limite,
+        }).execute()
+        data = resp.data
+    except Exception as exc:
+        if not _rpc_inexistente(exc):
+            raise
+        data = None
+    if not isinstance(data, dict):
+        data = _rentabilidad_local(id_empresa, inicio, fin, limite)
+    return {**data, "desde": desde.isoformat() if desde else None, "hasta": hasta.isoformat() if hasta else None}
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from dependencies import get_current_user
 from database import supabase
+from storefront_cache import _invalidar_config_storefront
 from datetime import datetime
 
 router = APIRouter(prefix="/empresas", tags=["Empresas"])
@@ -33,4 +34,5 @@ def actualizar_logo(logo_url: str, usuario=Depends(get_current_user)):
     resp = supabase.table("empresas").update({"logo_url": logo_url}).eq("id", id_empresa).execute()
     if not resp.data:
         raise HTTPException(status_code=400, detail="No se pudo actualizar logo")
+    _invalidar_config_storefront()
     return {"mensaje": "Logo actualizado", "logo_url": logo_url}
@@ -1,10 +1,7 @@
 import base64
-import json
 import os
 import re
 import unicodedata
-import urllib.error
-import urllib.request
 from datetime import date, datetime
 from typing import Optional
 
@@ -14,9 +11,10 @@ from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 
 from database import SUPABASE_KEY, SUPABASE_URL, supabase
 from dependencies import get_current_user
+from google_api import _google_json
+from google_auth import _google_access_token
 from routes.drive_sync import (
     GOOGLE_VISION_SCOPE,
-    _google_access_token,
     _google_service_config,
     _vision_enabled,
     _vision_parent,
@@ -499,25 +497,16 @@ def _vision_ocr_image(file_bytes: bytes, filename: str) -> str:
         ]
     }
 
-    request = urllib.request.Request(
+    response_payload = _google_json(
+        "POST",
         _vision_image_endpoint(_vision_parent()),
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; charset=utf-8",
-        },
-        method="POST",
+        operation="vision.images.annotate",
+        error_prefix=f"No se pudo ejecutar OCR con Google Vision para {filename}",
+        access_token=access_token,
+        json=payload,
+        timeout=120,
     )
 
-    try:
-        with urllib.request.urlopen(request, timeout=120) as response:
-            response_payload = json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as exc:
-        detail = exc.read().decode("utf-8", errors="ignore")
-        raise HTTPException(status_code=400, detail=f"No se pudo ejecutar OCR con Google Vision para {filename}: {detail or exc.reason}")
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"No se pudo ejecutar OCR con Google Vision para {filename}: {exc}")
-
     responses = response_payload.get("responses") or []
     first = responses[0] if responses else {}
     if first.get("error", {}).get("message"):
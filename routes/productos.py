@@ -1,29 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import base64
+import csv
+import io
 import json
 import os
 import re
-import time
 import unicodedata
-import urllib.error
-import urllib.parse
-import urllib.request
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel, Field
-import jwt
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError
 
+from busqueda_codigos import CODE_LOOKUP_CHUNK_SIZE, _chunked, _rows_by_code_keys
+from codigos import _clean_compact_code, _codigo_columns, _indexed_code_keys, _variant_code_keys
 from database import supabase
 from dependencies import get_current_user
+from esquema import _columnas_tabla, _escribir_esquema, _payloads_esquema, _tiene_columna
+from google_api import _drive_list_children
+from google_auth import _google_access_token
+from imagenes import _variantes_desde_url
+from storefront_cache import _invalidar_catalogo_storefront
 
 router = APIRouter(prefix="/productos", tags=["Productos"])
 
 GOOGLE_DRIVE_SCOPE = "https://www.googleapis.com/auth/drive.readonly"
-GOOGLE_OAUTH_TOKEN_URL = "https://oauth2.googleapis.com/token"
-GOOGLE_DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
 GOOGLE_DRIVE_FOLDER_MIME = "application/vnd.google-apps.folder"
 VARIANTES_MARKER_START = "[VARIANTES_DOMUS]"
 VARIANTES_MARKER_END = "[/VARIANTES_DOMUS]"
+PRODUCTOS_LIMITE_MAX = 500
+PRODUCTOS_LOTE_MAX = 10000
+PRODUCTOS_LOTE_CHUNK = 500
+PRODUCTOS_LOTE_WORKERS = 8
+PRODUCTO_CAMPOS_COLUMNAS = {
+    "id": ("id",),
+    "id_empresa": ("id_empresa",),
+    "nombre": ("nombre",),
+    "descripcion": ("descripcion", "variantes"),
+    "costo_adquisicion": ("costo_adquisicion", "costo", "descripcion", "variantes"),
+    "precio": ("precio", "precio_venta", "descripcion", "variantes"),
+    "ubicacion": ("ubicacion", "ubicacion_producto"),
+    "foto_url": ("foto_url", "imagen_url", "imagenes_extra"),
+    "foto_variantes": ("foto_url", "imagen_url", "imagenes_extra"),
+    "categoria": ("categoria",),
+    "codigo_producto": ("codigo_producto", "descripcion", "variantes"),
+    "precio_publico": ("precio_publico", "precio", "precio_venta", "descripcion", "variantes"),
+    "piezas_por_caja": ("piezas_por_caja", "descripcion", "variantes"),
+    "slug": ("slug", "nombre"),
+    "visible_publico": ("visible_publico",),
+    "destacado": ("destacado",),
+    "origen_catalogo": ("origen_catalogo",),
+    "imagenes_extra": ("imagenes_extra",),
+    "imagenes_extra_variantes": ("imagenes_extra",),
+    "variantes_catalogo": ("descripcion", "variantes"),
+    "activo": ("activo",),
+    "fecha_creacion": ("fecha_creacion",),
+}
 
 
 class VarianteCatalogo(BaseModel):
@@ -53,6 +86,10 @@ class ProductoCreate(BaseModel):
     stock_inicial: int | None = Field(default=None, ge=0)
 
 
+class ProductoLoteItem(ProductoCreate):
+    id: str | None = None
+
+
 class ProductoUpdate(BaseModel):
     nombre: str | None = Field(default=None, min_length=2, max_length=140)
     descripcion: str | None = Field(default=None, max_length=500)
@@ -73,6 +110,10 @@ class ProductoUpdate(BaseModel):
     stock_inicial: int | None = Field(default=None, ge=0)
 
 
+class ProductoLoteCambio(ProductoUpdate):
+    id: str | None = None
+
+
 def _storefront_empresa_id() -> str:
     return (os.getenv("STOREFRONT_EMPRESA_ID") or os.getenv("PUBLIC_STOREFRONT_EMPRESA_ID") or "").strip()
 
@@ -139,6 +180,13 @@ def _embed_variantes_metadata(descripcion: str | None, variantes: list[dict]) ->
     return f"{body}\n{clean}".strip()
 
 
+def _variantes_producto(p: dict) -> tuple[str, list[dict]]:
+    variantes = p.get("variantes")
+    if isinstance(variantes, list):
+        return str(p.get("descripcion") or "").strip(), variantes
+    return _extract_variantes_metadata(p.get("descripcion"))
+
+
 def _normalize_variantes_catalogo(value) -> list[dict]:
     if not value:
         return []
@@ -184,7 +232,7 @@ def _normalizar_producto(p: dict) -> dict:
     foto_url = p.get("foto_url") if p.get("foto_url") is not None else p.get("imagen_url")
     if not foto_url and imagenes_extra:
         foto_url = imagenes_extra[0]
-    descripcion_limpia, variantes_catalogo = _extract_variantes_metadata(p.get("descripcion"))
+    descripcion_limpia, variantes_catalogo = _variantes_producto(p)
     primary_variant = _primary_variant(variantes_catalogo)
     codigo_producto = p.get("codigo_producto") or (primary_variant.get("codigo") if primary_variant else None)
     return {
@@ -196,6 +244,7 @@ def _normalizar_producto(p: dict) -> dict:
         "precio": p.get("precio") if p.get("precio") is not None else p.get("precio_venta") or (primary_variant.get("precio_publico") if primary_variant else 0) or 0,
         "ubicacion": p.get("ubicacion") if p.get("ubicacion") is not None else p.get("ubicacion_producto"),
         "foto_url": foto_url,
+        "foto_variantes": _variantes_desde_url(foto_url),
         "categoria": p.get("categoria") or "Sin categoria",
         "codigo_producto": codigo_producto,
         "precio_publico": p.get("precio_publico") if p.get("precio_publico") is not None else p.get("precio") if p.get("precio") is not None else p.get("precio_venta") or (primary_variant.get("precio_publico") if primary_variant else 0) or 0,
@@ -205,42 +254,45 @@ def _normalizar_producto(p: dict) -> dict:
         "destacado": p.get("destacado", False),
         "origen_catalogo": p.get("origen_catalogo") or "manual",
         "imagenes_extra": imagenes_extra,
+        "imagenes_extra_variantes": [_variantes_desde_url(url) for url in imagenes_extra],
         "variantes_catalogo": variantes_catalogo,
         "activo": p.get("activo", True),
         "fecha_creacion": p.get("fecha_creacion"),
     }
 
 
-def _try_insert_producto(payloads: list[dict]):
-    last_error = None
-    for payload in payloads:
-        try:
-            resp = supabase.table("productos").insert(payload).execute()
-            if resp.data:
-                return resp.data[0]
-        except Exception as e:
-            last_error = str(e)
-    raise HTTPException(status_code=400, detail=last_error or "No se pudo crear producto")
+def _insertar_producto(payloads: list[dict]):
+    try:
+        resp = _escribir_esquema("productos", payloads, lambda payload: supabase.table("productos").insert(payload).execute())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not resp or not resp.data:
+        raise HTTPException(status_code=400, detail="No se pudo crear producto")
+    _invalidar_catalogo_storefront()
+    return resp.data[0]
 
 
-def _try_update_producto(id_producto: str, id_empresa: str, payloads: list[dict]):
-    last_error = None
-    for payload in payloads:
-        if not payload:
-            continue
-        try:
-            resp = (
+def _actualizar_producto_payload(id_producto: str, id_empresa: str, payloads: list[dict]):
+    if not any(payloads):
+        raise HTTPException(status_code=400, detail="Sin cambios")
+    try:
+        resp = _escribir_esquema(
+            "productos",
+            payloads,
+            lambda payload: (
                 supabase.table("productos")
                 .update(payload)
                 .eq("id", id_producto)
                 .eq("id_empresa", id_empresa)
                 .execute()
-            )
-            if resp.data:
-                return resp.data[0]
-        except Exception as e:
-            last_error = str(e)
-    raise HTTPException(status_code=400, detail=last_error or "No se pudo actualizar producto")
+            ),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not resp or not resp.data:
+        raise HTTPException(status_code=400, detail="No se pudo actualizar producto")
+    _invalidar_catalogo_storefront()
+    return resp.data[0]
 
 
 def _drive_private_key() -> str:
@@ -272,72 +324,7 @@ def _drive_config(folder_id_override: str | None = None) -> dict:
 
 
 def _drive_access_token(config: dict) -> str:
-    now = int(time.time())
-    assertion = jwt.encode(
-        {
-            "iss": config["client_email"],
-            "scope": GOOGLE_DRIVE_SCOPE,
-            "aud": GOOGLE_OAUTH_TOKEN_URL,
-            "exp": now + 3600,
-            "iat": now,
-        },
-        config["private_key"],
-        algorithm="RS256",
-    )
-
-    body = urllib.parse.urlencode({
-        "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
-        "assertion": assertion,
-    }).encode("utf-8")
-
-    request = urllib.request.Request(
-        GOOGLE_OAUTH_TOKEN_URL,
-        data=body,
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        method="POST",
-    )
-
-    try:
-        with urllib.request.urlopen(request, timeout=25) as response:
-            payload = json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as exc:
-        detail = exc.read().decode("utf-8", errors="ignore")
-        raise HTTPException(status_code=400, detail=f"No se pudo autenticar con Google Drive: {detail or exc.reason}")
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"No se pudo autenticar con Google Drive: {exc}")
-
-    access_token = payload.get("access_token")
-    if not access_token:
-        raise HTTPException(status_code=400, detail="Google no devolvio access_token para Drive")
-    return access_token
-
-
-def _drive_list_children(folder_id: str, access_token: str) -> list[dict]:
-    params = urllib.parse.urlencode({
-        "q": f"'{folder_id}' in parents and trashed = false",
-        "fields": "files(id,name,mimeType,modifiedTime,size,webViewLink)",
-        "orderBy": "folder,name_natural",
-        "pageSize": "200",
-        "supportsAllDrives": "true",
-        "includeItemsFromAllDrives": "true",
-    })
-
-    request = urllib.request.Request(
-        f"{GOOGLE_DRIVE_FILES_URL}?{params}",
-        headers={"Authorization": f"Bearer {access_token}"},
-        method="GET",
-    )
-
-    try:
-        with urllib.request.urlopen(request, timeout=25) as response:
-            payload = json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as exc:
-        detail = exc.read().decode("utf-8", errors="ignore")
-        raise HTTPException(status_code=400, detail=f"No se pudo listar la carpeta de Drive: {detail or exc.reason}")
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"No se pudo listar la carpeta de Drive: {exc}")
-
-    return payload.get("files") or []
+    return _google_access_token(config, [GOOGLE_DRIVE_SCOPE], "Google Drive")
 
 
 def _format_drive_file(item: dict) -> dict:
@@ -351,19 +338,116 @@ def _format_drive_file(item: dict) -> dict:
     }
 
 
+def _campos_producto(campos: str | None) -> list[str]:
+    solicitados = [campo.strip() for campo in (campos or "").split(",") if campo.strip()]
+    invalidos = [campo for campo in solicitados if campo not in PRODUCTO_CAMPOS_COLUMNAS]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos invalidos: {', '.join(invalidos)}")
+    if solicitados and "id" not in solicitados:
+        solicitados.insert(0, "id")
+    return solicitados
+
+
+def _columnas_producto(campos: list[str]) -> str:
+    if not campos:
+        return "*"
+    columnas = _columnas_tabla("productos")
+    if columnas is None:
+        return "*"
+    requeridas = ["id", "fecha_creacion"]
+    for campo in campos:
+        requeridas.extend(PRODUCTO_CAMPOS_COLUMNAS[campo])
+    return ",".join(dict.fromkeys(columna for columna in requeridas if columna in columnas))
+
+
+def _codificar_cursor(row: dict) -> str:
+    raw = json.dumps([row.get("fecha_creacion"), row.get("id")], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decodificar_cursor(cursor: str) -> tuple[str | None, str]:
+    try:
+        fecha, id_producto = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor invalido")
+    try:
+        id_producto = str(uuid.UUID(str(id_producto)))
+        if fecha:
+            datetime.fromisoformat(fecha.replace("Z", "+00:00"))
+    except (TypeError, ValueError, AttributeError):
+        raise HTTPException(status_code=400, detail="Cursor invalido")
+    return fecha or None, id_producto
+
+
+def _filtro_cursor(fecha: str | None, id_producto: str) -> str:
+    if fecha is None:
+        return f"and(fecha_creacion.is.null,id.lt.{id_producto}),fecha_creacion.not.is.null"
+    return f'fecha_creacion.lt."{fecha}",and(fecha_creacion.eq."{fecha}",id.lt.{id_producto})'
+
+
+def _termino_busqueda(busqueda: str | None) -> str:
+    return re.sub(r"[,()*%\"\\]", " ", busqueda or "").strip()
+
+
 @router.get("/")
-def listar_productos(usuario=Depends(get_current_user)):
+def listar_productos(
+    limite: int | None = Query(default=None, ge=1, le=PRODUCTOS_LIMITE_MAX),
+    cursor: str | None = Query(default=None),
+    campos: str | None = Query(default=None, alias="fields"),
+    categoria: str | None = Query(default=None),
+    visible_publico: bool | None = Query(default=None),
+    activo: bool | None = Query(default=None),
+    busqueda: str | None = Query(default=None),
+    usuario=Depends(get_current_user),
+):
     id_empresa = _id_empresa(usuario)
+    campos_salida = _campos_producto(campos)
+    paginado = limite is not None or cursor is not None
 
-    resp = (
+    query = (
         supabase.table("productos")
-        .select("*")
+        .select(_columnas_producto(campos_salida), count="exact" if paginado and not cursor else None)
         .eq("id_empresa", id_empresa)
-        .order("fecha_creacion", desc=True)
-        .execute()
     )
-
-    return [_normalizar_producto(p) for p in (resp.data or [])]
+    if categoria:
+        query = query.eq("categoria", categoria.strip())
+    if visible_publico is not None:
+        query = query.eq("visible_publico", visible_publico)
+    if activo is not None:
+        query = query.eq("activo", activo)
+    termino = _termino_busqueda(busqueda)
+    if termino:
+        filtros = [f"nombre.ilike.*{termino}*", f"codigo_producto.ilike.*{termino}*"]
+        compacto = _clean_compact_code(termino)
+        if compacto:
+            filtros.append(f"codigo_compacto.like.*{compacto}*")
+        query = query.or_(",".join(filtros))
+    if cursor:
+        fecha, id_producto = _decodificar_cursor(cursor)
+        query = query.or_(_filtro_cursor(fecha, id_producto))
+    query = query.order("fecha_creacion", desc=True, nullsfirst=True).order("id", desc=True)
+    if paginado:
+        limite = limite or 50
+        query = query.limit(limite + 1)
+
+    resp = query.execute()
+    rows = resp.data or []
+    siguiente_cursor = None
+    if paginado and len(rows) > limite:
+        rows = rows[:limite]
+        siguiente_cursor = _codificar_cursor(rows[-1])
+
+    productos = [_normalizar_producto(p) for p in rows]
+    if campos_salida:
+        productos = [{campo: producto.get(campo) for campo in campos_salida} for producto in productos]
+    if not paginado:
+        return productos
+    return {
+        "productos": productos,
+        "siguiente_cursor": siguiente_cursor,
+        "total": resp.count,
+        "limite": limite,
+    }
 
 
 @router.get("/drive/preview")
@@ -408,14 +492,11 @@ def obtener_producto(id_producto: str, usuario=Depends(get_current_user)):
     return _normalizar_producto(resp.data[0])
 
 
-@router.post("/")
-def crear_producto(datos: ProductoCreate, usuario=Depends(get_current_user)):
-    id_empresa = _id_empresa(usuario)
-    now = datetime.utcnow().isoformat()
+def _producto_payloads(datos: ProductoCreate, id_empresa: str, now: str) -> list[dict]:
     nombre = datos.nombre.strip()
     variantes_catalogo = _normalize_variantes_catalogo(datos.variantes_catalogo)
     primary_variant = _primary_variant(variantes_catalogo)
-    descripcion = _embed_variantes_metadata((datos.descripcion or "").strip() or None, variantes_catalogo)
+    descripcion = (datos.descripcion or "").strip() or None
     ubicacion = (datos.ubicacion or "").strip() or None
     foto_url = (datos.foto_url or "").strip() or None
     categoria = (datos.categoria or "").strip() or None
@@ -429,12 +510,15 @@ def crear_producto(datos: ProductoCreate, usuario=Depends(get_current_user)):
         "id_empresa": id_empresa,
         "nombre": nombre,
         "descripcion": descripcion,
+        "variantes": variantes_catalogo,
         "costo_adquisicion": datos.costo_adquisicion if datos.costo_adquisicion is not None else (primary_variant.get("costo_adquisicion") if primary_variant else 0) or 0,
         "precio": datos.precio if datos.precio is not None else (primary_variant.get("precio_publico") if primary_variant else 0) or 0,
         "ubicacion": ubicacion,
         "foto_url": foto_url,
         "categoria": categoria,
         "codigo_producto": codigo_producto,
+        **_codigo_columns(codigo_producto),
+        "codigos_variantes": _variant_code_keys(variantes_catalogo),
         "precio_publico": datos.precio if datos.precio is not None else (primary_variant.get("precio_publico") if primary_variant else 0) or 0,
         "slug": slug,
         "visible_publico": datos.visible_publico,
@@ -445,11 +529,14 @@ def crear_producto(datos: ProductoCreate, usuario=Depends(get_current_user)):
         "fecha_creacion": now,
     }
 
+    if not _tiene_columna("productos", "variantes"):
+        payload_full["descripcion"] = _embed_variantes_metadata(descripcion, variantes_catalogo)
+
     payload_alt = {
         "id": payload_full["id"],
         "id_empresa": id_empresa,
         "nombre": nombre,
-        "descripcion": descripcion,
+        "descripcion": _embed_variantes_metadata(descripcion, variantes_catalogo),
         "costo": datos.costo_adquisicion if datos.costo_adquisicion is not None else (primary_variant.get("costo_adquisicion") if primary_variant else 0) or 0,
         "precio_venta": datos.precio if datos.precio is not None else (primary_variant.get("precio_publico") if primary_variant else 0) or 0,
         "ubicacion_producto": ubicacion,
@@ -465,59 +552,300 @@ def crear_producto(datos: ProductoCreate, usuario=Depends(get_current_user)):
         "precio": datos.precio if datos.precio is not None else (primary_variant.get("precio_publico") if primary_variant else 0) or 0,
         "fecha_creacion": now,
     }
+    return [payload_full, payload_alt, payload_min]
 
-    creado = _try_insert_producto([payload_full, payload_alt, payload_min])
+
+def _inventario_inicial_payload(id_empresa: str, id_producto: str, id_sucursal: str, stock: int, now: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "id_empresa": id_empresa,
+        "id_sucursal": id_sucursal,
+        "id_producto": id_producto,
+        "stock": int(stock),
+        "stock_minimo": 0,
+        "fecha_actualizacion": now,
+        "stock_reservado": 0,
+    }
+
+
+@router.post("/")
+def crear_producto(datos: ProductoCreate, usuario=Depends(get_current_user)):
+    id_empresa = _id_empresa(usuario)
+    now = datetime.utcnow().isoformat()
+    payloads = _producto_payloads(datos, id_empresa, now)
+    creado = _insertar_producto(payloads)
 
     if datos.id_sucursal_inicial and datos.stock_inicial is not None:
         try:
-            supabase.table("inventario").insert({
-                "id": str(uuid.uuid4()),
-                "id_empresa": id_empresa,
-                "id_sucursal": datos.id_sucursal_inicial,
-                "id_producto": payload_full["id"],
-                "stock": int(datos.stock_inicial),
-                "stock_minimo": 0,
-                "fecha_actualizacion": now,
-                "stock_reservado": 0,
-            }).execute()
+            supabase.table("inventario").insert(
+                _inventario_inicial_payload(id_empresa, payloads[0]["id"], datos.id_sucursal_inicial, datos.stock_inicial, now)
+            ).execute()
         except Exception:
             pass
 
     return {"mensaje": "Producto creado", "data": _normalizar_producto(creado)}
 
 
-@router.put("/{id_producto}")
-def actualizar_producto(id_producto: str, datos: ProductoUpdate, usuario=Depends(get_current_user)):
-    id_empresa = _id_empresa(usuario)
+def _filas_csv(contenido: bytes) -> list[dict]:
+    try:
+        texto = contenido.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El CSV debe estar codificado en UTF-8")
+    filas = []
+    for row in csv.DictReader(io.StringIO(texto)):
+        fila = {}
+        for key, value in row.items():
+            campo = (key or "").strip()
+            valor = value.strip() if isinstance(value, str) else value
+            if campo and valor not in (None, ""):
+                fila[campo] = valor
+        filas.append(fila)
+    return filas
+
+
+async def _filas_lote(request: Request) -> list[dict]:
+    content_type = (request.headers.get("content-type") or "").lower()
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        archivo = form.get("archivo") or form.get("file")
+        if archivo is None or not hasattr(archivo, "read"):
+            raise HTTPException(status_code=400, detail="Adjunta el CSV en el campo archivo")
+        return _filas_csv(await archivo.read())
+    if "csv" in content_type or content_type.startswith("text/plain"):
+        return _filas_csv(await request.body())
+    try:
+        payload = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Envia un CSV o un JSON con la lista de productos")
+    filas = payload.get("productos") if isinstance(payload, dict) else payload
+    if not isinstance(filas, list):
+        raise HTTPException(status_code=400, detail="El JSON debe ser una lista de productos o {\"productos\": [...]}")
+    return filas
+
+
+def _validar_fila_lote(fila, modelo):
+    if not isinstance(fila, dict):
+        raise ValueError("La fila debe ser un objeto")
+    datos = dict(fila)
+    if isinstance(datos.get("imagenes_extra"), str):
+        datos["imagenes_extra"] = _normalize_gallery(datos["imagenes_extra"])
+    if isinstance(datos.get("variantes_catalogo"), str):
+        try:
+            datos["variantes_catalogo"] = json.loads(datos["variantes_catalogo"])
+        except ValueError:
+            raise ValueError("variantes_catalogo debe ser JSON valido")
+    try:
+        return modelo(**datos)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error.get('loc') or ())}: {error.get('msg')}" for error in e.errors()
+        ))
+
+
+def _productos_existentes_lote(id_empresa: str, ids: list[str], codigos: list[str]) -> tuple[dict[str, dict], dict[str, dict]]:
+    por_id = {}
+    for chunk in _chunked(list(dict.fromkeys(ids)), CODE_LOOKUP_CHUNK_SIZE):
+        resp = supabase.table("productos").select("*").eq("id_empresa", id_empresa).in_("id", chunk).execute()
+        por_id.update({row["id"]: row for row in resp.data or []})
+    por_clave = {}
+    for row in _rows_by_code_keys("productos", "*", id_empresa, codigos):
+        por_id.setdefault(row["id"], row)
+        for clave in _indexed_code_keys(row.get("codigo_producto")):
+            por_clave.setdefault(clave, row)
+    return por_id, por_clave
+
+
+def _producto_por_codigo_lote(por_clave: dict[str, dict], codigo: str | None) -> dict | None:
+    for clave in _indexed_code_keys(codigo):
+        if clave in por_clave:
+            return por_clave[clave]
+    return None
+
+
+def _slugs_ocupados_lote(id_empresa: str, slugs: list[str]) -> dict[str, str]:
+    ocupados = {}
+    for chunk in _chunked(list(dict.fromkeys(slugs)), CODE_LOOKUP_CHUNK_SIZE):
+        resp = supabase.table("productos").select("id,slug").eq("id_empresa", id_empresa).in_("slug", chunk).execute()
+        ocupados.update({row["slug"]: row["id"] for row in resp.data or []})
+    return ocupados
+
+
+def _escribir_tramo(operacion, tramo: list[tuple[int, list[dict]]], escritas: list[int], errores: list[dict]):
+    ultimo_error = None
+    for nivel in range(max(len(candidatos) for _, candidatos in tramo)):
+        try:
+            operacion([candidatos[min(nivel, len(candidatos) - 1)] for _, candidatos in tramo])
+        except Exception as e:
+            ultimo_error = e
+            continue
+        escritas.extend(fila for fila, _ in tramo)
+        return
+    if len(tramo) == 1:
+        errores.append({"fila": tramo[0][0], "error": str(ultimo_error)})
+        return
+    mitad = len(tramo) // 2
+    _escribir_tramo(operacion, tramo[:mitad], escritas, errores)
+    _escribir_tramo(operacion, tramo[mitad:], escritas, errores)
+
+
+def _escribir_lote(operacion, filas: list[tuple[int, list[dict]]], errores: list[dict]) -> list[int]:
+    escritas = []
+    for chunk in _chunked(filas, PRODUCTOS_LOTE_CHUNK):
+        _escribir_tramo(operacion, chunk, escritas, errores)
+    return escritas
+
+
+def _actualizar_lote(id_empresa: str, filas: list[tuple[int, str, list[dict]]], errores: list[dict]) -> list[int]:
+    def actualizar(fila: tuple[int, str, list[dict]]):
+        numero, id_producto, payloads = fila
+        if not any(payloads):
+            return numero, None
+        try:
+            _escribir_esquema(
+                "productos",
+                payloads,
+                lambda payload: supabase.table("productos").update(payload).eq("id", id_producto).eq("id_empresa", id_empresa).execute(),
+            )
+        except Exception as e:
+            return numero, str(e)
+        return numero, None
 
-    actual = (
-        supabase.table("productos")
-        .select("id,nombre")
-        .eq("id", id_producto)
-        .eq("id_empresa", id_empresa)
-        .limit(1)
-        .execute()
+    escritas = []
+    with ThreadPoolExecutor(max_workers=PRODUCTOS_LOTE_WORKERS, thread_name_prefix="productos-lote") as executor:
+        for numero, error in executor.map(actualizar, filas):
+            if error:
+                errores.append({"fila": numero, "error": error})
+            else:
+                escritas.append(numero)
+    return escritas
+
+
+def _procesar_lote_productos(id_empresa: str, filas: list) -> dict:
+    now = datetime.utcnow().isoformat()
+    errores: list[dict] = []
+    validos: list[tuple[int, dict, ProductoLoteCambio]] = []
+    codigos_vistos: set[str] = set()
+    for numero, fila in enumerate(filas, start=1):
+        try:
+            cambio = _validar_fila_lote(fila, ProductoLoteCambio)
+        except ValueError as e:
+            errores.append({"fila": numero, "error": str(e)})
+            continue
+        codigo = (cambio.codigo_producto or "").strip().upper()
+        if codigo and codigo in codigos_vistos:
+            errores.append({"fila": numero, "error": f"Codigo {codigo} duplicado en el lote"})
+            continue
+        if codigo:
+            codigos_vistos.add(codigo)
+        validos.append((numero, fila, cambio))
+
+    por_id, por_clave = _productos_existentes_lote(
+        id_empresa,
+        [cambio.id for _, _, cambio in validos if cambio.id],
+        list(codigos_vistos),
     )
-    if not actual.data:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
 
+    nuevos: list[tuple[int, list[dict]]] = []
+    existentes: list[tuple[int, str, list[dict]]] = []
+    inventario: dict[int, list[dict]] = {}
+    ids_en_lote: set[str] = set()
+    slugs: dict[int, tuple[str, str]] = {}
+    slugs_vistos: set[str] = set()
+    for numero, fila, cambio in validos:
+        if cambio.id:
+            actual = por_id.get(cambio.id)
+            if actual is None:
+                errores.append({"fila": numero, "error": "Producto no encontrado"})
+                continue
+        else:
+            actual = _producto_por_codigo_lote(por_clave, cambio.codigo_producto)
+            if actual is not None:
+                cambio = cambio.model_copy(update={"codigo_producto": None})
+        if actual is not None:
+            id_producto = actual["id"]
+            if id_producto in ids_en_lote:
+                errores.append({"fila": numero, "error": "El producto aparece mas de una vez en el lote"})
+                continue
+            payloads = _producto_cambios_payloads(cambio, actual)
+        else:
+            try:
+                item = _validar_fila_lote(fila, ProductoLoteItem)
+            except ValueError as e:
+                errores.append({"fila": numero, "error": str(e)})
+                continue
+            payloads = _payloads_esquema("productos", _producto_payloads(item, id_empresa, now))
+            id_producto = payloads[0]["id"]
+        slug = payloads[0].get("slug")
+        if slug:
+            if slug in slugs_vistos:
+                errores.append({"fila": numero, "error": f"Slug {slug} duplicado en el lote"})
+                continue
+            slugs_vistos.add(slug)
+            slugs[numero] = (slug, id_producto)
+        if actual is not None:
+            ids_en_lote.add(id_producto)
+            existentes.append((numero, id_producto, payloads))
+        else:
+            nuevos.append((numero, payloads))
+        if cambio.id_sucursal_inicial and cambio.stock_inicial is not None:
+            inventario[numero] = [_inventario_inicial_payload(id_empresa, id_producto, cambio.id_sucursal_inicial, cambio.stock_inicial, now)]
+
+    ocupados = _slugs_ocupados_lote(id_empresa, [slug for slug, _ in slugs.values()]) if slugs and _tiene_columna("productos", "slug") else {}
+    rechazados = {numero for numero, (slug, id_producto) in slugs.items() if ocupados.get(slug, id_producto) != id_producto}
+    errores.extend({"fila": numero, "error": f"Slug {slugs[numero][0]} ya pertenece a otro producto"} for numero in rechazados)
+    nuevos = [fila for fila in nuevos if fila[0] not in rechazados]
+    existentes = [fila for fila in existentes if fila[0] not in rechazados]
+
+    creados = _escribir_lote(lambda rows: supabase.table("productos").insert(rows).execute(), nuevos, errores)
+    actualizados = _actualizar_lote(id_empresa, existentes, errores)
+
+    escritos = set(creados) | set(actualizados)
+    if escritos:
+        _invalidar_catalogo_storefront()
+    inventario_filas = [(numero, payload) for numero, payload in inventario.items() if numero in escritos]
+    inventario_escrito = _escribir_lote(
+        lambda rows: supabase.table("inventario").upsert(rows, on_conflict="id_producto,id_sucursal").execute(),
+        inventario_filas,
+        errores,
+    )
+
+    return {
+        "mensaje": "Lote procesado",
+        "total_filas": len(filas),
+        "creados": len(creados),
+        "actualizados": len(actualizados),
+        "inventario": len(inventario_escrito),
+        "errores": sorted(errores, key=lambda error: error["fila"]),
+    }
+
+
+@router.post("/lote")
+async def importar_productos_lote(request: Request, usuario=Depends(get_current_user)):
+    id_empresa = _id_empresa(usuario)
+    filas = await _filas_lote(request)
+    if not filas:
+        raise HTTPException(status_code=400, detail="El lote no contiene productos")
+    if len(filas) > PRODUCTOS_LOTE_MAX:
+        raise HTTPException(status_code=400, detail=f"El lote excede el maximo de {PRODUCTOS_LOTE_MAX} productos")
+    return await run_in_threadpool(_procesar_lote_productos, id_empresa, filas)
+
+
+def _producto_cambios_payloads(datos: ProductoUpdate, actual: dict) -> list[dict]:
     base = {}
-    nombre_actual = actual.data[0].get("nombre") or "producto"
+    nombre_actual = actual.get("nombre") or "producto"
     if datos.nombre is not None:
         base["nombre"] = datos.nombre.strip()
         nombre_actual = base["nombre"]
-    variantes_actuales = []
-    if actual.data:
-        current_full = supabase.table("productos").select("descripcion").eq("id", id_producto).eq("id_empresa", id_empresa).limit(1).execute()
-        if current_full.data:
-            _, variantes_actuales = _extract_variantes_metadata(current_full.data[0].get("descripcion"))
+    descripcion_actual, variantes_actuales = _variantes_producto(actual)
+    variantes_payload = _normalize_variantes_catalogo(datos.variantes_catalogo) if datos.variantes_catalogo is not None else variantes_actuales
 
     if datos.descripcion is not None or datos.variantes_catalogo is not None:
-        descripcion_base = datos.descripcion.strip() if datos.descripcion is not None else None
-        if descripcion_base is None and current_full.data:
-            descripcion_base, _ = _extract_variantes_metadata(current_full.data[0].get("descripcion"))
-        variantes_payload = _normalize_variantes_catalogo(datos.variantes_catalogo) if datos.variantes_catalogo is not None else variantes_actuales
-        base["descripcion"] = _embed_variantes_metadata(descripcion_base or None, variantes_payload)
+        descripcion_base = datos.descripcion.strip() if datos.descripcion is not None else descripcion_actual
+        base["descripcion"] = descripcion_base or None
+        base["variantes"] = variantes_payload
+        if not _tiene_columna("productos", "variantes"):
+            base["descripcion"] = _embed_variantes_metadata(base["descripcion"], variantes_payload)
+        base["codigos_variantes"] = _variant_code_keys(variantes_payload)
     if datos.costo_adquisicion is not None:
         base["costo_adquisicion"] = datos.costo_adquisicion
     if datos.precio is not None:
@@ -528,11 +856,12 @@ def actualizar_producto(id_producto: str, datos: ProductoUpdate, usuario=Depends
         base["foto_url"] = datos.foto_url.strip() or None
     if datos.categoria is not None:
         base["categoria"] = datos.categoria.strip() or None
-    variantes_payload = _normalize_variantes_catalogo(datos.variantes_catalogo) if datos.variantes_catalogo is not None else variantes_actuales
     if datos.codigo_producto is not None:
         base["codigo_producto"] = datos.codigo_producto.strip().upper() or (_primary_variant(variantes_payload).get("codigo") if _primary_variant(variantes_payload) else None)
     elif datos.variantes_catalogo is not None:
         base["codigo_producto"] = _primary_variant(variantes_payload).get("codigo") if _primary_variant(variantes_payload) else None
+    if "codigo_producto" in base:
+        base.update(_codigo_columns(base["codigo_producto"]))
     if datos.slug is not None:
         base["slug"] = _slug_text(datos.slug.strip()) if datos.slug.strip() else _slug_text(nombre_actual)
     if datos.visible_publico is not None:
@@ -546,13 +875,6 @@ def actualizar_producto(id_producto: str, datos: ProductoUpdate, usuario=Depends
     if datos.activo is not None:
         base["activo"] = datos.activo
 
-    inv_extra = None
-    if datos.id_sucursal_inicial is not None and datos.stock_inicial is not None:
-        inv_extra = {"id_sucursal": datos.id_sucursal_inicial, "stock": int(datos.stock_inicial)}
-
-    if not base and not inv_extra:
-        raise HTTPException(status_code=400, detail="Sin cambios")
-
     alt = {}
     if "costo_adquisicion" in base:
         alt["costo"] = base["costo_adquisicion"]
@@ -565,11 +887,38 @@ def actualizar_producto(id_producto: str, datos: ProductoUpdate, usuario=Depends
     if "nombre" in base:
         alt["nombre"] = base["nombre"]
     if "descripcion" in base:
-        alt["descripcion"] = base["descripcion"]
+        alt["descripcion"] = _embed_variantes_metadata(descripcion_base or None, variantes_payload)
     if "activo" in base:
         alt["activo"] = base["activo"]
 
-    actualizado = _try_update_producto(id_producto, id_empresa, [base, alt])
+    return [base, alt]
+
+
+@router.put("/{id_producto}")
+def actualizar_producto(id_producto: str, datos: ProductoUpdate, usuario=Depends(get_current_user)):
+    id_empresa = _id_empresa(usuario)
+
+    actual = (
+        supabase.table("productos")
+        .select("*")
+        .eq("id", id_producto)
+        .eq("id_empresa", id_empresa)
+        .limit(1)
+        .execute()
+    )
+    if not actual.data:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    base, alt = _producto_cambios_payloads(datos, actual.data[0])
+
+    inv_extra = None
+    if datos.id_sucursal_inicial is not None and datos.stock_inicial is not None:
+        inv_extra = {"id_sucursal": datos.id_sucursal_inicial, "stock": int(datos.stock_inicial)}
+
+    if not base and not inv_extra:
+        raise HTTPException(status_code=400, detail="Sin cambios")
+
+    actualizado = _actualizar_producto_payload(id_producto, id_empresa, [base, alt])
 
     if inv_extra:
         try:
@@ -606,4 +955,5 @@ def eliminar_producto(id_producto: str, usuario=Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
     supabase.table("productos").delete().eq("id", id_producto).eq("id_empresa", id_empresa).execute()
+    _invalidar_catalogo_storefront()
     return {"mensaje": "Producto eliminado", "id": id_producto}
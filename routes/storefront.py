@@ -1,15 +1,30 @@
+import hashlib
+import json
 import os
+import threading
+import time
+import unicodedata
 import uuid
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 from pydantic import BaseModel, Field
 
 from database import supabase
+from imagenes import _variantes_desde_url
 from routes.productos import _normalizar_producto
+from storefront_cache import _generacion_catalogo, _generacion_config
 
 router = APIRouter(prefix="/storefront", tags=["Storefront"])
 
+STOREFRONT_LIMITE_DEFAULT = 24
+STOREFRONT_LIMITE_MAX = 200
+
+_config: tuple[int, dict] | None = None
+_config_lock = threading.Lock()
+_catalogo: dict | None = None
+_catalogo_lock = threading.Lock()
+
 
 class StorefrontClienteRegistro(BaseModel):
     nombre: str = Field(min_length=2, max_length=180)
@@ -27,7 +42,7 @@ class StorefrontClienteRegistro(BaseModel):
     requiere_logistica: bool = False
 
 
-def _storefront_empresa_id() -> str:
+def _resolver_storefront_empresa_id() -> str:
     empresa_id = (os.getenv("STOREFRONT_EMPRESA_ID") or os.getenv("PUBLIC_STOREFRONT_EMPRESA_ID") or "").strip()
     if empresa_id:
         return empresa_id
@@ -46,8 +61,8 @@ def _storefront_empresa_id() -> str:
     raise HTTPException(status_code=500, detail="No se encontro empresa para storefront")
 
 
-def _storefront_config():
-    empresa_id = _storefront_empresa_id()
+def _cargar_storefront_config() -> dict:
+    empresa_id = _resolver_storefront_empresa_id()
     resp = (
         supabase.table("empresas")
         .select("id,nombre,logo_url,color_primario,color_secundario,usar_marca_domus")
@@ -68,6 +83,22 @@ def _storefront_config():
     }
 
 
+def _storefront_config() -> dict:
+    global _config
+    generacion = _generacion_config()
+    config = _config
+    if config is not None and config[0] == generacion:
+        return config[1]
+    with _config_lock:
+        if _config is None or _config[0] != generacion:
+            _config = (generacion, _cargar_storefront_config())
+        return _config[1]
+
+
+def _storefront_empresa_id() -> str:
+    return _storefront_config()["empresa_id"]
+
+
 def _public_storefront_product(producto: dict) -> dict:
     imagenes_extra = producto.get("imagenes_extra") or []
     foto_url = producto.get("foto_url") or (imagenes_extra[0] if imagenes_extra else None)
@@ -80,6 +111,7 @@ def _public_storefront_product(producto: dict) -> dict:
         "precio": precio_publico,
         "precio_publico": precio_publico,
         "foto_url": foto_url,
+        "foto_variantes": _variantes_desde_url(foto_url),
         "categoria": producto.get("categoria"),
         "codigo_producto": producto.get("codigo_producto"),
         "piezas_por_caja": producto.get("piezas_por_caja"),
@@ -88,6 +120,7 @@ def _public_storefront_product(producto: dict) -> dict:
         "visible_publico": producto.get("visible_publico", True),
         "origen_catalogo": producto.get("origen_catalogo"),
         "imagenes_extra": imagenes_extra,
+        "imagenes_extra_variantes": [_variantes_desde_url(url) for url in imagenes_extra],
         "variantes_catalogo": variantes_catalogo,
     }
 def _storefront_product_rows(empresa_id: str) -> list[dict]:
@@ -107,31 +140,170 @@ def storefront_config():
     return _storefront_config()
 
 
-@router.get("/productos")
-def storefront_productos():
-    empresa_id = _storefront_empresa_id()
-    productos = [_normalizar_producto(item) for item in _storefront_product_rows(empresa_id)]
+def _env_int(name: str, default: int, *, minimum: int = 0) -> int:
+    try:
+        value = int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        value = default
+    return max(minimum, value)
+
+
+def _texto_busqueda(*values) -> str:
+    texto = " ".join(str(value) for value in values if value)
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii").lower()
+
+
+def _construir_catalogo(generacion: int) -> dict:
+    config = _storefront_config()
+    productos = [_normalizar_producto(item) for item in _storefront_product_rows(config["empresa_id"])]
     productos_publicos = [_public_storefront_product(item) for item in productos if item.get("visible_publico", True)]
     categorias = sorted({item.get("categoria") or "Sin categoria" for item in productos_publicos})
-
+    por_clave: dict[str, dict] = {}
+    for producto in productos_publicos:
+        for clave in (producto.get("id"), producto.get("slug")):
+            if clave:
+                por_clave.setdefault(str(clave), producto)
+    body = json.dumps(
+        {"config": config, "categorias": categorias, "productos": productos_publicos},
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    ).encode("utf-8")
+    version = hashlib.sha256(body).hexdigest()[:32]
     return {
-        "config": _storefront_config(),
+        "generacion": generacion,
+        "creado": time.monotonic(),
+        "config": config,
         "categorias": categorias,
         "productos": productos_publicos,
+        "por_clave": por_clave,
+        "textos": [
+            _texto_busqueda(item.get("nombre"), item.get("codigo_producto"), item.get("categoria"), item.get("descripcion"))
+            for item in productos_publicos
+        ],
+        "body": body,
+        "version": version,
+        "etag": f'"{version}"',
+    }
+
+
+def _catalogo_vigente(catalogo: dict | None, generacion: int) -> bool:
+    if catalogo is None or catalogo["generacion"] != generacion:
+        return False
+    return time.monotonic() - catalogo["creado"] < _env_int("STOREFRONT_SNAPSHOT_TTL_SEGUNDOS", 300)
+
+
+def _catalogo_storefront() -> dict:
+    global _catalogo
+    generacion = _generacion_catalogo()
+    catalogo = _catalogo
+    if _catalogo_vigente(catalogo, generacion):
+        return catalogo
+    with _catalogo_lock:
+        if _catalogo_vigente(_catalogo, generacion):
+            return _catalogo
+        _catalogo = _construir_catalogo(generacion)
+        return _catalogo
+
+
+def _catalogo_revalidable(if_none_match: str | None) -> dict | None:
+    catalogo = _catalogo
+    if not if_none_match or catalogo is None or catalogo["generacion"] != _generacion_catalogo():
+        return None
+    if not _catalogo_vigente(catalogo, catalogo["generacion"]) and not _catalogo_lock.locked():
+        threading.Thread(target=_catalogo_storefront, name="storefront-catalogo", daemon=True).start()
+    return catalogo
+
+
+def _etag_consulta(version: str, page: int, limit: int, categoria: str | None, q: str | None, destacado: bool | None) -> str:
+    consulta = json.dumps([page, limit, categoria, q, destacado], ensure_ascii=False)
+    return f'"{version}-{hashlib.sha256(consulta.encode("utf-8")).hexdigest()[:12]}"'
+
+
+def _etag_coincide(etag: str, if_none_match: str | None) -> bool:
+    candidatos = {item.strip().removeprefix("W/") for item in (if_none_match or "").split(",") if item.strip()}
+    return "*" in candidatos or etag in candidatos
+
+
+def _respuesta_cacheable(body: bytes, etag: str, if_none_match: str | None) -> Response:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={_env_int('STOREFRONT_CACHE_MAX_AGE', 30)}",
     }
+    if _etag_coincide(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _pagina_catalogo(catalogo: dict, page: int, limit: int, categoria: str | None, q: str | None, destacado: bool | None) -> dict:
+    terminos = _texto_busqueda(q).split()
+    coincidencias = [
+        producto
+        for producto, texto in zip(catalogo["productos"], catalogo["textos"])
+        if (destacado is None or bool(producto.get("destacado")) == destacado)
+        and all(termino in texto for termino in terminos)
+    ]
+    facetas: dict[str, int] = {}
+    for producto in coincidencias:
+        nombre = producto.get("categoria") or "Sin categoria"
+        facetas[nombre] = facetas.get(nombre, 0) + 1
+    if categoria:
+        coincidencias = [producto for producto in coincidencias if (producto.get("categoria") or "Sin categoria") == categoria]
+    inicio = (page - 1) * limit
+    return {
+        "config": catalogo["config"],
+        "categorias": catalogo["categorias"],
+        "facetas": [{"categoria": nombre, "total": facetas[nombre]} for nombre in sorted(facetas)],
+        "productos": coincidencias[inicio:inicio + limit],
+        "total": len(coincidencias),
+        "page": page,
+        "limit": limit,
+        "paginas": (len(coincidencias) + limit - 1) // limit,
+    }
+
+
+@router.get("/productos")
+def storefront_productos(
+    page: int | None = Query(default=None, ge=1),
+    limit: int | None = Query(default=None, ge=1, le=STOREFRONT_LIMITE_MAX),
+    categoria: str | None = Query(default=None),
+    q: str | None = Query(default=None),
+    destacado: bool | None = Query(default=None),
+    if_none_match: str | None = Header(default=None),
+):
+    categoria = (categoria or "").strip() or None
+    q = (q or "").strip() or None
+    completo = page is None and limit is None and categoria is None and q is None and destacado is None
+    page = page or 1
+    limit = limit or STOREFRONT_LIMITE_DEFAULT
+
+    revalidable = _catalogo_revalidable(if_none_match)
+    if revalidable is not None:
+        etag = revalidable["etag"] if completo else _etag_consulta(revalidable["version"], page, limit, categoria, q, destacado)
+        if _etag_coincide(etag, if_none_match):
+            return _respuesta_cacheable(b"", etag, if_none_match)
+
+    catalogo = _catalogo_storefront()
+    if completo:
+        return _respuesta_cacheable(catalogo["body"], catalogo["etag"], if_none_match)
+    etag = _etag_consulta(catalogo["version"], page, limit, categoria, q, destacado)
+    if _etag_coincide(etag, if_none_match):
+        return _respuesta_cacheable(b"", etag, if_none_match)
+    body = json.dumps(
+        _pagina_catalogo(catalogo, page, limit, categoria, q, destacado),
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    ).encode("utf-8")
+    return _respuesta_cacheable(body, etag, None)
 
 
 @router.get("/productos/{slug_or_id}")
 def storefront_producto_detalle(slug_or_id: str):
-    empresa_id = _storefront_empresa_id()
-    productos = [_normalizar_producto(item) for item in _storefront_product_rows(empresa_id)]
-    for producto in productos:
-        if not producto.get("visible_publico", True):
-            continue
-        if producto.get("id") == slug_or_id or producto.get("slug") == slug_or_id:
-            return _public_storefront_product(producto)
-
-    raise HTTPException(status_code=404, detail="Producto no encontrado")
+    producto = _catalogo_storefront()["por_clave"].get(slug_or_id)
+    if producto is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return producto
 
 
 @router.post("/clientes/registro")
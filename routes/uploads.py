@@ -1,8 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from typing import BinaryIO
+from urllib.parse import quote
+import hashlib
 import os
-import uuid
-from database import supabase
+import threading
+from requests.adapters import HTTPAdapter
+import requests
+from database import SUPABASE_KEY, SUPABASE_URL, supabase
 from dependencies import get_current_user
+from imagenes import (
+    IMAGEN_CONTENT_TYPE,
+    IMAGEN_EXTENSION,
+    IMAGEN_MIME_PROCESABLES,
+    IMAGEN_VARIANTE_PRINCIPAL,
+    _procesar_imagen,
+    _variantes_desde_url,
+)
+from storefront_cache import _invalidar_config_storefront
 
 router = APIRouter(prefix="/uploads", tags=["Uploads"])
 
@@ -18,25 +32,52 @@ _BUCKET_MIME_TYPES = [
     "application/octet-stream",
 ]
 _BUCKET_FILE_SIZE_LIMIT = 10 * 1024 * 1024
+_OBJETO_CACHE_CONTROL = "31536000"
+_URLS_CONOCIDAS_MAX = 10000
+_UPLOAD_CHUNK_SIZE = 256 * 1024
+_STORAGE_TIMEOUT_SECONDS = 60
 
+_urls_conocidas: dict[tuple[str, str], str] = {}
+_urls_conocidas_lock = threading.Lock()
+_buckets_listos: set[str] = set()
+_buckets_lock = threading.Lock()
+_storage_session: requests.Session | None = None
+_storage_session_lock = threading.Lock()
 
-def _public_storage_url(value) -> str:
-    if isinstance(value, str):
-        return value.strip()
 
-    if isinstance(value, dict):
-        for key in ("publicURL", "publicUrl", "public_url", "signedURL", "signedUrl", "url"):
-            url = value.get(key)
-            if isinstance(url, str) and url.strip():
-                return url.strip()
-        data = value.get("data")
-        if data is not None:
-            return _public_storage_url(data)
+def _storage_base_url() -> str:
+    return f"{(SUPABASE_URL or '').rstrip('/')}/storage/v1"
 
-    return ""
+
+def _public_storage_url(bucket: str, key: str) -> str:
+    template = (os.getenv("SUPABASE_STORAGE_PUBLIC_URL") or "").strip() or _storage_base_url() + "/object/public/{bucket}/{key}"
+    return template.format(bucket=quote(bucket), key=quote(key))
+
+
+def _storage_http() -> requests.Session:
+    global _storage_session
+    if _storage_session is None:
+        with _storage_session_lock:
+            if _storage_session is None:
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_maxsize=16))
+                session.mount("http://", HTTPAdapter(pool_maxsize=16))
+                session.headers.update({"Authorization": f"Bearer {SUPABASE_KEY}", "apikey": SUPABASE_KEY or ""})
+                _storage_session = session
+    return _storage_session
 
 
 def _ensure_bucket(bucket: str) -> None:
+    if bucket in _buckets_listos:
+        return
+    with _buckets_lock:
+        if bucket in _buckets_listos:
+            return
+        _verificar_bucket(bucket)
+        _buckets_listos.add(bucket)
+
+
+def _verificar_bucket(bucket: str) -> None:
     try:
         supabase.storage.get_bucket(bucket)
         return
@@ -62,39 +103,105 @@ def _ensure_bucket(bucket: str) -> None:
             )
 
 
-def _upload(file: UploadFile, bucket: str, prefix: str) -> str:
-    contents = file.file.read()
-    if not contents:
-        raise HTTPException(status_code=400, detail="Archivo vacio")
+def _recordar_url(bucket: str, key: str, url: str) -> str:
+    with _urls_conocidas_lock:
+        if len(_urls_conocidas) >= _URLS_CONOCIDAS_MAX:
+            _urls_conocidas.clear()
+        _urls_conocidas[(bucket, key)] = url
+    return url
 
-    _ensure_bucket(bucket)
 
-    ext = os.path.splitext(file.filename or "")[1] or ".bin"
-    key = f"{prefix}/{uuid.uuid4()}{ext}"
+def _url_existente(bucket: str, key: str) -> str | None:
+    url = _urls_conocidas.get((bucket, key))
+    if url:
+        return url
+    carpeta, _, nombre = key.rpartition("/")
+    try:
+        items = supabase.storage.from_(bucket).list(carpeta, {"search": nombre, "limit": 100})
+    except Exception:
+        return None
+    if not any(isinstance(item, dict) and item.get("name") == nombre for item in items or []):
+        return None
+    return _recordar_url(bucket, key, _public_storage_url(bucket, key))
+
 
+def _subir_objeto(bucket: str, key: str, contents: bytes | BinaryIO, content_type: str) -> str:
     try:
-        supabase.storage.from_(bucket).upload(key, contents, {"content-type": file.content_type or "application/octet-stream"})
-        url = _public_storage_url(supabase.storage.from_(bucket).get_public_url(key))
-        if not url:
-            raise HTTPException(status_code=500, detail="Supabase no devolvio una URL publica valida para la imagen")
-        return url
-    except Exception as e:
-        message = str(e)
+        response = _storage_http().post(
+            f"{_storage_base_url()}/object/{quote(bucket)}/{quote(key)}",
+            data=contents,
+            headers={"Content-Type": content_type, "Cache-Control": f"max-age={_OBJETO_CACHE_CONTROL}"},
+            timeout=_STORAGE_TIMEOUT_SECONDS,
+        )
+    except requests.RequestException as e:
+        raise HTTPException(status_code=500, detail=f"No se pudo subir archivo: {e}")
+
+    if response.status_code >= 400:
+        message = response.text or response.reason or f"HTTP {response.status_code}"
         if "Bucket not found" in message:
+            _buckets_listos.discard(bucket)
             raise HTTPException(
                 status_code=500,
                 detail=f"No se encontro el bucket '{bucket}'. Revisa SUPABASE_BUCKET_PRODUCTOS / SUPABASE_BUCKET_LOGOS en Render.",
             )
-        raise HTTPException(status_code=500, detail=f"No se pudo subir archivo: {e}")
+        if response.status_code != 409 and "duplicate" not in message.lower() and "already exists" not in message.lower():
+            raise HTTPException(status_code=500, detail=f"No se pudo subir archivo: {message}")
+    return _recordar_url(bucket, key, _public_storage_url(bucket, key))
+
+
+def _hash_archivo(stream: BinaryIO) -> tuple[str, int]:
+    stream.seek(0)
+    digest = hashlib.sha256()
+    total = 0
+    for chunk in iter(lambda: stream.read(_UPLOAD_CHUNK_SIZE), b""):
+        digest.update(chunk)
+        total += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), total
+
+
+def _upload(file: UploadFile, bucket: str, prefix: str, *, variantes: bool = False) -> dict:
+    digest, size = _hash_archivo(file.file)
+    if not size:
+        raise HTTPException(status_code=400, detail="Archivo vacio")
+    if size > _BUCKET_FILE_SIZE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"El archivo excede el maximo de {_BUCKET_FILE_SIZE_LIMIT // (1024 * 1024)} MB")
+
+    _ensure_bucket(bucket)
+
+    if variantes and (file.content_type or "").lower() in IMAGEN_MIME_PROCESABLES:
+        base = f"{prefix}/{digest}"
+        principal = _url_existente(bucket, f"{base}/{IMAGEN_VARIANTE_PRINCIPAL}{IMAGEN_EXTENSION}")
+        if principal:
+            return {"url": principal, "variantes": _variantes_desde_url(principal), "existente": True}
+
+        procesadas = _procesar_imagen(file.file.read(), file.content_type)
+        file.file.seek(0)
+        if procesadas:
+            # La variante principal se sube al final: su existencia indica un juego completo.
+            orden = sorted(procesadas, key=lambda nombre: nombre == IMAGEN_VARIANTE_PRINCIPAL)
+            urls = {
+                nombre: _subir_objeto(bucket, f"{base}/{nombre}{IMAGEN_EXTENSION}", procesadas[nombre], IMAGEN_CONTENT_TYPE)
+                for nombre in orden
+            }
+            return {"url": urls[IMAGEN_VARIANTE_PRINCIPAL], "variantes": urls, "existente": False}
+
+    ext = (os.path.splitext(file.filename or "")[1] or ".bin").lower()
+    key = f"{prefix}/{digest}{ext}"
+    existente = _url_existente(bucket, key)
+    if existente:
+        return {"url": existente, "variantes": {}, "existente": True}
+    url = _subir_objeto(bucket, key, file.file, file.content_type or "application/octet-stream")
+    return {"url": url, "variantes": {}, "existente": False}
 
 
 @router.post("/producto-imagen")
 def subir_imagen_producto(file: UploadFile = File(...), usuario=Depends(get_current_user)):
-    url = _upload(file, BUCKET_PRODUCTOS, "productos")
-    return {"url": url}
+    return _upload(file, BUCKET_PRODUCTOS, "productos", variantes=True)
 
 
 @router.post("/logo-tienda")
 def subir_logo_tienda(file: UploadFile = File(...), usuario=Depends(get_current_user)):
-    url = _upload(file, BUCKET_LOGOS, "logos")
+    url = _upload(file, BUCKET_LOGOS, "logos")["url"]
+    _invalidar_config_storefront()
     return {"url": url}
@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 
 from database import supabase
 from dependencies import get_current_user
+from esquema import _escribir_esquema
 
 router = APIRouter(prefix="/ventas", tags=["Ventas"])
 
@@ -166,12 +167,14 @@ def _actualizar_snapshot_detalles(id_venta: str, productos_map: dict[str, dict])
             "nombre_producto": prod.get("nombre"),
         }
 
-        for payload in (payload_full, payload_min):
-            try:
-                supabase.table("detalle_ventas").update(payload).eq("id", det.get("id")).execute()
-                break
-            except Exception:
-                continue
+        try:
+            _escribir_esquema(
+                "detalle_ventas",
+                [payload_full, payload_min],
+                lambda payload: supabase.table("detalle_ventas").update(payload).eq("id", det.get("id")).execute(),
+            )
+        except Exception:
+            pass
 
 
 def _validar_stock_suficiente(id_empresa: str, id_sucursal: str, detalles: list[dict]):
@@ -315,12 +318,9 @@ def _registrar_movimiento_caja_venta(id_empresa: str, id_sucursal: str, id_usuar
     }
 
     try:
-        supabase.table("movimientos_caja").insert(payload).execute()
+        _escribir_esquema("movimientos_caja", [payload, payload_min], lambda fila: supabase.table("movimientos_caja").insert(fila).execute())
     except Exception:
-        try:
-            supabase.table("movimientos_caja").insert(payload_min).execute()
-        except Exception:
-            pass
+        pass
 
 
 @router.get("/")
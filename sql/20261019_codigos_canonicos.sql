@@ -0,0 +1,46 @@
+-- Formas canonica y compacta de los codigos para buscarlos con indice.
+-- codigo_canonico se calcula en Python: despues de aplicar este script ejecutar
+--   python backfill_codigos.py
+
+alter table if exists public.productos
+  add column if not exists codigo_canonico text,
+  add column if not exists codigo_compacto text,
+  add column if not exists codigo_canonico_compacto text,
+  add column if not exists codigos_variantes text[] not null default '{}'::text[];
+
+alter table if exists public.catalogo_costos_proveedor
+  add column if not exists codigo_canonico text,
+  add column if not exists codigo_compacto text,
+  add column if not exists codigo_canonico_compacto text;
+
+update public.productos
+set codigo_compacto = nullif(regexp_replace(upper(codigo_producto), '[^A-Z0-9]', '', 'g'), '')
+where codigo_compacto is null and codigo_producto is not null;
+
+update public.catalogo_costos_proveedor
+set codigo_compacto = nullif(regexp_replace(upper(codigo_producto), '[^A-Z0-9]', '', 'g'), '')
+where codigo_compacto is null;
+
+create index if not exists idx_productos_empresa_codigo_canonico
+  on public.productos(id_empresa, codigo_canonico)
+  where codigo_canonico is not null;
+
+create index if not exists idx_productos_empresa_codigo_compacto
+  on public.productos(id_empresa, codigo_compacto)
+  where codigo_compacto is not null;
+
+create index if not exists idx_productos_empresa_codigo_canonico_compacto
+  on public.productos(id_empresa, codigo_canonico_compacto)
+  where codigo_canonico_compacto is not null;
+
+create index if not exists idx_productos_codigos_variantes
+  on public.productos using gin (codigos_variantes);
+
+create index if not exists idx_catalogo_costos_empresa_codigo_canonico
+  on public.catalogo_costos_proveedor(id_empresa, codigo_canonico);
+
+create index if not exists idx_catalogo_costos_empresa_codigo_compacto
+  on public.catalogo_costos_proveedor(id_empresa, codigo_compacto);
+
+create index if not exists idx_catalogo_costos_empresa_codigo_canonico_compacto
+  on public.catalogo_costos_proveedor(id_empresa, codigo_canonico_compacto);
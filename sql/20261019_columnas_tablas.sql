@@ -0,0 +1,14 @@
+-- Columnas por tabla para que el backend arme payloads segun el esquema real.
+-- esquema.py la llama al iniciar y desde POST /admin/esquema/refrescar.
+
+create or replace function public.columnas_tablas(p_tablas text[])
+returns table(tabla text, columna text)
+language sql
+stable
+security definer
+as $function$
+  select c.table_name::text, c.column_name::text
+  from information_schema.columns c
+  where c.table_schema = 'public'
+    and c.table_name = any(p_tablas);
+$function$;
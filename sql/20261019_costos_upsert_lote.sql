@@ -0,0 +1,45 @@
+-- Upsert masivo de costos de proveedor y propagacion de costos a productos.
+-- El backend guarda codigo_producto en mayusculas; se normalizan los existentes
+-- para poder usar on_conflict (id_empresa, codigo_producto) desde PostgREST.
+
+-- Codigos que solo difieren por espacios chocarian al normalizar: se conserva
+-- el costo mas reciente de cada (id_empresa, upper(btrim(codigo_producto))).
+delete from public.catalogo_costos_proveedor c
+using (
+  select id,
+         row_number() over (
+           partition by id_empresa, upper(btrim(codigo_producto))
+           order by fecha_actualizacion desc, fecha_creacion desc, id desc
+         ) as posicion
+  from public.catalogo_costos_proveedor
+) duplicados
+where c.id = duplicados.id
+  and duplicados.posicion > 1;
+
+update public.catalogo_costos_proveedor
+set codigo_producto = upper(btrim(codigo_producto))
+where codigo_producto <> upper(btrim(codigo_producto));
+
+create unique index if not exists idx_catalogo_costos_empresa_codigo_exacto
+  on public.catalogo_costos_proveedor(id_empresa, codigo_producto);
+
+create or replace function public.aplicar_costos_proveedor(
+  p_id_empresa uuid,
+  p_codigos text[]
+)
+returns integer
+language sql
+as $function$
+  with actualizados as (
+    update public.productos p
+    set costo_adquisicion = c.costo_adquisicion
+    from public.catalogo_costos_proveedor c
+    where p.id_empresa = p_id_empresa
+      and c.id_empresa = p_id_empresa
+      and c.codigo_producto = any(p_codigos)
+      and p.codigo_producto = c.codigo_producto
+      and p.costo_adquisicion is distinct from c.costo_adquisicion
+    returning p.id
+  )
+  select count(*)::integer from actualizados;
+$function$;
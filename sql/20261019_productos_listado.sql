@@ -0,0 +1,19 @@
+-- Listado paginado de productos: orden por cursor, filtros y busqueda por texto.
+-- GET /productos/ usa ilike sobre nombre y codigos; pg_trgm permite usar indice.
+
+create extension if not exists pg_trgm;
+
+create index if not exists idx_productos_empresa_fecha_id
+  on public.productos(id_empresa, fecha_creacion desc, id desc);
+
+create index if not exists idx_productos_empresa_categoria
+  on public.productos(id_empresa, categoria);
+
+create index if not exists idx_productos_nombre_trgm
+  on public.productos using gin (nombre gin_trgm_ops);
+
+create index if not exists idx_productos_codigo_producto_trgm
+  on public.productos using gin (codigo_producto gin_trgm_ops);
+
+create index if not exists idx_productos_codigo_compacto_trgm
+  on public.productos using gin (codigo_compacto gin_trgm_ops);
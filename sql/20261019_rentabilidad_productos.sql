@@ -0,0 +1,68 @@
+-- Rentabilidad por producto agregada en la base de datos.
+-- GET /drive-sync/rentabilidad la llama via RPC con rango de fechas y top-N opcional
+-- (p_limite null devuelve todos los productos con ventas).
+
+create index if not exists idx_ventas_empresa_fecha
+  on public.ventas(id_empresa, fecha);
+
+create index if not exists idx_detalle_ventas_venta
+  on public.detalle_ventas(id_venta);
+
+create or replace function public.rentabilidad_productos(
+  p_id_empresa uuid,
+  p_desde timestamp without time zone default null,
+  p_hasta timestamp without time zone default null,
+  p_limite integer default null
+)
+returns jsonb
+language sql
+stable
+as $function$
+  with lineas as (
+    select
+      p.id as id_producto,
+      p.nombre,
+      p.codigo_producto,
+      coalesce(p.precio, 0)::numeric as precio_publico,
+      coalesce(p.costo_adquisicion, 0)::numeric as costo_adquisicion,
+      coalesce(d.cantidad, 0)::integer as cantidad,
+      coalesce(nullif(d.precio_unitario, 0), nullif(p.precio, 0), 0)::numeric as precio
+    from public.detalle_ventas d
+    join public.ventas v on v.id = d.id_venta
+    join public.productos p on p.id = d.id_producto and p.id_empresa = p_id_empresa
+    where v.id_empresa = p_id_empresa
+      and (p_desde is null or v.fecha >= p_desde)
+      and (p_hasta is null or v.fecha < p_hasta)
+  ),
+  por_producto as (
+    select
+      id_producto,
+      nombre,
+      codigo_producto,
+      sum(cantidad)::integer as unidades_vendidas,
+      round(sum(precio * cantidad), 2)::float8 as venta_total,
+      round(sum((precio - costo_adquisicion) * cantidad), 2)::float8 as utilidad_total,
+      precio_publico::float8 as precio_publico,
+      costo_adquisicion::float8 as costo_adquisicion
+    from lineas
+    group by id_producto, nombre, codigo_producto, precio_publico, costo_adquisicion
+  )
+  select jsonb_build_object(
+    'utilidad_total_estimada', coalesce((select round(sum((precio - costo_adquisicion) * cantidad), 2)::float8 from lineas), 0),
+    'productos_con_ventas', (select count(*) from por_producto),
+    'producto_mas_vendido', (
+      select to_jsonb(pp) from por_producto pp order by unidades_vendidas desc, nombre limit 1
+    ),
+    'producto_mas_rentable', (
+      select to_jsonb(pp) from por_producto pp order by utilidad_total desc, nombre limit 1
+    ),
+    'productos', coalesce((
+      select jsonb_agg(to_jsonb(top) order by top.unidades_vendidas desc, top.nombre)
+      from (
+        select * from por_producto
+        order by unidades_vendidas desc, nombre
+        limit case when p_limite is null then null else greatest(p_limite, 1) end
+      ) top
+    ), '[]'::jsonb)
+  );
+$function$;
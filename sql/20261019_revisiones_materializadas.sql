@@ -0,0 +1,22 @@
+-- Cola de revisiones materializada: el costo ligado, el margen estimado y los
+-- motivos se calculan al crear la revision o al cambiar costos, no en cada lectura.
+-- Para calcular las revisiones pendientes anteriores, despues de aplicar este script ejecutar
+--   python backfill_revisiones.py
+
+alter table if exists public.catalogo_drive_revisiones
+  add column if not exists codigo_normalizado text,
+  add column if not exists codigo_claves text[] not null default '{}'::text[],
+  add column if not exists codigo_costo_ligado text,
+  add column if not exists costo_registrado jsonb,
+  add column if not exists utilidad_estimada numeric,
+  add column if not exists margen_estimado numeric,
+  add column if not exists motivos_revision jsonb not null default '[]'::jsonb,
+  add column if not exists requiere_revision boolean,
+  add column if not exists origen_extraccion text,
+  add column if not exists revision_calculada_en timestamp without time zone;
+
+create index if not exists idx_catalogo_drive_revisiones_codigo_claves
+  on public.catalogo_drive_revisiones using gin (codigo_claves);
+
+create index if not exists idx_catalogo_drive_revisiones_empresa_filtros
+  on public.catalogo_drive_revisiones(id_empresa, estado_revision, tipo_cambio, requiere_revision, fecha_detectada desc);
@@ -0,0 +1,13 @@
+-- Variantes de catalogo en columna jsonb en lugar de JSON embebido en descripcion.
+-- variantes null indica una fila aun no migrada; despues de aplicar este script ejecutar
+--   python backfill_variantes.py
+
+alter table if exists public.productos
+  add column if not exists variantes jsonb;
+
+create index if not exists idx_productos_variantes
+  on public.productos using gin (variantes jsonb_path_ops);
+
+create index if not exists idx_productos_variantes_pendientes
+  on public.productos(id_empresa)
+  where variantes is null;
@@ -0,0 +1,26 @@
+import threading
+
+_generacion = 0
+_generacion_config_actual = 0
+_generacion_lock = threading.Lock()
+
+
+def _generacion_catalogo() -> int:
+    return _generacion
+
+
+def _invalidar_catalogo_storefront() -> None:
+    global _generacion
+    with _generacion_lock:
+        _generacion += 1
+
+
+def _generacion_config() -> int:
+    return _generacion_config_actual
+
+
+def _invalidar_config_storefront() -> None:
+    global _generacion_config_actual
+    with _generacion_lock:
+        _generacion_config_actual += 1
+    _invalidar_catalogo_storefront()